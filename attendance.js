@@ -1,23 +1,86 @@
+const fs = require("fs");
+const path = require("path");
 const Zkteco = require("zkteco-js");
 const axios = require("axios");
 
+// Device profiles are shared with the Python bridge; the lookup below follows
+// zkteco_config.py: ZKTECO_CONFIG_JSON, then the ZKTECO_CONFIG file, then
+// zkteco_devices.json next to this script, over the same built-in defaults.
+const DEFAULTS = {
+  port: 4370,
+  timeout: 60,
+  transport: "auto",
+  transport_probe_hours: 24,
+  ommit_ping: false,
+  api_base_url: "http://172.18.1.31:8000",
+  utc_offset_hours: 3,
+  status_profile: "standard",
+};
+
+const STANDARD_STATUS_PROFILE = {
+  0: "Check-in",
+  1: "Check-out",
+  2: "Break-out",
+  3: "Break-in",
+  4: "Overtime-in",
+  5: "Overtime-out",
+};
+
+const loadDeviceConfig = () => {
+  if (process.env.ZKTECO_CONFIG_JSON) {
+    return JSON.parse(process.env.ZKTECO_CONFIG_JSON);
+  }
+  const configPath =
+    process.env.ZKTECO_CONFIG || path.join(__dirname, "zkteco_devices.json");
+  if (!fs.existsSync(configPath)) {
+    return {};
+  }
+  return JSON.parse(fs.readFileSync(configPath, "utf-8"));
+};
+
+/**
+ * Settings of the default device, as ZKTecoManager() would resolve them.
+ * @returns {Object} Device profile with status_mapping filled in
+ */
+const resolveDefaultProfile = () => {
+  const deviceConfig = loadDeviceConfig();
+  const devices = deviceConfig.devices || {};
+  const name = deviceConfig.default_device || Object.keys(devices)[0];
+  if (!devices[name]) {
+    throw new Error(
+      "No device configured; add one to the device configuration file"
+    );
+  }
+  const profile = { ...DEFAULTS, ...deviceConfig.defaults, ...devices[name] };
+
+  const statusProfiles = {
+    standard: STANDARD_STATUS_PROFILE,
+    ...deviceConfig.status_profiles,
+  };
+  const statusMapping =
+    profile.status_mapping && Object.keys(profile.status_mapping).length
+      ? profile.status_mapping
+      : statusProfiles[profile.status_profile];
+  if (!statusMapping) {
+    throw new Error(
+      `Unknown status profile ${profile.status_profile} for device ${name}`
+    );
+  }
+  return { ...profile, status_mapping: statusMapping };
+};
+
 /**
  * Retrieves attendance data from a ZKTeco device and sends it to a database in bulk.
  * @returns {Promise<Object>} Result of the operation
  */
 const getAndSendAttendanceData = async () => {
-  const url = "http://172.18.1.31:8000";
-  const deviceIp = "172.17.0.133";
-  const port = 4370;
-
-  const statusMapping = {
-    0: "Check-in",
-    1: "Check-out",
-    2: "Break-out",
-    3: "Break-in",
-    4: "Overtime-in",
-    5: "Overtime-out",
-  };
+  const profile = resolveDefaultProfile();
+  const url = process.env.ZKTECO_API_URL || profile.api_base_url;
+  const deviceIp = profile.ip;
+  const port = profile.port;
+  const utcOffsetHours = profile.utc_offset_hours;
+
+  const statusMapping = profile.status_mapping;
 
   const device = new Zkteco(deviceIp, port, 5200, 5000);
 
@@ -76,7 +139,7 @@ const getAndSendAttendanceData = async () => {
         const status =
           statusMapping[record.state] || `Unknown Status ${record.state}`;
         const timestamp = new Date(record.record_time);
-        timestamp.setHours(timestamp.getHours() + 3); // UTC+3 (Baghdad time)
+        timestamp.setHours(timestamp.getHours() + utcOffsetHours); // device local time
 
         attendanceData.push({
           user_name: userName,
@@ -146,7 +209,7 @@ const getAndSendAttendanceData = async () => {
   }
 };
 
-module.exports = { getAndSendAttendanceData };
+module.exports = { getAndSendAttendanceData, resolveDefaultProfile };
 
 // Example usage
 if (require.main === module) {
@@ -0,0 +1,82 @@
+"""Fleet export benchmark: in-process decoding vs a process pool
+
+Builds synthetic raw attendance logs for several devices and exports them
+with zkteco_fleet.export_logs, first in this process and then with process
+pools of growing size, checking that every run writes identical files.
+
+    python scripts/zkteco_fleet_benchmark.py [--devices 8] [--records 100000] [--processes 2 4]
+"""
+import argparse
+import filecmp
+import os
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from zkteco_config import STANDARD_STATUS_PROFILE  # noqa: E402
+from zkteco_fleet import export_logs, export_path  # noqa: E402
+
+RECORD = struct.Struct("<HBIB")
+USERS = 500
+
+
+def encode_time(t: datetime) -> int:
+    """Inverse of zkteco_records.decode_time"""
+    days = ((t.year - 2000) * 12 + t.month - 1) * 31 + t.day - 1
+    return ((days * 24 + t.hour) * 60 + t.minute) * 60 + t.second
+
+
+def build_log(device: str, count: int):
+    started = datetime(2025, 1, 1, 7)
+    body = bytearray(RECORD.size * count)
+    for i in range(count):
+        RECORD.pack_into(body, i * RECORD.size, i % USERS + 1, 0, encode_time(started + timedelta(minutes=7 * i)), i % 2)
+    return {
+        "device": device,
+        "buffer": struct.pack("<I", len(body)) + bytes(body),
+        "count": count,
+        "uid_to_user_id": {uid: str(1000 + uid) for uid in range(1, USERS + 1)},
+        "user_names": {str(1000 + uid): f"User {uid}" for uid in range(1, USERS + 1)},
+        "status_mapping": dict(STANDARD_STATUS_PROFILE),
+        "utc_offset": timedelta(hours=3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=8)
+    parser.add_argument("--records", type=int, default=100000, help="records per device")
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--format", default="ndjson", choices=("ndjson", "json", "csv", "binary"))
+    args = parser.parse_args()
+
+    logs = [build_log(f"10.0.0.{i + 1}:4370", args.records) for i in range(args.devices)]
+    total = args.devices * args.records
+    print(f"{args.devices} devices x {args.records} records, {os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        baseline = None
+        for processes in [0] + args.processes:
+            output_dir = os.path.join(workdir, str(processes))
+            started = time.perf_counter()
+            export_logs(logs, args.format, output_dir, processes=processes)
+            elapsed = time.perf_counter() - started
+            label = "in process" if not processes else f"{processes} processes"
+            line = f"{label:<14} {elapsed:>7.2f} s  {total / elapsed:>10,.0f} records/s"
+            if baseline is None:
+                baseline = (output_dir, elapsed)
+            else:
+                same = all(filecmp.cmp(export_path(baseline[0], log["device"], args.format),
+                                       export_path(output_dir, log["device"], args.format), shallow=False)
+                           for log in logs)
+                line += f"  {baseline[1] / elapsed:>4.1f}x" + ("" if same else "  OUTPUT DIFFERS")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Concurrent load test for the ZKTeco API
+
+Run the same load against the dev server and the production entry point to
+compare them, e.g.
+
+    python zkteco_api.py                      # dev server on :5000
+    python zkteco_serve.py --port 5001        # production server
+    python scripts/zkteco_load_test.py http://localhost:5000 http://localhost:5001
+
+The default paths are store-backed and never touch the device, so the numbers
+measure the server rather than the terminal.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_PATHS = ["/health", "/api/zkteco/reports/daily", "/api/zkteco/clear-audit"]
+
+
+def _worker(base_url: str, paths, count: int):
+    session = requests.Session()
+    latencies, errors = [], 0
+    for i in range(count):
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + paths[i % len(paths)], timeout=30)
+            if response.status_code >= 500:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    session.close()
+    return latencies, errors
+
+
+def run(base_url: str, paths, concurrency: int, requests_per_client: int):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _worker(base_url, paths, requests_per_client), range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for result in results for l in result[0])
+    errors = sum(result[1] for result in results)
+    return {
+        "url": base_url,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+", help="base URLs of the servers to compare")
+    parser.add_argument("--path", action="append", dest="paths", help="GET path to request (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel clients")
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    print(f"{args.concurrency} clients x {args.requests} requests over {', '.join(paths)}")
+    print(f"{'server':<32} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'errors':>7}")
+    for url in args.urls:
+        r = run(url.rstrip("/"), paths, args.concurrency, args.requests)
+        print(f"{r['url']:<32} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['max_ms']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
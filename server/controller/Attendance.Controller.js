@@ -1,10 +1,12 @@
 const Attendance = require("../model/AttendanceModel");
 const AttendanceUserModel = require("../model/AttendanceUserModel");
+const { expandCompactAttendance } = require("../utils/compactPayload");
 
 module.exports = {
   createAttendance: async (req, res) => {
     try {
-      const attendanceData = req.body; // expecting an array of objects
+      // expecting an array of objects, or a compact-v1 payload from the bridge
+      const attendanceData = expandCompactAttendance(req.body);
       console.log(`Received ${attendanceData?.length || 0} attendance records`);
 
       if (!Array.isArray(attendanceData) || attendanceData.length === 0) {
@@ -1,11 +1,13 @@
 const AttendanceUser = require("../model/AttendanceUserModel");
 const Users = require("../model/user.model");
 const UserAssignment = require("../model/UserAssignment");
+const { expandCompactUsers } = require("../utils/compactPayload");
 
 module.exports = {
   createAttendance: async (req, res) => {
     try {
-      const AttendanceData = req.body; // expecting an array of objects
+      // expecting an array of objects, or a compact-v1 payload from the bridge
+      const AttendanceData = expandCompactUsers(req.body);
 
       if (!Array.isArray(AttendanceData) || AttendanceData.length === 0) {
         return res
@@ -56,6 +58,46 @@ module.exports = {
     }
   },
 
+  // Creates or updates users by userId and marks them active again; used by the
+  // ZKTeco bridge for users added to or changed on the device, including users
+  // enrolled again after they were deactivated
+  upsertUsers: async (req, res) => {
+    try {
+      // expecting an array of objects, or a compact-v1 payload from the bridge
+      const users = expandCompactUsers(req.body);
+
+      if (!Array.isArray(users) || users.length === 0) {
+        return res
+          .status(400)
+          .json({ message: "No data provided or invalid format" });
+      }
+
+      const result = await AttendanceUser.bulkWrite(
+        users.map((user) => ({
+          updateMany: {
+            filter: { userId: user.userId },
+            update: { $set: { name: user.name, active: true } },
+            upsert: true,
+          },
+        }))
+      );
+
+      return res.status(200).json({
+        message: "AttendanceUser upsert completed",
+        results: {
+          inserted: result.upsertedCount,
+          updated: result.modifiedCount,
+        },
+      });
+    } catch (error) {
+      console.error("Upsert error:", error);
+      res.status(500).json({
+        message: "Something went wrong!",
+        error: error.message,
+      });
+    }
+  },
+
   fetchAttendance: async (req, res) => {
     let { reqUserId } = req.body;
     try {
@@ -155,6 +197,35 @@ module.exports = {
     }
   },
 
+  // Marks users that were removed from the device as inactive
+  deactivateUsers: async (req, res) => {
+    try {
+      const { userIds } = req.body;
+
+      if (!Array.isArray(userIds) || userIds.length === 0) {
+        return res
+          .status(400)
+          .json({ message: "No user IDs provided for deactivation" });
+      }
+
+      const result = await AttendanceUser.updateMany(
+        { userId: { $in: userIds } },
+        { active: false }
+      );
+
+      res.status(200).json({
+        message: "AttendanceUser deactivated successfully",
+        count: result.modifiedCount,
+      });
+    } catch (error) {
+      console.error("Deactivate error:", error);
+      res.status(500).json({
+        message: "Failed to deactivate AttendanceUser",
+        error: error.message,
+      });
+    }
+  },
+
   // Bulk delete functionality
   bulkDeleteAttendance: async (req, res) => {
     try {
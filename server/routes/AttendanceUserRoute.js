@@ -5,6 +5,8 @@ const {
   getStudentByIdAndChangeActive,
   deleteStudent,
   bulkDeleteAttendance,
+  deactivateUsers,
+  upsertUsers,
 } = require("../controller/AttendanceUser.Controller");
 const router = express.Router();
 
@@ -14,6 +16,12 @@ router.post("/create", createAttendance);
 // Get all Attendance with pagination
 router.post("/fetch", fetchAttendance);
 
+// Create, rename or reactivate users by userId - used by the ZKTeco bridge
+router.post("/upsert", upsertUsers);
+
+// Deactivate users removed from the device - used by the ZKTeco bridge
+router.post("/deactivate", deactivateUsers);
+
 // Get a specific student by ID
 router.get("/:id", getStudentByIdAndChangeActive);
 
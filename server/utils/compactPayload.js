@@ -0,0 +1,56 @@
+const COMPACT_FORMAT = "compact-v1";
+
+/**
+ * Formats epoch seconds as the naive ISO string the bridge would have sent
+ * @param {Number|null} epoch - Seconds since 1970-01-01, wall clock of the device
+ * @returns {String|null} - Timestamp like 2024-05-01T08:00:00
+ */
+const epochToNaiveIso = (epoch) =>
+  epoch === null || epoch === undefined
+    ? null
+    : new Date(epoch * 1000).toISOString().slice(0, 19);
+
+/**
+ * Expands a compact-v1 attendance payload into the record objects createAttendance expects
+ * @param {Object|Array} body - Request body, either an array of records or a compact payload
+ * @returns {Array|Object} - Array of records, or the body untouched if it is not compact
+ */
+const expandCompactAttendance = (body) => {
+  if (!body || Array.isArray(body) || body.format !== COMPACT_FORMAT) {
+    return body;
+  }
+
+  const users = body.users || [];
+  const statuses = body.statuses || {};
+
+  return (body.records || []).map(([uid, userIndex, punch, ts]) => {
+    const [userId, userName] = users[userIndex] || [];
+    return {
+      uid,
+      user_id: userId,
+      user_name: userName || `User ${userId}`,
+      timestamp: epochToNaiveIso(ts),
+      status: statuses[punch] || `Unknown Status ${punch}`,
+      punch,
+    };
+  });
+};
+
+/**
+ * Expands a compact-v1 user payload into the { userId, name } objects AttendanceUser expects
+ * @param {Object|Array} body - Request body, either an array of users or a compact payload
+ * @returns {Array|Object} - Array of users, or the body untouched if it is not compact
+ */
+const expandCompactUsers = (body) => {
+  if (!body || Array.isArray(body) || body.format !== COMPACT_FORMAT) {
+    return body;
+  }
+
+  return (body.records || []).map(([userId, name]) => ({ userId, name }));
+};
+
+module.exports = {
+  COMPACT_FORMAT,
+  expandCompactAttendance,
+  expandCompactUsers,
+};
@@ -0,0 +1,209 @@
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from zk.attendance import Attendance  # noqa: E402
+from zk.finger import Finger  # noqa: E402
+from zk.user import User  # noqa: E402
+
+TEST_CONFIG = """{
+    "defaults": {"transport": "tcp", "ommit_ping": true, "api_base_url": "http://backend.test"},
+    "default_device": "main",
+    "devices": {"main": {"ip": "10.0.0.1"}}
+}"""
+
+
+def encode_time(t: datetime) -> int:
+    """Inverse of zkteco_records.decode_time"""
+    days = ((t.year - 2000) * 12 + t.month - 1) * 31 + t.day - 1
+    return ((days * 24 + t.hour) * 60 + t.minute) * 60 + t.second
+
+
+class FakeDevice:
+    """In-memory terminal: users, attendance log, templates and a log of commands"""
+
+    def __init__(self, users=5, records=20):
+        self.users = [User(uid, f"User{uid}", 0, "", "", str(1000 + uid), 0) for uid in range(1, users + 1)]
+        started = datetime(2025, 7, 1, 8)
+        self.attendance = [
+            Attendance(str(1001 + i % users), started + timedelta(minutes=37 * i), 1, i % 2, 1 + i % users)
+            for i in range(records)
+        ] if users else []
+        self.fingers = [Finger(user.uid, 0, 1, b"T" * 300) for user in self.users]
+        self.calls = []
+        self.enabled = True
+
+    def writes(self):
+        return [call for call in self.calls if call[0] not in ("connect", "get_users", "disconnect", "read_sizes")]
+
+
+class FakeConnection:
+    """The part of pyzk's ZK connection the bridge uses
+
+    Like pyzk, set_user, delete_user and save_user_template each end with
+    their own refresh_data() call.
+    """
+
+    def __init__(self, device: FakeDevice):
+        self.device = device
+        self.is_connect = True
+
+    def _log(self, *call):
+        self.device.calls.append(call)
+
+    def get_device_name(self):
+        return "fake"
+
+    def disconnect(self):
+        self.is_connect = False
+        self._log("disconnect")
+
+    def get_users(self):
+        self._log("get_users")
+        return list(self.device.users)
+
+    def get_attendance(self):
+        self._log("get_attendance")
+        return list(self.device.attendance)
+
+    def read_sizes(self):
+        self._log("read_sizes")
+        self.users = len(self.device.users)
+        self.records = len(self.device.attendance)
+        return True
+
+    def read_with_buffer(self, command, fct=0, ext=0):
+        self._log("read_with_buffer")
+        body = b"".join(
+            struct.pack("<H24sBIB8s", a.uid, a.user_id.encode(), a.status, encode_time(a.timestamp), a.punch, b"")
+            for a in self.device.attendance
+        )
+        data = struct.pack("<I", len(body)) + body
+        return data, len(data)
+
+    def set_user(self, uid=None, name="", privilege=0, password="", group_id="", user_id="", card=0):
+        self._log("set_user", user_id)
+        self.device.users = [u for u in self.device.users if u.uid != uid]
+        self.device.users.append(User(uid, name, privilege, password, group_id, user_id, card))
+        self.refresh_data()
+
+    def delete_user(self, uid=0, user_id=""):
+        self._log("delete_user", uid)
+        self.device.users = [u for u in self.device.users if u.uid != uid]
+        self.device.fingers = [f for f in self.device.fingers if f.uid != uid]
+        self.refresh_data()
+
+    def save_user_template(self, user, fingers=[]):
+        self._log("save_user_template", user.user_id)
+        self.device.users = [u for u in self.device.users if u.uid != user.uid] + [user]
+        self.device.fingers = [f for f in self.device.fingers if f.uid != user.uid] + list(fingers)
+        self.refresh_data()
+
+    def get_templates(self):
+        self._log("get_templates")
+        return list(self.device.fingers)
+
+    def clear_attendance(self):
+        self._log("clear_attendance")
+        self.device.attendance = []
+        return True
+
+    def disable_device(self):
+        self._log("disable")
+        self.device.enabled = False
+        return True
+
+    def enable_device(self):
+        self._log("enable")
+        self.device.enabled = True
+        return True
+
+    def refresh_data(self):
+        self._log("refresh")
+        return True
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.content = b""
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeBackend:
+    """Records uploads; status codes, or (status, JSON body), to return can be queued in responses"""
+
+    def __init__(self):
+        self.posts = []
+        self.responses = []
+
+    def post_json(self, path, payload, timeout=None, idempotent=False):
+        status, body = self.responses.pop(0) if self.responses else 200, None
+        if isinstance(status, tuple):
+            status, body = status
+        if status < 400:
+            self.posts.append((path, payload))
+        return FakeResponse(status, body)
+
+    def received(self, path="/attendance/create"):
+        return [record for posted, payload in self.posts if posted == path for record in payload]
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Fresh local store and device configuration for every test"""
+    import zkteco_config
+    import zkteco_dedup
+    import zkteco_manager
+    import zkteco_store
+
+    monkeypatch.setenv("ZKTECO_CONFIG_JSON", TEST_CONFIG)
+    store = zkteco_store.LocalStore(str(tmp_path / "store.db"))
+    monkeypatch.setattr(zkteco_config, "_registry", None)
+    monkeypatch.setattr(zkteco_store, "_store", store)
+    monkeypatch.setattr(zkteco_dedup, "_deduplicators", {})
+    monkeypatch.setattr(zkteco_manager, "_device_locks", {})
+    monkeypatch.setattr(zkteco_manager, "DEVICE_LOCK_DIR", str(tmp_path))
+    yield
+    store.close()
+
+
+@pytest.fixture
+def devices(monkeypatch):
+    """FakeDevice per address, served through a patched zk.ZK"""
+    import zk
+
+    devices = {}
+
+    def fake_zk(ip, port=4370, timeout=60, password=0, force_udp=False, ommit_ping=False, **kwargs):
+        device = devices.setdefault(ip, FakeDevice())
+
+        class Session:
+            def connect(self):
+                device.calls.append(("connect", force_udp, ommit_ping))
+                return FakeConnection(device)
+
+        return Session()
+
+    monkeypatch.setattr(zk, "ZK", fake_zk)
+    return devices
+
+
+@pytest.fixture
+def manager(devices):
+    from zkteco_manager import ZKTecoManager
+
+    devices["10.0.0.1"] = FakeDevice()
+    manager = ZKTecoManager(payload_format="json")
+    manager.retry_delay = 0
+    manager._backend = FakeBackend()
+    return manager
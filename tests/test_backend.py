@@ -0,0 +1,90 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import urllib3.connection
+
+import zkteco_backend
+from zkteco_backend import BackendClient
+from zkteco_manager import ZKTecoManager
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    """Count TCP connection attempts, below any retry layer"""
+    attempts = []
+    new_conn = urllib3.connection.HTTPConnection._new_conn
+
+    def counting(self):
+        attempts.append(self.host)
+        return new_conn(self)
+
+    monkeypatch.setattr(urllib3.connection.HTTPConnection, "_new_conn", counting)
+    return attempts
+
+
+@pytest.fixture
+def unavailable():
+    """Backend that answers 503 to every POST and counts them"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            server.posts += 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.posts = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_refused_connections_are_retried_once_per_attempt(connects):
+    client = BackendClient(f"http://127.0.0.1:{_closed_port()}", max_retries=2, backoff_factor=0)
+
+    with pytest.raises(requests.ConnectionError):
+        client.post_json("/attendance/create", [], idempotent=True)
+    assert len(connects) == 3
+
+    # Nothing reached the server, so a plain POST is tried as often
+    with pytest.raises(requests.ConnectionError):
+        client.post_json("/attendance/create", [])
+    assert len(connects) == 6
+
+
+def test_only_idempotent_requests_are_retried_on_server_errors(unavailable):
+    client = BackendClient(f"http://127.0.0.1:{unavailable.server_port}", max_retries=2, backoff_factor=0)
+
+    assert client.post_json("/attendance/create", [], idempotent=True).status_code == 503
+    assert unavailable.posts == 3
+
+    assert client.post_json("/attendance/create", []).status_code == 503
+    assert unavailable.posts == 4
+
+
+def test_pool_size_and_retries_come_from_the_profile(monkeypatch):
+    monkeypatch.setenv("ZKTECO_CONFIG_JSON", """{
+        "defaults": {"transport": "tcp", "api_base_url": "http://backend.test", "backend_pool_size": 4},
+        "devices": {"main": {"ip": "10.0.0.1"}}
+    }""")
+    monkeypatch.setenv("ZKTECO_BACKEND_MAX_RETRIES", "5")
+    monkeypatch.setattr(zkteco_backend, "_clients", {})
+
+    backend = ZKTecoManager().backend
+    adapter = backend.session.get_adapter("http://backend.test")
+    assert backend.max_retries == 5
+    assert adapter._pool_maxsize == 4 and adapter.max_retries.total == 0
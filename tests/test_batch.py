@@ -0,0 +1,96 @@
+from struct import unpack
+
+from zk import ZK, const
+from zk.finger import Finger
+from zk.user import User
+
+from zkteco_batch import CMD_SAVE_USERTEMPS, WriteBatch
+
+
+class RecordingZK(ZK):
+    """pyzk connection whose commands are recorded instead of sent"""
+
+    def __init__(self):
+        super().__init__("127.0.0.1")
+        self.commands = []
+        self.user_packet_size = 72
+
+        self.buffers = []
+
+    def _ZK__send_command(self, command, command_string=b"", response_size=8):
+        self.commands.append(command)
+        return {"status": True, "code": const.CMD_ACK_OK}
+
+    def _send_with_buffer(self, buffer):
+        self.buffers.append(buffer)
+        super()._send_with_buffer(buffer)
+
+
+def test_writes_share_one_refresh_and_one_disabled_window():
+    conn = RecordingZK()
+    batch = WriteBatch(conn)
+    for uid in range(1, 4):
+        batch.set_user(uid, uid=uid, name=f"User{uid}", user_id=str(uid))
+    batch.delete_user(4, uid=4)
+
+    assert batch.apply() == [(1, None), (2, None), (3, None), (4, None)]
+    assert conn.commands == [
+        const.CMD_DISABLEDEVICE,
+        const.CMD_USER_WRQ, const.CMD_USER_WRQ, const.CMD_USER_WRQ, const.CMD_DELETE_USER,
+        const.CMD_REFRESHDATA,
+        const.CMD_ENABLEDEVICE,
+    ]
+    # The connection refreshes normally again afterwards
+    conn.set_user(uid=5, name="User5", user_id="5")
+    assert conn.commands[-2:] == [const.CMD_USER_WRQ, const.CMD_REFRESHDATA]
+
+
+def test_failed_writes_are_reported_and_the_device_is_enabled():
+    conn = RecordingZK()
+    batch = WriteBatch(conn)
+    batch.set_user("bad", uid=1, name="x", user_id="1", card="not a number")
+    batch.set_user("good", uid=2, name="y", user_id="2")
+    progress = []
+
+    results = batch.apply(lambda done, total: progress.append((done, total)))
+
+    assert [key for key, error in results if error] == ["bad"]
+    assert progress == [(1, 2), (2, 2)]
+    assert conn.commands.count(const.CMD_REFRESHDATA) == 1
+    assert conn.commands[-1] == const.CMD_ENABLEDEVICE
+
+
+def test_nothing_is_refreshed_when_every_write_fails():
+    conn = RecordingZK()
+    batch = WriteBatch(conn)
+    batch.add("x", "no_such_method")
+
+    assert batch.apply()[0][1] is not None
+    assert conn.commands == [const.CMD_DISABLEDEVICE, const.CMD_ENABLEDEVICE]
+    assert len(batch) == 0 and batch.apply() == []
+
+
+def test_users_and_templates_are_saved_in_one_transfer(manager, monkeypatch):
+    conn = RecordingZK()
+    conn.get_users = lambda: []
+    manager.conn = conn
+    monkeypatch.setattr(manager, "connect", lambda: True)
+    users = [
+        {"userId": str(uid), "uid": uid, "name": f"User{uid}", "privilege": 0, "password": "",
+         "group_id": "", "cardNumber": 0}
+        for uid in range(1, 4)
+    ]
+    templates = [(uid, fid, 1, bytes([uid]) * 200) for uid in range(1, 4) for fid in range(2)]
+
+    result = manager.write_user_templates(users, templates)
+
+    assert result["success"] and result["templates"] == 6
+    assert conn.commands.count(CMD_SAVE_USERTEMPS) == 1
+    assert conn.commands.count(const.CMD_PREPARE_DATA) == 1
+    assert const.CMD_USER_WRQ not in conn.commands
+    assert conn.commands.count(const.CMD_REFRESHDATA) == 1
+    # Header: sizes of the user records, the template table and the templates
+    user_size, table_size, template_size = unpack("III", conn.buffers[0][:12])
+    assert user_size == 3 * len(User(1, "User1", 0, "", "", "1", 0).repack73())
+    assert table_size == 6 * 8
+    assert template_size == 6 * len(Finger(1, 0, 1, b"x" * 200).repack_only())
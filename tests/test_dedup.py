@@ -0,0 +1,49 @@
+import zkteco_store
+from zkteco_dedup import AttendanceDeduplicator, BloomFilter, get_deduplicator
+
+DEVICE = "10.0.0.1:4370"
+
+
+def _record(user_id, minute, punch=0):
+    return {"user_id": user_id, "timestamp": f"2025-07-01T08:{minute:02d}:00", "punch": punch}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [f"key-{i}".encode() for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}".encode() in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_sent_records_and_repeats_in_a_batch_are_dropped():
+    dedup = get_deduplicator()
+    sent = [_record("1", 0), _record("2", 1)]
+    dedup.mark_sent(DEVICE, sent)
+
+    batch = sent + [_record("1", 0, punch=1), _record("3", 2), _record("3", 2)]
+    assert dedup.filter_new(DEVICE, batch) == [_record("1", 0, punch=1), _record("3", 2)]
+    # Other devices have their own history
+    assert dedup.filter_new("10.0.0.2:4370", sent) == sent
+
+
+def test_sent_keys_survive_a_restart():
+    get_deduplicator().mark_sent(DEVICE, [_record("1", 0)])
+
+    restarted = AttendanceDeduplicator(zkteco_store.get_store())
+    assert restarted.filter_new(DEVICE, [_record("1", 0), _record("1", 1)]) == [_record("1", 1)]
+
+
+def test_filter_is_rebuilt_when_over_capacity():
+    dedup = AttendanceDeduplicator(zkteco_store.get_store(), capacity=10)
+    records = [_record(str(user), minute) for user in range(30) for minute in range(50)]
+    dedup.mark_sent(DEVICE, records)
+
+    assert dedup.filter_new(DEVICE, records) == []
+    assert dedup._filters[DEVICE].capacity >= len(records)
+
+
+def test_shared_deduplicator_per_store():
+    assert get_deduplicator() is get_deduplicator(zkteco_store.get_store())
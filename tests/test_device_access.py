@@ -0,0 +1,183 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from zkteco_live import LiveCaptureService
+from zkteco_manager import DeviceLock, ZKTecoManager, fcntl
+from zkteco_poller import DevicePoller
+
+
+def test_managers_of_one_terminal_share_a_lock(devices):
+    api, poller = ZKTecoManager(), ZKTecoManager(device_ip="10.0.0.1")
+    other = ZKTecoManager(device_ip="10.0.0.2")
+
+    assert api.lock is poller.lock
+    assert api.lock is not other.lock
+
+
+def test_lock_reports_waiting_threads(devices):
+    lock = ZKTecoManager().lock
+    acquired = threading.Event()
+
+    def wait_for_lock():
+        with lock:
+            acquired.set()
+
+    with lock:
+        assert not lock.contended
+        with lock:  # re-entrant in the holding thread
+            pass
+        waiter = threading.Thread(target=wait_for_lock)
+        waiter.start()
+        for _ in range(100):
+            if lock.contended:
+                break
+            time.sleep(0.01)
+        assert lock.contended
+        assert not acquired.is_set()
+    waiter.join(5)
+    assert acquired.is_set() and not lock.contended
+
+
+HOLD_IN_CHILD = """
+import sys
+from zkteco_manager import DeviceLock
+with DeviceLock(sys.argv[1]):
+    print("held", flush=True)
+    sys.stdin.readline()
+"""
+
+
+def _hold_in_child(path):
+    return subprocess.Popen(
+        [sys.executable, "-c", HOLD_IN_CHILD, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        env={"PYTHONPATH": os.pathsep.join(sys.path)}
+    )
+
+
+@pytest.mark.skipif(fcntl is None, reason="file locks need fcntl")
+def test_lock_is_shared_between_worker_processes(tmp_path):
+    path = str(tmp_path / "device.lock")
+    lock = DeviceLock(path)
+
+    child = _hold_in_child(path)
+    try:
+        assert child.stdout.readline() == "held\n"
+        assert not lock.acquire(timeout=0.2)
+    finally:
+        child.communicate("release\n", timeout=10)
+
+    assert lock.acquire(timeout=5)
+    try:
+        child = _hold_in_child(path)
+        for _ in range(100):
+            if lock.contended:
+                break
+            time.sleep(0.05)
+        assert lock.contended
+    finally:
+        lock.release()
+    assert child.stdout.readline() == "held\n"
+    child.communicate("release\n", timeout=10)
+
+
+def test_live_capture_pauses_when_the_terminal_is_wanted(manager):
+    service = LiveCaptureService(manager)
+    service.last_reconcile = time.time()
+    assert not service._pause_due()
+
+    def wait_for_lock():
+        with ZKTecoManager(device_ip="10.0.0.1").lock:
+            pass
+
+    with manager.lock:
+        waiter = threading.Thread(target=wait_for_lock)
+        waiter.start()
+        time.sleep(0.1)
+        assert service._pause_due()
+    waiter.join(5)
+    assert not service._pause_due()
+
+
+def test_live_streams_are_capped(manager, monkeypatch):
+    zkteco_api = pytest.importorskip("zkteco_api")
+    service = LiveCaptureService(manager, max_subscribers=2)
+    subscribers = [service.subscribe(), service.subscribe()]
+
+    assert service.subscribe() is None
+    monkeypatch.setattr(zkteco_api, "live_capture", service)
+    response = zkteco_api.app.test_client().get("/api/zkteco/live-attendance")
+    assert response.status_code == 503
+
+    service.unsubscribe(subscribers[0])
+    assert service.subscribe() is not None
+    assert service.status()["subscribers"] == 2
+
+
+def test_user_changes_on_the_source_trigger_replication(manager, monkeypatch):
+    zkteco_api = pytest.importorskip("zkteco_api")
+    triggered = []
+    replication = SimpleNamespace(source=manager, trigger=lambda: triggered.append(True))
+    monkeypatch.setattr(zkteco_api, "replication", replication)
+    monkeypatch.setattr(zkteco_api, "get_zk_manager", lambda: manager)
+
+    zkteco_api.users_changed(ZKTecoManager(device_ip="10.0.0.2"))
+    assert triggered == []
+
+    response = zkteco_api.app.test_client().post(
+        "/api/zkteco/bulk-delete-users", json={"userIds": ["1001"]}
+    )
+    assert response.get_json()["success"]
+    assert triggered == [True]
+
+
+def test_sync_requests_during_a_poll_fold_into_it(manager, monkeypatch):
+    zkteco_api = pytest.importorskip("zkteco_api")
+    device_poller = DevicePoller(manager, interval=60, jitter=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_sync(incremental=False):
+        started.set()
+        release.wait(5)
+        return {"success": True, "count": 0}
+
+    monkeypatch.setattr(manager, "sync_attendance_to_api", slow_sync)
+    monkeypatch.setattr(zkteco_api, "poller", SimpleNamespace(pollers={manager.device_key: device_poller}))
+    monkeypatch.setattr(zkteco_api, "get_zk_manager", lambda: manager)
+
+    polling = threading.Thread(target=device_poller.run_once)
+    polling.start()
+    assert started.wait(5)
+    response = zkteco_api.app.test_client().post("/api/zkteco/sync-attendance")
+    assert response.status_code == 202 and response.get_json()["coalesced"]
+    release.set()
+    polling.join(5)
+
+    assert device_poller.runs == 2 and device_poller.coalesced == 1
+    response = zkteco_api.app.test_client().post("/api/zkteco/sync-attendance")
+    assert response.status_code == 200 and response.get_json()["success"]
+    assert device_poller.runs == 3
+
+
+def test_poller_hands_over_a_wanted_terminal_without_a_session(manager, devices):
+    device_poller = DevicePoller(manager, interval=60, jitter=0)
+    device_poller.run_once()
+    assert manager.conn is not None
+
+    def wait_for_lock():
+        with ZKTecoManager(device_ip="10.0.0.1").lock:
+            pass
+
+    with manager.lock:
+        waiter = threading.Thread(target=wait_for_lock)
+        waiter.start()
+        while not manager.lock.contended:
+            time.sleep(0.01)
+        device_poller.run_once()
+        assert manager.conn is None
+    waiter.join(5)
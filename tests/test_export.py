@@ -0,0 +1,38 @@
+import io
+from datetime import timedelta
+
+import pytest
+
+from test_records import LOGS, TIMES, USERS
+from zkteco_config import STANDARD_STATUS_PROFILE
+from zkteco_export import WRITERS, read_binary, write_records
+from zkteco_records import decode_attendance
+
+
+def _records(size):
+    return list(decode_attendance(
+        LOGS[size], len(TIMES), {user.uid: user.user_id for user in USERS},
+        {user.user_id: user.name for user in USERS}, STANDARD_STATUS_PROFILE, timedelta(0)
+    ))
+
+
+@pytest.mark.parametrize("fmt", sorted(WRITERS))
+def test_16_byte_log_with_unknown_user_exports(fmt):
+    records = _records(16)
+    # User ID 3 is not in the user table, so pyzk reports its uid as the string "3"
+    assert "3" in [record["uid"] for record in records]
+
+    stream = io.BytesIO() if WRITERS[fmt].binary else io.StringIO()
+    assert write_records(records, fmt, stream) == len(records)
+
+
+def test_binary_export_round_trips_string_uids():
+    records = _records(16)
+    stream = io.BytesIO()
+    write_records(records, "binary", stream)
+    stream.seek(0)
+
+    read = list(read_binary(stream))
+    assert [r["uid"] for r in read] == [int(r["uid"]) for r in records]
+    assert [(r["user_id"], r["timestamp"], r["punch"]) for r in read] == \
+        [(r["user_id"], r["timestamp"], r["punch"]) for r in records]
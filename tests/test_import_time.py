@@ -0,0 +1,50 @@
+"""Cold-start cost of the bridge modules, each imported in a fresh interpreter"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+# module -> (heavy modules that must not be imported with it, import time budget in seconds)
+CHECKS = {
+    "zkteco_cli": (["zk", "requests", "flask", "zkteco_manager"], 0.1),
+    "zkteco_manager": (["zk", "requests", "flask"], 0.5),
+    "zkteco_api": (["zk", "requests"], 2.0),
+}
+
+
+def cold_import(module: str, forbidden) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", list(CHECKS))
+def test_cold_import(module):
+    forbidden, budget = CHECKS[module]
+    # Best of three, so a busy machine does not fail the check
+    runs = [cold_import(module, forbidden) for _ in range(3)]
+    assert runs[0]["loaded"] == []
+    assert min(run["seconds"] for run in runs) < budget
+
+
+def test_cli_help_does_not_load_the_manager():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, zkteco_cli\n"
+                               "try:\n    zkteco_cli.main(['--help'])\nexcept SystemExit:\n    pass\n"
+                               "print('zkteco_manager' in sys.modules, 'zk' in sys.modules)"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip().splitlines()[-1] == "False False"
@@ -0,0 +1,41 @@
+from zkteco_live import LiveCaptureService
+
+
+def _send(service, records):
+    for record in records:
+        service._outbox.put(record)
+    service._stop.set()
+    service._send_loop()
+
+
+def test_failed_live_punch_holds_back_the_watermark(manager, devices):
+    device = devices["10.0.0.1"]
+    user_dict = {user.user_id: user.name for user in device.users}
+    first, second = (manager._format_attendance(a, user_dict) for a in device.attendance[-2:])
+    service = LiveCaptureService(manager)
+
+    manager.backend.responses = [503]
+    _send(service, [first])
+    _send(service, [second])
+
+    assert manager.backend.received() == [second]
+    assert manager.store.get_watermark(manager.device_key) == first["timestamp"]
+
+    result = manager.archive_and_clear_attendance()
+    assert not result["success"]
+    assert len(device.attendance) == 20
+
+    service._reconcile()
+    assert first in manager.backend.received()
+    assert service.status()["unsent"] == 0
+    assert manager.store.get_watermark(manager.device_key) == second["timestamp"]
+
+
+def test_dry_run_reports_whether_the_clear_would_go_ahead(manager, devices):
+    result = manager.archive_and_clear_attendance(dry_run=True)
+    assert not result["success"] and not result["would_clear"] and not result["cleared"]
+
+    manager.sync_attendance_to_api()
+    result = manager.archive_and_clear_attendance(dry_run=True)
+    assert result["success"] and result["would_clear"] and not result["cleared"]
+    assert len(devices["10.0.0.1"].attendance) == 20
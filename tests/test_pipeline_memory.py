@@ -0,0 +1,117 @@
+"""Peak memory of the streaming attendance paths does not grow with the log
+
+Synthetic raw logs are built before measuring starts, then the export
+pipeline and the batched sync run over them under tracemalloc. Each path is
+measured at increasing record counts against its peak at the smallest one,
+which is already past the first full chunk or batch. Holding every record
+of a 32000 record log as a dict takes about 20 MB.
+"""
+import io
+import struct
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import FakeResponse, encode_time
+from zkteco_manager import ZKTecoManager
+from zkteco_pipeline import export_chunks, write_to
+
+RECORD = struct.Struct("<HBIB")
+USERS = 500
+EXPORT_COUNTS = (8000, 16000, 32000)
+SYNC_COUNTS = (2000, 4000, 8000)
+SYNC_BATCH = 500
+CEILING = 4 * 1024 * 1024
+# Allowed peak above the smallest count's, for allocator noise
+GROWTH = 1.1
+SLACK = 64 * 1024
+
+
+def build_log(count: int):
+    users = [SimpleNamespace(uid=uid, user_id=str(1000 + uid), name=f"User {uid}") for uid in range(1, USERS + 1)]
+    started = datetime(2025, 1, 1, 7)
+    body = bytearray(RECORD.size * count)
+    for i in range(count):
+        RECORD.pack_into(body, i * RECORD.size, i % USERS + 1, 0, encode_time(started + timedelta(minutes=7 * i)), i % 2)
+    return users, struct.pack("<I", len(body)) + bytes(body), count
+
+
+class NullSink(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return len(data)
+
+
+class CountingBackend:
+    """Accepts every upload and keeps only the batch sizes"""
+
+    def __init__(self):
+        self.sizes = []
+
+    def post_json(self, path, payload, timeout=None, idempotent=False):
+        if path == "/attendance/create":
+            self.sizes.append(len(payload))
+        return FakeResponse(200)
+
+
+def peak_of(run) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope="module")
+def logs():
+    return {count: build_log(count) for count in EXPORT_COUNTS + SYNC_COUNTS}
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    """Peak of each path at its smallest record count, measured once"""
+    peaks = {}
+
+    def peak(key, run):
+        if key not in peaks:
+            peaks[key] = peak_of(run)
+        return peaks[key]
+    return peak
+
+
+def assert_flat(peak, base):
+    assert peak < CEILING, f"{peak / 2 ** 20:.1f} MB"
+    assert peak <= base * GROWTH + SLACK, f"{peak} bytes against {base} at the smallest count"
+
+
+@pytest.mark.parametrize("count", EXPORT_COUNTS[1:])
+@pytest.mark.parametrize("fmt", ["ndjson", "json", "csv", "binary"])
+def test_export_pipeline_peak_memory(manager, logs, baseline, fmt, count):
+    def export(raw):
+        return lambda: write_to(export_chunks(manager, fmt, raw), NullSink())
+
+    base = baseline(fmt, export(logs[EXPORT_COUNTS[0]]))
+    assert_flat(peak_of(export(logs[count])), base)
+
+
+@pytest.mark.parametrize("count", SYNC_COUNTS[1:])
+def test_sync_uploads_in_batches_with_bounded_memory(manager, logs, baseline, monkeypatch, count):
+    def sync(target, raw, result):
+        monkeypatch.setattr(target, "_read_raw", lambda: raw)
+        target.upload_batch_size = SYNC_BATCH
+        target._backend = CountingBackend()
+        return lambda: result.update(target.sync_attendance_to_api())
+
+    # Measured on another terminal, so its uploads do not dedup this one's
+    base = baseline("sync", sync(ZKTecoManager(device_ip="10.0.0.2"), logs[SYNC_COUNTS[0]], {}))
+    result = {}
+    peak = peak_of(sync(manager, logs[count], result))
+
+    assert result["success"] and result["count"] == count
+    assert manager._backend.sizes == [SYNC_BATCH] * (count // SYNC_BATCH)
+    assert_flat(peak, base)
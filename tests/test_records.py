@@ -0,0 +1,93 @@
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+from zk import ZK
+from zk.user import User
+
+from conftest import encode_time
+from zkteco_config import STANDARD_STATUS_PROFILE
+from zkteco_records import decode_attendance, decode_time, iter_raw_attendance, record_size
+
+USERS = [User(uid, f"User{uid}", 0, "", "", str(1000 + uid), 0) for uid in range(1, 4)]
+STARTED = datetime(2025, 7, 1, 8)
+TIMES = [STARTED + timedelta(minutes=41 * i, seconds=i) for i in range(6)]
+
+
+def _buffer(layout: str, rows) -> bytes:
+    body = b"".join(struct.pack(layout, *row) for row in rows)
+    return struct.pack("<I", len(body)) + body
+
+
+def pyzk_attendance(buffer: bytes, count: int, users):
+    """What pyzk's own get_attendance makes of the same buffer"""
+    zk = ZK("127.0.0.1")
+    zk.read_sizes = lambda: setattr(zk, "records", count)
+    zk.get_users = lambda: list(users)
+    zk.read_with_buffer = lambda command, fct=0, ext=0: (buffer, len(buffer))
+    return [(a.uid, a.user_id, a.timestamp, a.status, a.punch) for a in zk.get_attendance()]
+
+
+LOGS = {
+    # uid, status, time, punch; uid 9 is not in the user table
+    8: _buffer("<HBIB", [(1 + i % 3 if i != 4 else 9, 1, encode_time(t), i % 2) for i, t in enumerate(TIMES)]),
+    # user_id, time, status, punch, reserved, workcode; 3 is a UID, not a user ID, and is not remapped
+    16: _buffer("<IIBB2sI", [(1001 + i % 3 if i != 4 else 3, encode_time(t), 1, i % 2, b"", 0)
+                             for i, t in enumerate(TIMES)]),
+    # uid, user_id, status, time, punch, reserved
+    40: _buffer("<H24sBIB8s", [(1 + i % 3, str(1001 + i % 3).encode(), 1, encode_time(t), i % 4, b"")
+                               for i, t in enumerate(TIMES)]),
+}
+
+
+def test_decode_time_round_trips():
+    for t in TIMES + [datetime(2000, 1, 1), datetime(2099, 12, 31, 23, 59, 59)]:
+        assert decode_time(encode_time(t)) == t
+
+
+@pytest.mark.parametrize("size", sorted(LOGS))
+def test_raw_records_match_pyzk(size):
+    buffer = LOGS[size]
+    assert record_size(buffer, len(TIMES)) == size
+    uid_to_user_id = {user.uid: user.user_id for user in USERS}
+    assert list(iter_raw_attendance(buffer, len(TIMES), uid_to_user_id)) == pyzk_attendance(buffer, len(TIMES), USERS)
+
+
+def test_empty_and_truncated_logs():
+    assert list(iter_raw_attendance(b"", 0, {})) == []
+    # A partial trailing record is ignored, as pyzk does
+    truncated = LOGS[40][:-10]
+    assert len(list(iter_raw_attendance(truncated, len(TIMES), {}))) == len(TIMES) - 1
+
+
+def _decode(**filters):
+    return list(decode_attendance(
+        LOGS[40], len(TIMES), {user.uid: user.user_id for user in USERS},
+        {user.user_id: user.name for user in USERS}, STANDARD_STATUS_PROFILE, timedelta(hours=3), **filters
+    ))
+
+
+def test_records_are_formatted_for_the_backend():
+    first = _decode()[0]
+    assert first == {
+        "uid": 1,
+        "user_name": "User1",
+        "user_id": "1001",
+        "timestamp": (TIMES[0] + timedelta(hours=3)).isoformat(),
+        "status": "Check-in",
+        "punch": 0,
+    }
+
+
+def test_time_range_and_user_filters():
+    records = _decode()
+    start, end = records[1]["timestamp"], records[3]["timestamp"]
+    assert _decode(start=start, end=end) == records[1:4]
+    assert _decode(user_id="1002") == [r for r in records if r["user_id"] == "1002"]
+
+
+def test_decoded_log_matches_the_pyzk_path(manager, devices):
+    device = devices["10.0.0.1"]
+    user_dict = {user.user_id: user.name for user in device.users}
+    expected = [manager._format_attendance(a, user_dict) for a in device.attendance]
+    assert list(manager.iter_attendance()) == expected
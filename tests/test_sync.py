@@ -0,0 +1,122 @@
+import zkteco_manager
+from zkteco_manager import ZKTecoManager
+
+
+def test_sync_uploads_the_log_in_batches(manager):
+    manager.upload_batch_size = 6
+
+    result = manager.sync_attendance_to_api()
+
+    assert result["success"] and result["count"] == 20
+    assert [len(payload) for path, payload in manager.backend.posts if path == "/attendance/create"] == [6, 6, 6, 2]
+    received = manager.backend.received()
+    assert manager.store.get_watermark(manager.device_key) == received[-1]["timestamp"]
+
+
+def test_failed_batch_holds_back_the_watermark(manager):
+    manager.upload_batch_size = 5
+    # user upload, first batch, second batch
+    manager.backend.responses = [200, 200, 503]
+
+    result = manager.sync_attendance_to_api(incremental=True)
+
+    assert not result["success"] and result["count"] == 5
+    sent = manager.backend.received()
+    assert len(sent) == 5
+    assert manager.store.get_watermark(manager.device_key) == sent[-1]["timestamp"]
+
+    result = manager.sync_attendance_to_api(incremental=True)
+
+    assert result["success"] and result["count"] == 15
+    received = manager.backend.received()
+    assert len({(r["user_id"], r["timestamp"]) for r in received}) == len(received) == 20
+    assert manager.store.get_watermark(manager.device_key) == received[-1]["timestamp"]
+
+
+def test_unchanged_device_is_not_downloaded_again(manager, devices):
+    manager.sync_attendance_to_api(incremental=True)
+    reads = devices["10.0.0.1"].calls.count(("read_with_buffer",))
+
+    result = manager.sync_attendance_to_api(incremental=True)
+
+    assert result["unchanged"]
+    assert devices["10.0.0.1"].calls.count(("read_with_buffer",)) == reads
+
+
+def _user_posts(manager, path):
+    return [[user["userId"] for user in payload] for posted, payload in manager.backend.posts if posted == path]
+
+
+def test_renamed_and_reenrolled_users_are_upserted(manager, devices):
+    device = devices["10.0.0.1"]
+    manager.sync_attendance_to_api()
+    assert _user_posts(manager, "/attendanceUser/upsert") == [["1001", "1002", "1003", "1004", "1005"]]
+
+    device.users[0].name = "Renamed"
+    removed = device.users.pop()
+    manager.sync_attendance_to_api()
+    assert _user_posts(manager, "/attendanceUser/upsert")[-1] == ["1001"]
+    assert manager.backend.posts[-1] == ("/attendanceUser/deactivate", {"userIds": ["1005"]})
+
+    device.users.append(removed)
+    manager.sync_attendance_to_api()
+    assert _user_posts(manager, "/attendanceUser/upsert")[-1] == ["1005"]
+
+
+def test_older_backends_get_users_through_create(manager):
+    # upsert is missing, create accepts, attendance upload
+    manager.backend.responses = [404, 200]
+    manager.sync_attendance_to_api()
+
+    assert _user_posts(manager, "/attendanceUser/create") == [["1001", "1002", "1003", "1004", "1005"]]
+
+
+def test_unchanged_attendance_is_not_kept_or_served_stale(manager, devices):
+    device = devices["10.0.0.1"]
+    records = list(device.attendance)
+    assert manager.get_attendance_data(skip_if_unchanged=True)["count"] == 20
+
+    unchanged = manager.get_attendance_data(skip_if_unchanged=True)
+    assert unchanged["unchanged"] and unchanged["data"] is None
+
+    # A rename leaves the counters as they were, the user write still forces a download
+    assert manager.update_user({"userId": "1001", "name": "Renamed"})["success"]
+    result = manager.get_attendance_data(skip_if_unchanged=True)
+    assert not result.get("unchanged")
+    assert {r["user_name"] for r in result["data"] if r["user_id"] == "1001"} == {"Renamed"}
+
+    # So does a clear followed by as many new punches, also for another manager of the terminal
+    other = ZKTecoManager(payload_format="json")
+    other._backend = manager.backend
+    for each in (manager, other):
+        each.sync_attendance_to_api(incremental=True)
+        each.get_attendance_data(skip_if_unchanged=True)
+        assert each.get_attendance_data(skip_if_unchanged=True)["unchanged"]
+    assert manager.archive_and_clear_attendance()["cleared"]
+    device.attendance.extend(records)
+    for each in (manager, other):
+        assert not each.get_attendance_data(skip_if_unchanged=True).get("unchanged")
+        assert not each.sync_attendance_to_api(incremental=True).get("unchanged")
+
+
+def test_only_a_format_rejection_turns_compact_payloads_off_for_a_while(manager):
+    path = "/attendance/create"
+    records = [{"uid": 1, "user_name": "User1", "user_id": "1001", "timestamp": "2025-07-01T08:00:00",
+                "status": "Check-in", "punch": 0}]
+    manager.payload_format = "auto"
+
+    def post():
+        manager._post_to_backend(path, records, zkteco_manager.encode_compact_attendance, timeout=30)
+        return manager.backend.posts[-1][1]
+
+    # A 400 about the records themselves is returned as is
+    manager.backend.responses = [(400, {"message": "Error creating attendance records"})]
+    assert manager._post_to_backend(path, records, zkteco_manager.encode_compact_attendance, 30).status_code == 400
+    assert isinstance(post(), dict)
+
+    manager.backend.responses = [(400, {"message": "No data provided or invalid format"})]
+    assert post() == records
+    assert post() == records
+
+    manager._compact_rejected[path] -= zkteco_manager.COMPACT_REPROBE_INTERVAL
+    assert isinstance(post(), dict)
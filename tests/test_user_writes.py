@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+
+def _user(user_id, name="New", **fields):
+    return {"userId": user_id, "name": name, **fields}
+
+
+def test_create_then_update_is_one_write(manager, devices):
+    device = devices["10.0.0.1"]
+
+    results = manager.apply_user_changes([
+        ("create", _user("2001")),
+        ("update", _user("2001", "Renamed")),
+        ("update", _user("1001", "Changed")),
+    ])
+
+    assert [r["success"] for r in results] == [True, True, True]
+    assert device.writes() == [
+        ("disable",), ("set_user", "2001"), ("set_user", "1001"), ("refresh",), ("enable",),
+    ]
+    names = {u.user_id: u.name for u in device.users}
+    assert names["2001"] == "Renamed" and names["1001"] == "Changed"
+
+
+def test_create_then_delete_writes_nothing(manager, devices):
+    results = manager.apply_user_changes([("create", _user("2001")), ("delete", {"userId": "2001"})])
+
+    assert [r["success"] for r in results] == [True, True]
+    assert devices["10.0.0.1"].writes() == []
+
+
+def test_each_change_gets_its_own_result(manager, devices):
+    results = manager.apply_user_changes([
+        ("create", _user("1001")),
+        ("update", _user("2001")),
+        ("delete", {"userId": "1002"}),
+        ("delete", {"userId": "1002"}),
+    ])
+
+    assert [r["success"] for r in results] == [False, False, True, False]
+    assert "already exists" in results[0]["message"]
+    assert "not found" in results[1]["message"]
+    assert ("delete_user", 2) in devices["10.0.0.1"].writes()
+
+
+def test_failed_write_fails_every_change_it_merged(manager, devices, monkeypatch):
+    from conftest import FakeConnection
+
+    def broken(self, **fields):
+        raise RuntimeError("device busy")
+
+    monkeypatch.setattr(FakeConnection, "set_user", broken)
+    results = manager.apply_user_changes([
+        ("update", _user("1001", "A")),
+        ("update", _user("1001", "B")),
+        ("delete", {"userId": "1002"}),
+    ])
+
+    assert [r["success"] for r in results] == [False, False, True]
+    assert "device busy" in results[0]["message"]
+    assert devices["10.0.0.1"].enabled
+
+
+def test_queue_applies_concurrent_requests_in_one_session(manager, devices, monkeypatch):
+    zkteco_api = pytest.importorskip("zkteco_api")
+    monkeypatch.setattr(zkteco_api, "get_zk_manager", lambda: manager)
+    queue = zkteco_api.UserWriteQueue(window=0.2)
+    results = {}
+
+    def submit(user_id):
+        results[user_id] = queue.submit("update", _user(user_id, "Queued"))
+
+    threads = [threading.Thread(target=submit, args=(str(1001 + i),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.stop()
+
+    assert all(result["success"] for result in results.values())
+    calls = devices["10.0.0.1"].calls
+    assert sum(call[0] == "connect" for call in calls) == 1
+    assert sum(call[0] == "set_user" for call in calls) == 4
+
+
+def test_delete_then_create_still_deletes(manager, devices):
+    device = devices["10.0.0.1"]
+
+    results = manager.apply_user_changes([
+        ("delete", {"userId": "1001"}),
+        ("create", _user("1001", "User1", uid=1)),
+    ])
+
+    assert [r["success"] for r in results] == [True, True]
+    assert device.writes() == [("disable",), ("delete_user", 1), ("set_user", "1001"), ("refresh",), ("enable",)]
+    # The old user's fingerprints went with the delete, the identical user came back
+    assert not [f for f in device.fingers if f.uid == 1]
+    assert [u.name for u in device.users if u.user_id == "1001"] == ["User1"]
+
+
+def test_roster_entry_without_a_name_fails_on_its_own(manager, devices):
+    result = manager.reconcile_users([
+        {"userId": "2001"},
+        {"userId": "2002", "name": "Named"},
+        {"userId": "1001", "name": "Renamed"},
+    ])
+
+    assert not result["success"]
+    report = result["results"]
+    assert report["failed"] == [{"userId": "2001", "action": "create", "error": "name is required to create a user"}]
+    assert report["created"] == [{"userId": "2002"}]
+    assert report["updated"] == [{"userId": "1001", "fields": ["name"]}]
+    assert {u.user_id for u in devices["10.0.0.1"].users} >= {"2002", "1001"}
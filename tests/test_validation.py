@@ -0,0 +1,63 @@
+from zkteco_validation import (
+    BULK_USER_SCHEMA, CREATE_USER_SCHEMA, DELETE_USER_SCHEMA, ROSTER_SCHEMA, USER_SCHEMA, validate_items,
+)
+
+
+def _fields(errors):
+    return [error["field"] for error in errors]
+
+
+def test_create_requires_a_user_id_that_fits_the_uid_range():
+    clean, errors = CREATE_USER_SCHEMA.validate({"userId": "65535", "userName": "A"})
+    assert not errors and clean["userId"] == "65535"
+
+    _, errors = CREATE_USER_SCHEMA.validate({"userId": "100234", "userName": "A"})
+    assert _fields(errors) == ["userId"]
+
+
+def test_update_delete_and_roster_accept_long_user_ids():
+    for schema, item in (
+        (USER_SCHEMA, {"userId": "100234", "userName": "A"}),
+        (DELETE_USER_SCHEMA, {"userId": "100234"}),
+        (ROSTER_SCHEMA, {"userId": "100234"}),
+    ):
+        clean, errors = schema.validate(item)
+        assert not errors and clean["userId"] == "100234"
+
+
+def test_user_id_limits():
+    for value in ("", "12a", "1234567890", True, 1.5):
+        _, errors = USER_SCHEMA.validate({"userId": value, "userName": "A"})
+        assert _fields(errors) == ["userId"], value
+
+
+def test_only_user_and_admin_privileges_are_accepted():
+    for privilege in (0, 14):
+        _, errors = USER_SCHEMA.validate({"userId": "1", "userName": "A", "privilege": privilege})
+        assert not errors
+    for privilege in (2, 6, 3):
+        _, errors = USER_SCHEMA.validate({"userId": "1", "userName": "A", "privilege": privilege})
+        assert _fields(errors) == ["privilege"]
+
+
+def test_name_and_password_are_limited_in_bytes():
+    _, errors = USER_SCHEMA.validate({"userId": "1", "userName": "é" * 13, "password": "123456789"})
+    assert sorted(_fields(errors)) == ["password", "userName"]
+
+
+def test_bulk_items_are_validated_one_by_one():
+    valid, failed = validate_items(BULK_USER_SCHEMA, [
+        {"userId": "1", "name": "A"},
+        {"userId": "1", "name": "B"},
+        {"userId": "2"},
+        {"userId": "3", "name": "C", "uid": 70000},
+    ])
+    assert [item["userId"] for item in valid] == ["1"]
+    assert [item["index"] for item in failed] == [1, 2, 3]
+
+
+def test_reconcile_gives_long_user_ids_a_free_uid(manager, devices):
+    result = manager.reconcile_users([{"userId": "100234", "name": "Long"}])
+    assert result["success"]
+    user = next(u for u in devices["10.0.0.1"].users if u.user_id == "100234")
+    assert user.uid == 6
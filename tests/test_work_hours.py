@@ -0,0 +1,53 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from zk.attendance import Attendance
+
+from zkteco_shifts import WorkHoursEngine, pair_user_punches
+from zkteco_store import LocalStore
+
+
+def test_work_hours_come_from_the_store_and_survive_a_restart(manager, devices):
+    device = devices["10.0.0.1"]
+    assert manager.refresh_archive()["count"] == 20
+    rows = WorkHoursEngine(manager.store).query(device=manager.device_key)
+
+    archived = manager.store.get_archived_attendance(manager.device_key, user_id="1001")
+    expected = pair_user_punches([(datetime.fromisoformat(r["timestamp"]), r["punch"]) for r in archived])
+    fields = ("first_in", "last_out", "shifts", "worked_minutes", "break_minutes", "overtime_minutes", "issues")
+    for date, day in expected.items():
+        row = next(row for row in rows if row["user_id"] == "1001" and row["date"] == date)
+        assert {key: row[key] for key in fields} == {key: day[key] for key in fields}
+
+    assert manager.refresh_archive()["unchanged"]
+    restarted = WorkHoursEngine(LocalStore(manager.store.path))
+    assert restarted.query(device=manager.device_key) == rows
+
+
+def test_refresh_only_decodes_records_from_the_sync_watermark(manager, devices):
+    device = devices["10.0.0.1"]
+    manager.sync_attendance_to_api()
+    last = device.attendance[-1]
+    device.attendance.append(Attendance("1001", last.timestamp + timedelta(minutes=5), 1, 1, 1))
+    version = WorkHoursEngine(manager.store).version
+
+    # The newest synced record (at the watermark) and the new punch
+    assert manager.refresh_archive()["count"] == 2
+    assert WorkHoursEngine(manager.store).version > version
+
+
+def test_older_stores_get_the_new_aggregate_columns(tmp_path):
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE daily_aggregates (device TEXT NOT NULL, user_id TEXT NOT NULL, day TEXT NOT NULL, "
+        "user_name TEXT, first_in TEXT, last_out TEXT, punch_count INTEGER NOT NULL, "
+        "worked_minutes REAL NOT NULL, break_minutes REAL NOT NULL, overtime_minutes REAL NOT NULL, "
+        "updated_at TEXT NOT NULL, PRIMARY KEY (device, user_id, day))"
+    )
+    db.execute("INSERT INTO daily_aggregates VALUES ('d', '1', '2025-07-01', 'A', NULL, NULL, 1, 0, 0, 0, 'now')")
+    db.commit()
+    db.close()
+
+    rows = WorkHoursEngine(LocalStore(path)).query()
+    assert rows[0]["shifts"] == 0 and rows[0]["issues"] == []
@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+from zkteco_shifts import pair_user_punches
+from zkteco_store import LocalStore
+
+MAX_SHIFT_HOURS = 16
+STANDARD_MINUTES = 480
+
+
+def ingest_attendance(store: LocalStore, device: str, records: List[Dict[str, Any]]) -> int:
+    """Archive records and refresh the daily aggregates of every user-day they touch
+
+    Returns the number of user-days recomputed. Records already in the archive
+    are ignored, so feeding the same log again costs one lookup per record.
+    """
+    new_records = store.archive_attendance(device, records)
+    if not new_records:
+        return 0
+
+    # A punch can close a shift that started the day before, so refresh that day too
+    touched = set()
+    for record in new_records:
+        day = date.fromisoformat(record["timestamp"][:10])
+        touched.add((record["user_id"], day))
+        touched.add((record["user_id"], day - timedelta(days=1)))
+
+    margin = timedelta(hours=MAX_SHIFT_HOURS)
+    rows = []
+    for user_id, day in touched:
+        start = datetime.combine(day, datetime.min.time()) - margin
+        end = datetime.combine(day + timedelta(days=1), datetime.min.time()) + margin
+        punches = store.get_user_punches(device, user_id, start.isoformat(), end.isoformat())
+
+        day_key = day.isoformat()
+        day_punches = [p for p in punches if p[0].startswith(day_key)]
+        if not day_punches:
+            continue
+
+        paired = pair_user_punches(
+            [(datetime.fromisoformat(ts), punch) for ts, punch, _ in punches],
+            MAX_SHIFT_HOURS, STANDARD_MINUTES
+        ).get(day_key, {})
+
+        rows.append({
+            "device": device,
+            "user_id": user_id,
+            "day": day_key,
+            "user_name": day_punches[-1][2],
+            "first_in": paired.get("first_in"),
+            "last_out": paired.get("last_out"),
+            "punch_count": len(day_punches),
+            "worked_minutes": paired.get("worked_minutes", 0.0),
+            "break_minutes": paired.get("break_minutes", 0.0),
+            "overtime_minutes": paired.get("overtime_minutes", 0.0),
+            "shifts": paired.get("shifts", 0),
+            "issues": paired.get("issues", []),
+            "open_shift_since": paired.get("open_shift_since"),
+        })
+
+    store.upsert_daily_aggregates(rows)
+    print(f"Archived {len(new_records)} new records, refreshed {len(rows)} daily aggregates for {device}")
+    return len(rows)
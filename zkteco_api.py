@@ -1,19 +1,250 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from zkteco_config import get_registry
 from zkteco_manager import ZKTecoManager
+from zkteco_pipeline import CONTENT_TYPES, export_chunks
+from zkteco_poller import AttendancePoller, parse_devices
+from zkteco_live import LiveCaptureService
+from zkteco_replication import ReplicationService
+from zkteco_shifts import WorkHoursEngine
+from zkteco_templates import backup_path
+from zkteco_validation import (
+    BULK_USER_SCHEMA, CREATE_USER_SCHEMA, DELETE_USER_SCHEMA, ROSTER_SCHEMA, USER_SCHEMA,
+    check_user_id, format_errors, validate_items
+)
+import functools
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Initialize ZKTeco manager
-zk_manager = ZKTecoManager()
+# ZKTeco manager for request handlers, built on first use so importing the app stays cheap
+_zk_manager = None
+_zk_manager_lock = threading.Lock()
+
+def get_zk_manager() -> ZKTecoManager:
+    global _zk_manager
+    with _zk_manager_lock:
+        if _zk_manager is None:
+            _zk_manager = ZKTecoManager()
+        return _zk_manager
+
+# Set while the server shuts down so long-lived streams end
+shutting_down = threading.Event()
+
+def device_route(view):
+    """Serialize requests that use the shared device session
+
+    The server handles requests on several threads but the manager holds a single
+    connection, so device calls take turns while store-backed routes run freely.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with get_zk_manager().lock:
+            return view(*args, **kwargs)
+    return wrapper
+
+class UserWriteQueue:
+    """Write-behind queue for single-user creates, updates and deletes
+
+    The admin UI sends these one request at a time. Changes arriving within
+    window seconds of each other are applied together in one device session
+    (ZKTecoManager.apply_user_changes), which also merges redundant writes to
+    the same user. Each request still waits for and returns its own result.
+    """
+
+    def __init__(self, window: float = 0.2):
+        self.window = window
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, action: str, user_data) -> dict:
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Server is shutting down")
+            self._pending.append((action, user_data, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="user-write-queue", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future.result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # Give requests sent right after this one a chance to join the session
+            if not self._stopping:
+                time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            self._apply(batch)
+
+    def _apply(self, batch):
+        zk_manager = get_zk_manager()
+        try:
+            with zk_manager.lock:
+                results = zk_manager.apply_user_changes([(action, data) for action, data, _ in batch])
+            if any(result["success"] for result in results):
+                users_changed(zk_manager)
+        except Exception as e:
+            results = [{"success": False, "message": f"Error applying user changes: {str(e)}"}] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stop(self, timeout: float = 30):
+        """Apply what is queued and stop the worker"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+user_writes = UserWriteQueue(window=float(os.environ.get("ZKTECO_WRITE_WINDOW", "0.2")))
+
+# Paired shifts and work hours, updated as new punches are fetched
+work_hours = WorkHoursEngine()
+
+# Background poller, started when ZKTECO_POLL_INTERVAL is set
+poller = None
+
+def start_poller():
+    """Start the background attendance poller configured through the environment"""
+    global poller
+    interval = os.environ.get("ZKTECO_POLL_INTERVAL")
+    if not interval or poller is not None:
+        return poller
+    
+    devices = parse_devices(os.environ.get("ZKTECO_POLL_DEVICES", get_zk_manager().device_key))
+    poller = AttendancePoller(
+        [ZKTecoManager(**device) for device in devices],
+        interval=float(interval),
+        jitter=float(os.environ.get("ZKTECO_POLL_JITTER", "0.2"))
+    )
+    poller.start()
+    return poller
+
+# Real-time punch streaming, started when ZKTECO_LIVE_CAPTURE is set
+live_capture = None
+
+def start_live_capture():
+    """Start live capture on the device configured through the environment"""
+    global live_capture
+    if not os.environ.get("ZKTECO_LIVE_CAPTURE") or live_capture is not None:
+        return live_capture
+    
+    device = parse_devices(os.environ.get("ZKTECO_LIVE_DEVICE", get_zk_manager().device_key))[0]
+    live_capture = LiveCaptureService(
+        ZKTecoManager(**device),
+        reconcile_interval=float(os.environ.get("ZKTECO_LIVE_RECONCILE_INTERVAL", "300")),
+        # Every open event stream holds a request thread for as long as it lasts
+        max_subscribers=int(os.environ.get("ZKTECO_LIVE_MAX_SUBSCRIBERS", "4"))
+    )
+    live_capture.start()
+    return live_capture
+
+# User and template replication, started when ZKTECO_REPLICATION_TARGETS is set
+replication = None
+
+def start_replication():
+    """Start replication from the source device to the targets configured through the environment"""
+    global replication
+    targets = os.environ.get("ZKTECO_REPLICATION_TARGETS")
+    if not targets or replication is not None:
+        return replication
+    
+    source = parse_devices(os.environ.get("ZKTECO_REPLICATION_SOURCE", get_zk_manager().device_key))[0]
+    replication = ReplicationService(
+        ZKTecoManager(**source),
+        [ZKTecoManager(**device) for device in parse_devices(targets)],
+        interval=float(os.environ.get("ZKTECO_REPLICATION_INTERVAL", "300"))
+    )
+    replication.start()
+    return replication
+
+def users_changed(zk_manager: ZKTecoManager):
+    """Replicate user changes made on the source device now instead of at the next pass"""
+    if replication is not None and replication.source.device_key == zk_manager.device_key:
+        replication.trigger()
+
+def start_background_services():
+    """Start the poller, live capture and replication if they are configured"""
+    start_poller()
+    start_live_capture()
+    start_replication()
+
+def shutdown(timeout: float = 30):
+    """Stop background services and release device sessions and backend connections"""
+    shutting_down.set()
+    user_writes.stop(timeout)
+    for service in (poller, live_capture, replication):
+        if service is not None:
+            service.stop(timeout)
+    if _zk_manager is not None:
+        # Waits for an in-flight device request to finish before dropping the session
+        with _zk_manager.lock:
+            _zk_manager.keep_alive = False
+            _zk_manager.disconnect()
+    from zkteco_backend import close_backend_clients
+    close_backend_clients()
+    print("ZKTeco API shut down")
+
+def _conditional_json(etag, build):
+    """JSON response tagged with etag, or 304 if the client already holds that version
+
+    build is only called when the body is actually needed.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate before reusing it
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def _invalid(errors):
+    """400 response for a payload rejected before any device I/O"""
+    return jsonify({
+        "success": False,
+        "message": f"Invalid request: {format_errors(errors)}",
+        "errors": errors
+    }), 400
+
+def _with_rejected(result, rejected):
+    """Add items that failed validation to a bulk result as failures"""
+    if not rejected:
+        return result
+    results = result.setdefault("results", {"success": [], "failed": [], "summary": {}})
+    results["failed"] = rejected + results.get("failed", [])
+    summary = results.setdefault("summary", {})
+    summary["total"] = summary.get("total", 0) + len(rejected)
+    summary["failed"] = summary.get("failed", 0) + len(rejected)
+    summary["rejected"] = len(rejected)
+    result["success"] = False
+    result["message"] = f"{result.get('message', '')} ({len(rejected)} rejected by validation)".strip()
+    return result
 
 @app.route('/api/zkteco/get-users', methods=['POST'])
+@device_route
 def get_users():
     """Get all users from ZKTeco device"""
     try:
-        result = zk_manager.get_users()
+        result = get_zk_manager().get_users()
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -26,18 +257,12 @@ def get_users():
 def create_user():
     """Create a new user on ZKTeco device"""
     try:
-        data = request.get_json()
-        
-        # Map React component data to ZKTeco format
-        user_data = {
-            "userId": data.get("userId"),
-            "name": data.get("userName"),
-            "password": data.get("password", ""),
-            "privilege": data.get("privilege", 0),
-            "cardNumber": data.get("cardNumber", "")
-        }
+        # Map React component data to ZKTeco format, rejecting bad input before connecting
+        user_data, errors = CREATE_USER_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return _invalid(errors)
         
-        result = zk_manager.create_user(user_data)
+        result = user_writes.submit("create", user_data)
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -49,18 +274,12 @@ def create_user():
 def update_user():
     """Update an existing user on ZKTeco device"""
     try:
-        data = request.get_json()
+        # Map React component data to ZKTeco format, rejecting bad input before connecting
+        user_data, errors = USER_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return _invalid(errors)
         
-        # Map React component data to ZKTeco format
-        user_data = {
-            "userId": data.get("userId"),
-            "name": data.get("userName"),
-            "password": data.get("password", ""),
-            "privilege": data.get("privilege", 0),
-            "cardNumber": data.get("cardNumber", "")
-        }
-        
-        result = zk_manager.update_user(user_data)
+        result = user_writes.submit("update", user_data)
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -72,16 +291,11 @@ def update_user():
 def delete_user():
     """Delete a user from ZKTeco device"""
     try:
-        data = request.get_json()
-        user_id = data.get("userId")
-        
-        if not user_id:
-            return jsonify({
-                "success": False,
-                "message": "User ID is required"
-            }), 400
+        data, errors = DELETE_USER_SCHEMA.validate(request.get_json(silent=True))
+        if errors:
+            return _invalid(errors)
         
-        result = zk_manager.delete_user(user_id)
+        result = user_writes.submit("delete", data)
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -90,20 +304,32 @@ def delete_user():
         }), 500
 
 @app.route('/api/zkteco/bulk-delete-users', methods=['POST'])
+@device_route
 def bulk_delete_users():
     """Delete multiple users from ZKTeco device"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         user_ids = data.get("userIds", [])
         
-        if not user_ids:
+        if not user_ids or not isinstance(user_ids, list):
             return jsonify({
                 "success": False,
                 "message": "User IDs are required"
             }), 400
         
-        result = zk_manager.bulk_delete_users(user_ids)
-        return jsonify(result)
+        valid_ids, rejected = [], []
+        for index, user_id in enumerate(user_ids):
+            try:
+                valid_ids.append(check_user_id(user_id))
+            except ValueError as e:
+                rejected.append({"index": index, "userId": user_id, "error": f"userId {e}"})
+        if not valid_ids:
+            return _invalid([{"field": f"userIds[{r['index']}]", "error": r["error"]} for r in rejected])
+        
+        result = get_zk_manager().bulk_delete_users(valid_ids)
+        if result.get("success"):
+            users_changed(get_zk_manager())
+        return jsonify(_with_rejected(result, rejected))
     except Exception as e:
         return jsonify({
             "success": False,
@@ -111,31 +337,80 @@ def bulk_delete_users():
         }), 500
 
 @app.route('/api/zkteco/bulk-create-users', methods=['POST'])
+@device_route
 def bulk_create_users():
     """Create multiple users on ZKTeco device"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         users_data = data.get("usersData", [])
         
-        if not users_data:
+        if not users_data or not isinstance(users_data, list):
             return jsonify({
                 "success": False,
                 "message": "Users data is required"
             }), 400
         
-        result = zk_manager.bulk_create_users(users_data)
-        return jsonify(result)
+        # Invalid items are reported per item; the rest still go out in one device session
+        valid_users, rejected = validate_items(BULK_USER_SCHEMA, users_data)
+        if not valid_users:
+            return _invalid([{"field": f"usersData[{r['index']}]", "error": r["error"]} for r in rejected])
+        
+        result = get_zk_manager().bulk_create_users(valid_users)
+        if result.get("success"):
+            users_changed(get_zk_manager())
+        return jsonify(_with_rejected(result, rejected))
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"Error bulk creating users: {str(e)}"
         }), 500
 
+@app.route('/api/zkteco/reconcile-users', methods=['POST'])
+@device_route
+def reconcile_users():
+    """Apply only the creates, updates and deletes needed to match the HR roster"""
+    try:
+        data = request.get_json(silent=True) or {}
+        roster = data.get("roster")
+        
+        if not isinstance(roster, list):
+            return jsonify({
+                "success": False,
+                "message": "Roster is required"
+            }), 400
+        
+        # Map React component data to ZKTeco format, keeping only fields that were sent.
+        # A dropped entry would look like a missing user, so any invalid entry rejects the roster.
+        entries, rejected = validate_items(ROSTER_SCHEMA, roster)
+        if rejected:
+            return _invalid([{"field": f"roster[{r['index']}]", "error": r["error"]} for r in rejected])
+        
+        dry_run = bool(data.get("dryRun", False))
+        result = get_zk_manager().reconcile_users(
+            entries,
+            delete_missing=bool(data.get("deleteMissing", False)),
+            dry_run=dry_run
+        )
+        if result.get("success") and not dry_run:
+            users_changed(get_zk_manager())
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error reconciling users: {str(e)}"
+        }), 500
+
 @app.route('/api/zkteco/get-attendance', methods=['POST'])
+@device_route
 def get_attendance():
-    """Get attendance data from ZKTeco device"""
+    """Get attendance data from ZKTeco device
+
+    Dashboards poll this endpoint. Unless skipIfUnchanged is false, a call that
+    finds the device counters unmoved answers unchanged=true without data.
+    """
     try:
-        result = zk_manager.get_attendance_data()
+        data = request.get_json(silent=True) or {}
+        result = get_zk_manager().get_attendance_data(skip_if_unchanged=bool(data.get("skipIfUnchanged", True)))
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -146,9 +421,29 @@ def get_attendance():
 
 @app.route('/api/zkteco/sync-attendance', methods=['POST'])
 def sync_attendance():
-    """Sync attendance data to API server"""
+    """Sync attendance data to API server
+
+    When the poller covers the device the sync runs as one of its polls, so a
+    request arriving during a poll folds into it instead of pulling the log again.
+    """
     try:
-        result = zk_manager.sync_attendance_to_api()
+        zk_manager = get_zk_manager()
+        device_poller = poller.pollers.get(zk_manager.device_key) if poller else None
+        if device_poller is not None:
+            if not device_poller.run_once():
+                return jsonify({
+                    "success": True,
+                    "coalesced": True,
+                    "message": "A poll of this device is running, it will sync once more when it finishes"
+                }), 202
+            return jsonify({
+                "success": device_poller.last_error is None,
+                "message": device_poller.last_error or f"Synced {device_poller.last_count} attendance records",
+                "count": device_poller.last_count
+            })
+        
+        with zk_manager.lock:
+            result = zk_manager.sync_attendance_to_api()
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -156,12 +451,391 @@ def sync_attendance():
             "message": f"Error syncing attendance data: {str(e)}"
         }), 500
 
+@app.route('/api/zkteco/users', methods=['GET'])
+def list_users():
+    """Device users from the local cache; the device is read only when the cache is missing or stale"""
+    zk_manager = get_zk_manager()
+    try:
+        device = zk_manager.device_key
+        version = zk_manager.store.get_device_users_version(device)
+        if version is None or request.args.get("refresh") == "1":
+            with zk_manager.lock:
+                result = zk_manager.get_users()
+            if not result["success"]:
+                return jsonify(result), 502
+            version = zk_manager.store.get_device_users_version(device)
+            if version is None:
+                return jsonify(result)
+        
+        def _build():
+            users = zk_manager.store.get_device_users(device)
+            return {
+                "success": True,
+                "message": f"Retrieved {len(users)} users from cache",
+                "count": len(users),
+                "version": version,
+                "users": users
+            }
+        
+        return _conditional_json(f"users-{device}-{version}", _build)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error getting users: {str(e)}",
+            "users": []
+        }), 500
+
+@app.route('/api/zkteco/attendance', methods=['GET'])
+def list_attendance():
+    """Attendance records from the local archive, filtered by from/to date and userId
+
+    The archive is kept current by syncs, the poller and live capture; pass
+    refresh=1 to pull new records from the device first.
+    """
+    zk_manager = get_zk_manager()
+    try:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        try:
+            for value in (start, end):
+                if value:
+                    datetime.fromisoformat(value)
+        except ValueError:
+            return jsonify({"success": False, "message": "from and to must be ISO dates", "data": []}), 400
+        if end and len(end) == 10:
+            end += "T23:59:59.999999"
+        
+        if request.args.get("refresh") == "1":
+            with zk_manager.lock:
+                result = zk_manager.get_attendance_data(skip_if_unchanged=True)
+            if not result["success"]:
+                return jsonify(result), 502
+        
+        # The archive only grows, so its newest row id versions every possible result
+        query = hashlib.sha1(f"{start}|{end}|{request.args.get('userId')}".encode("utf-8")).hexdigest()[:12]
+        etag = f"attendance-{zk_manager.store.archive_version()}-{query}"
+        
+        def _build():
+            records = zk_manager.store.get_archived_attendance(
+                zk_manager.device_key, start, end, user_id=request.args.get("userId")
+            )
+            return {
+                "success": True,
+                "message": f"Retrieved {len(records)} attendance records from archive",
+                "count": len(records),
+                "data": records
+            }
+        
+        return _conditional_json(etag, _build)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error getting attendance data: {str(e)}",
+            "data": []
+        }), 500
+
+@app.route('/api/zkteco/attendance/export', methods=['GET'])
+def export_attendance():
+    """Stream the full device log as ndjson, json, csv or binary without building it in memory
+
+    The device is read while holding the session lock; decoding and encoding
+    happen as the client downloads, one chunk at a time.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in CONTENT_TYPES:
+        return jsonify({"success": False, "message": f"format must be one of {', '.join(CONTENT_TYPES)}"}), 400
+    start = request.args.get("from")
+    end = request.args.get("to")
+    if end and len(end) == 10:
+        end += "T23:59:59.999999"
+    
+    zk_manager = get_zk_manager()
+    try:
+        with zk_manager.lock:
+            raw = zk_manager.read_raw_attendance()
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error reading attendance log: {str(e)}"}), 502
+    
+    chunks = export_chunks(zk_manager, fmt, raw, start, end, request.args.get("userId"))
+    response = Response(chunks, mimetype=CONTENT_TYPES[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=attendance.{'bin' if fmt == 'binary' else fmt}"
+    return response
+
+@app.route('/api/zkteco/work-hours', methods=['GET'])
+@device_route
+def get_work_hours():
+    """Worked, break and overtime minutes per user and day, from the local daily aggregates"""
+    try:
+        # Skips the download when the device counters have not moved
+        zk_manager = get_zk_manager()
+        result = zk_manager.refresh_archive()
+        if not result["success"]:
+            return jsonify({
+                "success": False,
+                "message": result["message"],
+                "data": []
+            }), 502
+        
+        rows = work_hours.query(
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+            user_id=request.args.get("userId"),
+            device=zk_manager.device_key
+        )
+        return jsonify({
+            "success": True,
+            "message": f"Computed work hours for {len(rows)} user-days",
+            "count": len(rows),
+            "version": work_hours.version,
+            "data": rows
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error computing work hours: {str(e)}",
+            "data": []
+        }), 500
+
+@app.route('/api/zkteco/reports/daily', methods=['GET'])
+def daily_report():
+    """First in, last out, punch count and worked minutes per user for one day"""
+    try:
+        day = request.args.get("date", date.today().isoformat())
+        rows = get_zk_manager().store.get_daily_aggregates(day, day, user_id=request.args.get("userId"))
+        return jsonify({"success": True, "date": day, "count": len(rows), "data": rows})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error building daily report: {str(e)}",
+            "data": []
+        }), 500
+
+@app.route('/api/zkteco/reports/late', methods=['GET'])
+def late_report():
+    """Users whose first check-in of the day was after the shift start plus grace minutes"""
+    try:
+        day = request.args.get("date", date.today().isoformat())
+        start = request.args.get("start", "08:00")
+        grace = request.args.get("grace", 0, type=int)
+        cutoff = datetime.fromisoformat(f"{day}T{start}") + timedelta(minutes=grace)
+        
+        rows = [
+            {**row, "late_minutes": round((datetime.fromisoformat(row["first_in"]) - cutoff).total_seconds() / 60, 1)}
+            for row in get_zk_manager().store.get_daily_aggregates(day, day)
+            if row["first_in"] and datetime.fromisoformat(row["first_in"]) > cutoff
+        ]
+        return jsonify({"success": True, "date": day, "cutoff": cutoff.isoformat(), "count": len(rows), "data": rows})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error building late report: {str(e)}",
+            "data": []
+        }), 500
+
+@app.route('/api/zkteco/reports/hours', methods=['GET'])
+def hours_report():
+    """Total worked, break and overtime minutes per user over a date range (default: this month)"""
+    try:
+        today = date.today()
+        date_from = request.args.get("from", today.replace(day=1).isoformat())
+        date_to = request.args.get("to", today.isoformat())
+        rows = get_zk_manager().store.sum_daily_aggregates(date_from, date_to)
+        return jsonify({"success": True, "from": date_from, "to": date_to, "count": len(rows), "data": rows})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error building hours report: {str(e)}",
+            "data": []
+        }), 500
+
+@app.route('/api/zkteco/live-attendance', methods=['GET'])
+def live_attendance():
+    """Server-Sent Events stream of punches as the device reports them"""
+    if live_capture is None:
+        return jsonify({
+            "success": False,
+            "message": "Live capture is not enabled (set ZKTECO_LIVE_CAPTURE=1)"
+        }), 503
+    
+    subscriber = live_capture.subscribe()
+    if subscriber is None:
+        return jsonify({
+            "success": False,
+            "message": f"Too many live attendance streams open (limit {live_capture.max_subscribers})"
+        }), 503
+    
+    def _events():
+        try:
+            yield "retry: 3000\n\n"
+            while not shutting_down.is_set():
+                try:
+                    record = subscriber.get(timeout=15)
+                    yield f"event: punch\ndata: {json.dumps(record)}\n\n"
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+        finally:
+            live_capture.unsubscribe(subscriber)
+    
+    return Response(
+        stream_with_context(_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/zkteco/archive-attendance', methods=['POST'])
+@device_route
+def archive_attendance():
+    """Archive the device attendance log locally and clear it from the device"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = get_zk_manager().archive_and_clear_attendance(
+            dry_run=bool(data.get("dryRun", False)),
+            require_synced=bool(data.get("requireSynced", True))
+        )
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error archiving attendance data: {str(e)}"
+        }), 500
+
+@app.route('/api/zkteco/clear-audit', methods=['GET'])
+def clear_audit():
+    """Audit trail of archive-and-clear runs"""
+    try:
+        entries = get_zk_manager().store.get_clear_audit(
+            device=request.args.get("device"),
+            limit=request.args.get("limit", 100, type=int)
+        )
+        return jsonify({"success": True, "count": len(entries), "entries": entries})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error reading clear audit: {str(e)}",
+            "entries": []
+        }), 500
+
+@app.route('/api/zkteco/templates/export', methods=['POST'])
+@device_route
+def export_templates():
+    """Back up device users and fingerprint templates to a file in the backup directory"""
+    try:
+        data = request.get_json(silent=True) or {}
+        file_name = data.get("fileName") or f"templates-{datetime.now():%Y%m%d-%H%M%S}.zkb"
+        result = get_zk_manager().export_templates(backup_path(file_name))
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error exporting templates: {str(e)}"
+        }), 500
+
+@app.route('/api/zkteco/templates/import', methods=['POST'])
+@device_route
+def import_templates():
+    """Restore users and fingerprint templates from a file in the backup directory"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get("fileName"):
+            return jsonify({"success": False, "message": "fileName is required"}), 400
+        path = backup_path(data["fileName"])
+        if not os.path.exists(path):
+            return jsonify({"success": False, "message": f"Backup {data['fileName']} not found"}), 404
+        result = get_zk_manager().import_templates(path)
+        if result.get("success"):
+            users_changed(get_zk_manager())
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error importing templates: {str(e)}"
+        }), 500
+
+@app.route('/api/zkteco/replication', methods=['GET'])
+def replication_status():
+    """Replication lag and conflicts per target device"""
+    if replication is None:
+        return jsonify({"success": False, "message": "Replication is not configured"}), 404
+    return jsonify({"success": True, "replication": replication.status()})
+
+@app.route('/api/zkteco/replication/run', methods=['POST'])
+def run_replication():
+    """Run a replication pass now and return the per-target results"""
+    if replication is None:
+        return jsonify({"success": False, "message": "Replication is not configured"}), 404
+    try:
+        return jsonify(replication.run_once())
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error replicating users: {str(e)}"
+        }), 500
+
+@app.route('/api/zkteco/devices', methods=['GET'])
+def list_devices():
+    """Configured device profiles"""
+    registry = get_registry()
+    profiles = registry.profiles()
+    return jsonify({
+        "success": True,
+        "version": registry.version,
+        "config_error": registry.last_error,
+        "count": len(profiles),
+        "devices": [profile.to_dict() for profile in profiles]
+    })
+
+@app.route('/api/zkteco/devices/reload', methods=['POST'])
+def reload_devices():
+    """Re-read the device configuration now; managers apply it on their next connect"""
+    registry = get_registry()
+    if not registry.reload():
+        return jsonify({"success": False, "message": registry.last_error}), 400
+    return jsonify({
+        "success": True,
+        "message": f"Loaded {len(registry.profiles())} device profiles",
+        "version": registry.version
+    })
+
+@app.route('/api/zkteco/transport', methods=['GET'])
+def get_transport():
+    """Transport used for the default device and the latency probe it was chosen by"""
+    zk_manager = get_zk_manager()
+    return jsonify({
+        "success": True,
+        "device": zk_manager.device_key,
+        "configured": zk_manager.transport,
+        "probe": zk_manager.store.get_transport(zk_manager.device_key)
+    })
+
+@app.route('/api/zkteco/transport/probe', methods=['POST'])
+@device_route
+def probe_transport():
+    """Measure TCP and UDP latency now and switch to the faster transport"""
+    result = get_zk_manager().negotiate_transport()
+    return jsonify(result), 200 if result["success"] else 502
+
+@app.route('/api/zkteco/backend-stats', methods=['GET'])
+def backend_stats():
+    """Latency and transfer size report for calls to the backend API"""
+    return jsonify({
+        "success": True,
+        "report": get_zk_manager().backend.get_report()
+    })
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "message": "ZKTeco API server is running"
+        "message": "ZKTeco API server is running",
+        "poller": poller.status() if poller else None,
+        "live_capture": live_capture.status() if live_capture else None,
+        "replication": replication.status() if replication else None
     })
 
 if __name__ == '__main__':
@@ -173,8 +847,33 @@ if __name__ == '__main__':
     print("  POST /api/zkteco/delete-user")
     print("  POST /api/zkteco/bulk-delete-users")
     print("  POST /api/zkteco/bulk-create-users")
+    print("  POST /api/zkteco/reconcile-users")
     print("  POST /api/zkteco/get-attendance")
     print("  POST /api/zkteco/sync-attendance")
+    print("  GET  /api/zkteco/users")
+    print("  GET  /api/zkteco/attendance")
+    print("  GET  /api/zkteco/attendance/export")
+    print("  GET  /api/zkteco/work-hours")
+    print("  GET  /api/zkteco/reports/daily")
+    print("  GET  /api/zkteco/reports/late")
+    print("  GET  /api/zkteco/reports/hours")
+    print("  GET  /api/zkteco/live-attendance")
+    print("  POST /api/zkteco/archive-attendance")
+    print("  GET  /api/zkteco/clear-audit")
+    print("  POST /api/zkteco/templates/export")
+    print("  POST /api/zkteco/templates/import")
+    print("  GET  /api/zkteco/replication")
+    print("  POST /api/zkteco/replication/run")
+    print("  GET  /api/zkteco/devices")
+    print("  POST /api/zkteco/devices/reload")
+    print("  GET  /api/zkteco/transport")
+    print("  POST /api/zkteco/transport/probe")
+    print("  GET  /api/zkteco/backend-stats")
     print("  GET  /health")
     
+    # The debug reloader runs this block twice; only the serving child polls
+    # Development server only; run zkteco_serve.py in production
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+    
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
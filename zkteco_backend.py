@@ -0,0 +1,209 @@
+import gzip
+import json
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Methods that are safe to resend after the request has reached the server
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+RETRY_STATUS_CODES = (502, 503, 504)
+COMPRESSIONS = ("gzip", "deflate")
+
+
+class BackendClient:
+    """Pooled HTTP client for calls from the bridge to the backend API"""
+
+    def __init__(self, base_url: str, pool_size: int = 10, max_retries: int = 3,
+                 backoff_factor: float = 0.5, timeout: int = 30,
+                 compression: Optional[str] = "gzip", compress_min_size: int = 1024):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        if compression not in COMPRESSIONS + (None,):
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.compression = compression
+        self.compress_min_size = compress_min_size
+
+        self.session = requests.Session()
+        # No retries in the adapter: request() is the only retry layer
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _encode_body(self, payload: Any) -> Dict[str, Any]:
+        """Serialize a JSON payload and compress it when it is large enough to benefit"""
+        raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        body = raw
+
+        if self.compression and len(raw) >= self.compress_min_size:
+            if self.compression == "gzip":
+                body = gzip.compress(raw, compresslevel=6)
+            else:
+                body = zlib.compress(raw, 6)
+            headers["Content-Encoding"] = self.compression
+
+        return {"raw_size": len(raw), "body": body, "headers": headers}
+
+    def _record(self, method: str, path: str, latency: float, raw_size: int,
+                sent_size: int, received_size: int, retries: int, error: bool):
+        key = f"{method} {path}"
+        with self._stats_lock:
+            entry = self._stats.setdefault(key, {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "total_latency_ms": 0.0,
+                "max_latency_ms": 0.0,
+                "bytes_raw": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+            })
+            latency_ms = latency * 1000
+            entry["calls"] += 1
+            entry["errors"] += 1 if error else 0
+            entry["retries"] += retries
+            entry["total_latency_ms"] += latency_ms
+            entry["max_latency_ms"] = max(entry["max_latency_ms"], latency_ms)
+            entry["bytes_raw"] += raw_size
+            entry["bytes_sent"] += sent_size
+            entry["bytes_received"] += received_size
+
+    def _send(self, method: str, url: str, encoded: Dict[str, Any],
+              timeout: Optional[int]) -> requests.Response:
+        return self.session.request(
+            method,
+            url,
+            data=encoded["body"],
+            headers=encoded["headers"],
+            timeout=timeout or self.timeout
+        )
+
+    def request(self, method: str, path: str, payload: Any = None,
+                timeout: Optional[int] = None, idempotent: Optional[bool] = None) -> requests.Response:
+        """Send a request to the backend, retrying idempotent requests on transient failures
+
+        A request that failed while connecting never reached the server, so it
+        is retried whatever the method; up to max_retries + 1 attempts in all.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+
+        url = f"{self.base_url}{path}"
+        encoded = self._encode_body(payload) if payload is not None else {
+            "raw_size": 0, "body": None, "headers": {}
+        }
+        attempts = self.max_retries + 1
+        start = time.perf_counter()
+        last_exception = None
+        response = None
+
+        for attempt in range(attempts):
+            try:
+                response = self._send(method, url, encoded, timeout)
+                if response.status_code == 415 and "Content-Encoding" in encoded["headers"]:
+                    # Backend can't inflate request bodies; send plain JSON from now on
+                    print(f"Backend rejected {self.compression} request body, disabling compression")
+                    self.compression = None
+                    encoded = self._encode_body(payload)
+                    response = self._send(method, url, encoded, timeout)
+                if not idempotent or response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    break
+                print(f"{method} {path} returned {response.status_code}, retrying...")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_exception = e
+                response = None
+                if not (idempotent or _never_sent(e)) or attempt == attempts - 1:
+                    break
+                print(f"{method} {path} attempt {attempt + 1} failed: {str(e)}")
+
+            time.sleep(self.backoff_factor * (2 ** attempt))
+
+        latency = time.perf_counter() - start
+        sent_size = len(encoded["body"]) if encoded["body"] else 0
+        received_size = len(response.content) if response is not None else 0
+        self._record(method, path, latency, encoded["raw_size"], sent_size,
+                     received_size, attempt, response is None or response.status_code >= 400)
+
+        if response is None:
+            raise last_exception
+
+        print(f"{method} {path} -> {response.status_code} in {latency * 1000:.0f} ms "
+              f"({sent_size} bytes sent, {encoded['raw_size']} uncompressed)")
+        return response
+
+    def post_json(self, path: str, payload: Any, timeout: Optional[int] = None,
+                  idempotent: bool = False) -> requests.Response:
+        """POST a JSON payload to the backend"""
+        return self.request("POST", path, payload, timeout=timeout, idempotent=idempotent)
+
+    def get_report(self) -> Dict[str, Any]:
+        """Latency and transfer size report per endpoint"""
+        with self._stats_lock:
+            endpoints = {}
+            for key, entry in self._stats.items():
+                calls = entry["calls"] or 1
+                endpoints[key] = {
+                    **entry,
+                    "avg_latency_ms": round(entry["total_latency_ms"] / calls, 1),
+                    "total_latency_ms": round(entry["total_latency_ms"], 1),
+                    "max_latency_ms": round(entry["max_latency_ms"], 1),
+                    "compression_ratio": round(entry["bytes_sent"] / entry["bytes_raw"], 3)
+                    if entry["bytes_raw"] else None,
+                }
+
+        return {
+            "base_url": self.base_url,
+            "compression": self.compression,
+            "endpoints": endpoints,
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+def _never_sent(error: Exception) -> bool:
+    """True if the request failed before the connection was up"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+_clients: Dict[str, BackendClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_backend_client(base_url: str, **kwargs) -> BackendClient:
+    """Return the shared client for a backend URL so all managers reuse one pool
+
+    The first caller for a URL decides the pool size and retries.
+    """
+    key = base_url.rstrip("/")
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = BackendClient(key, **kwargs)
+        return _clients[key]
+
+
+def close_backend_clients():
+    """Close every shared client, e.g. when the server shuts down"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,103 @@
+from struct import pack
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+# pyzk's save_user_template sends this command (110) by number; zk.const does not name it
+CMD_SAVE_USERTEMPS = 110
+
+
+class WriteBatch:
+    """Writes queued against one device session and applied in a single disabled window
+
+    The terminal is disabled once, every queued write runs back to back, the
+    device is told to reload its tables with one refresh_data call, and it is
+    enabled again even when a write or the refresh fails. pyzk's set_user,
+    delete_user and save_user_template each end with their own refresh_data(),
+    so that call is a no-op on the connection while the writes run. A failing
+    write does not stop the rest of the batch; apply() reports each outcome.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending: List[Tuple[Any, str, tuple, dict]] = []
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def add(self, key: Any, method: Union[str, Callable], *args, **kwargs):
+        """Queue conn.<method>(*args, **kwargs), or method(conn, *args, **kwargs) for a
+        function; key identifies the write in the results"""
+        self.pending.append((key, method, args, kwargs))
+
+    def set_user(self, key: Any, **fields):
+        self.add(key, "set_user", **fields)
+
+    def delete_user(self, key: Any, uid: int):
+        self.add(key, "delete_user", uid=uid)
+
+    def save_user_templates(self, key: Any, user_templates: List[tuple]):
+        self.add(key, save_user_templates, user_templates)
+
+    def apply(self, progress: Optional[Callable[[int, int], None]] = None) -> List[Tuple[Any, Optional[Exception]]]:
+        """Run the queued writes; returns (key, error or None) for each, in order"""
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+
+        results = []
+        refresh = self.conn.refresh_data
+        shadowed = "refresh_data" in vars(self.conn)
+        self.conn.disable_device()
+        try:
+            self.conn.refresh_data = _skip_refresh
+            try:
+                for done, (key, method, args, kwargs) in enumerate(pending, 1):
+                    try:
+                        if callable(method):
+                            method(self.conn, *args, **kwargs)
+                        else:
+                            getattr(self.conn, method)(*args, **kwargs)
+                        results.append((key, None))
+                    except Exception as e:
+                        print(f"Batched {getattr(method, '__name__', method)} for {key} failed: {str(e)}")
+                        results.append((key, e))
+                    if progress is not None:
+                        progress(done, len(pending))
+            finally:
+                if shadowed:
+                    self.conn.refresh_data = refresh
+                else:
+                    del self.conn.refresh_data
+            if any(error is None for _, error in results):
+                refresh()
+        finally:
+            self.conn.enable_device()
+        return results
+
+
+def _skip_refresh():
+    return True
+
+
+def save_user_templates(conn, user_templates: List[tuple]):
+    """Write many (User, [Finger]) pairs with one buffer transfer and one save command
+
+    The same packet save_user_template sends for one user, holding every user:
+    user records, then the template table, then the templates. pyzk 0.9 has no
+    bulk call for this (HR_save_usertemplates came later).
+    """
+    from zk.exception import ZKErrorResponse
+
+    upack = table = fpack = b""
+    start = 0
+    for user, fingers in user_templates:
+        upack += user.repack29() if conn.user_packet_size == 28 else user.repack73()
+        for finger in fingers:
+            template = finger.repack_only()
+            table += pack("<bHbI", 2, user.uid, 0x10 + finger.fid, start)
+            start += len(template)
+            fpack += template
+    conn._send_with_buffer(pack("III", len(upack), len(table), len(fpack)) + upack + table + fpack)
+    response = conn._ZK__send_command(CMD_SAVE_USERTEMPS, pack("<IHH", 12, 0, 8))
+    if not response.get("status"):
+        raise ZKErrorResponse("Can't save user templates")
+    conn.refresh_data()
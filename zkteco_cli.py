@@ -0,0 +1,171 @@
+"""Command line tools for ZKTeco devices
+
+    python zkteco_cli.py fetch  [--device DEVICE] [--output FILE]
+    python zkteco_cli.py sync   [--device DEVICE] [--incremental]
+    python zkteco_cli.py users  [--device DEVICE] [--output FILE]
+    python zkteco_cli.py export [--device DEVICE] [--format ndjson|json|csv|binary]
+                                [--from DATE] [--to DATE] [--user USER_ID] [--output FILE]
+    python zkteco_cli.py fleet-export [--devices LIST] [--format ...] [--from DATE] [--to DATE]
+                                      [--user USER_ID] [--output-dir DIR] [--processes N]
+
+Only argparse is imported up front. The device library, the HTTP client and
+the manager are imported by the subcommand that needs them, so --help and
+cron-style runs start quickly.
+"""
+import argparse
+import contextlib
+import sys
+from typing import List, Optional
+
+
+def _manager(args):
+    from zkteco_manager import ZKTecoManager
+    from zkteco_poller import parse_devices
+
+    if not args.device:
+        return ZKTecoManager()
+    return ZKTecoManager(**parse_devices(args.device)[0])
+
+
+def _write_json(data, output: Optional[str], stdout):
+    import json
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        print(f"Wrote {output}", file=sys.stderr)
+    else:
+        json.dump(data, stdout, indent=4, ensure_ascii=False)
+        stdout.write("\n")
+
+
+def cmd_fetch(args) -> int:
+    """Download attendance records from the device"""
+    result = _manager(args).get_attendance_data()
+    if not result["success"]:
+        print(result["message"], file=sys.stderr)
+        return 1
+    _write_json(result["data"], args.output, args.stdout)
+    print(result["message"], file=sys.stderr)
+    return 0
+
+
+def cmd_sync(args) -> int:
+    """Send attendance records and users to the backend"""
+    result = _manager(args).sync_attendance_to_api(incremental=args.incremental)
+    print(result["message"], file=sys.stderr)
+    return 0 if result["success"] else 1
+
+
+def cmd_users(args) -> int:
+    """List the users enrolled on the device"""
+    result = _manager(args).get_users()
+    if not result["success"]:
+        print(result["message"], file=sys.stderr)
+        return 1
+    _write_json(result["users"], args.output, args.stdout)
+    return 0
+
+
+def cmd_export(args) -> int:
+    """Stream the device attendance log to a file or stdout"""
+    from zkteco_export import WRITERS, write_records
+
+    records = _manager(args).iter_attendance(start=getattr(args, "from"), end=_end_of_day(args.to),
+                                             user_id=args.user)
+
+    binary = WRITERS[args.format].binary
+    to_file = args.output and args.output != "-"
+    if to_file:
+        stream = open(args.output, "wb") if binary else open(args.output, "w", encoding="utf-8", newline="")
+    else:
+        stream = getattr(args.stdout, "buffer", args.stdout) if binary else args.stdout
+
+    try:
+        count = write_records(records, args.format, stream)
+    except Exception as e:
+        print(f"Export failed: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if to_file:
+            stream.close()
+        else:
+            stream.flush()
+    print(f"Exported {count} attendance records", file=sys.stderr)
+    return 0
+
+
+def cmd_fleet_export(args) -> int:
+    """Export the attendance log of several devices, one file per device"""
+    from zkteco_fleet import export_fleet
+    from zkteco_manager import ZKTecoManager
+    from zkteco_poller import parse_devices
+
+    if args.devices:
+        devices = parse_devices(args.devices)
+    else:
+        from zkteco_config import get_registry
+        devices = [{"profile": profile.name} for profile in get_registry().profiles()]
+    managers = [ZKTecoManager(**device) for device in devices]
+    results = export_fleet(managers, args.format, args.output_dir, start=getattr(args, "from"),
+                           end=_end_of_day(args.to), user_id=args.user, processes=args.processes)
+    for result in results:
+        if result["success"]:
+            print(f"{result['device']}: exported {result['count']} records to {result['path']}", file=sys.stderr)
+        else:
+            print(f"{result['device']}: export failed: {result['error']}", file=sys.stderr)
+    return 0 if all(result["success"] for result in results) else 1
+
+
+def _end_of_day(end: Optional[str]) -> Optional[str]:
+    if end and len(end) == 10:
+        end += "T23:59:59.999999"
+    return end
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="zkteco_cli.py", description="ZKTeco device tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, handler, help_text):
+        sub = subcommands.add_parser(name, help=help_text)
+        sub.add_argument("--device", help="ip[:port] or profile name, default the configured default device")
+        sub.set_defaults(handler=handler)
+        return sub
+
+    add("fetch", cmd_fetch, "download attendance records").add_argument(
+        "--output", help="write JSON to this file instead of stdout")
+    add("sync", cmd_sync, "send attendance and users to the backend").add_argument(
+        "--incremental", action="store_true", help="only send records newer than the last sync")
+    add("users", cmd_users, "list device users").add_argument(
+        "--output", help="write JSON to this file instead of stdout")
+    export = add("export", cmd_export, "stream the attendance log to a file or stdout")
+    export.add_argument("--output", help="file to write, default stdout")
+    export.add_argument("--format", choices=("ndjson", "json", "csv", "binary"), default="ndjson")
+    export.add_argument("--from", help="first date or ISO timestamp to include")
+    export.add_argument("--to", help="last date or ISO timestamp to include")
+    export.add_argument("--user", help="only records of this user ID")
+
+    fleet = subcommands.add_parser("fleet-export", help="export the attendance logs of several devices")
+    fleet.add_argument("--devices", help="comma-separated ip[:port] or profile names, default every profile")
+    fleet.add_argument("--output-dir", default="exports", help="directory for the per-device files")
+    fleet.add_argument("--format", choices=("ndjson", "json", "csv", "binary"), default="ndjson")
+    fleet.add_argument("--from", help="first date or ISO timestamp to include")
+    fleet.add_argument("--to", help="last date or ISO timestamp to include")
+    fleet.add_argument("--user", help="only records of this user ID")
+    fleet.add_argument("--processes", type=int, default=0,
+                       help="decode in a pool of this many processes, default in this process")
+    fleet.set_defaults(handler=cmd_fleet_export)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.stdout = sys.stdout
+    # The manager logs progress with print(); keep stdout for the command output
+    with contextlib.redirect_stdout(sys.stderr):
+        return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
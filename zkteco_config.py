@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+# Shared with attendance.js, which reads the same file
+DEFAULT_CONFIG_PATH = os.environ.get(
+    "ZKTECO_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "zkteco_devices.json")
+)
+
+DEFAULTS = {
+    "port": 4370,
+    "timeout": 60,
+    "transport": "auto",
+    "transport_probe_hours": 24,
+    "ommit_ping": False,
+    "api_base_url": "http://172.18.1.31:8000",
+    "backend_pool_size": 10,
+    "backend_max_retries": 3,
+    "utc_offset_hours": 3,
+    "status_profile": "standard",
+}
+
+# "auto" probes TCP and UDP and keeps the faster one (see ZKTecoManager.negotiate_transport)
+TRANSPORT_AUTO = "auto"
+TRANSPORT_TCP = "tcp"
+TRANSPORT_UDP = "udp"
+TRANSPORTS = (TRANSPORT_AUTO, TRANSPORT_TCP, TRANSPORT_UDP)
+
+STANDARD_STATUS_PROFILE = {
+    0: "Check-in",
+    1: "Check-out",
+    2: "Break-out",
+    3: "Break-in",
+    4: "Overtime-in",
+    5: "Overtime-out",
+}
+
+
+class DeviceProfile:
+    """Connection, protocol and decoding settings of one terminal"""
+
+    def __init__(self, name: str, ip: str, port: int, timeout: int, transport: str, transport_probe_hours: float,
+                 ommit_ping: bool, api_base_url: str, utc_offset_hours: float, status_mapping: Dict[int, str],
+                 backend_pool_size: int = DEFAULTS["backend_pool_size"],
+                 backend_max_retries: int = DEFAULTS["backend_max_retries"]):
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.transport = transport
+        self.transport_probe_interval = timedelta(hours=transport_probe_hours)
+        self.ommit_ping = ommit_ping
+        self.api_base_url = api_base_url
+        self.backend_pool_size = backend_pool_size
+        self.backend_max_retries = backend_max_retries
+        self.utc_offset = timedelta(hours=utc_offset_hours)
+        self.status_mapping = status_mapping
+
+    @property
+    def key(self) -> str:
+        return f"{self.ip}:{self.port}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "ip": self.ip,
+            "port": self.port,
+            "timeout": self.timeout,
+            "transport": self.transport,
+            "transport_probe_hours": self.transport_probe_interval.total_seconds() / 3600,
+            "ommit_ping": self.ommit_ping,
+            "api_base_url": self.api_base_url,
+            "backend_pool_size": self.backend_pool_size,
+            "backend_max_retries": self.backend_max_retries,
+            "utc_offset_hours": self.utc_offset.total_seconds() / 3600,
+            "status_mapping": self.status_mapping,
+        }
+
+
+class ConfigRegistry:
+    """Device profiles loaded from a JSON file (or ZKTECO_CONFIG_JSON), cached between calls
+
+    The file is checked for changes at most every check_interval seconds and
+    reloaded when its modification time moves; version increases on every reload.
+    A file that fails to parse keeps the previous profiles in use.
+    """
+
+    def __init__(self, path: str = DEFAULT_CONFIG_PATH, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._profiles: Dict[str, DeviceProfile] = {}
+        self._default_name: Optional[str] = None
+        self._defaults: Dict[str, Any] = dict(DEFAULTS)
+        self._status_profiles: Dict[str, Dict[int, str]] = {"standard": dict(STANDARD_STATUS_PROFILE)}
+        self.reload()
+
+    def _read(self) -> Dict[str, Any]:
+        inline = os.environ.get("ZKTECO_CONFIG_JSON")
+        if inline:
+            return json.loads(inline)
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def reload(self) -> bool:
+        """Load the configuration now; returns False if it could not be parsed"""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+                config = self._read()
+                defaults = {**DEFAULTS, **config.get("defaults", {})}
+                status_profiles = {"standard": dict(STANDARD_STATUS_PROFILE)}
+                for name, mapping in config.get("status_profiles", {}).items():
+                    status_profiles[name] = {int(code): label for code, label in mapping.items()}
+
+                profiles = {}
+                for name, device in config.get("devices", {}).items():
+                    settings = {**defaults, **device}
+                    profiles[name] = self._build(name, settings, status_profiles)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.last_error = f"Invalid device configuration {self.path}: {str(e)}"
+                print(self.last_error)
+                return False
+
+            self._mtime = mtime
+            self._checked = time.monotonic()
+            self._defaults = defaults
+            self._status_profiles = status_profiles
+            self._profiles = profiles
+            self._default_name = config.get("default_device") or next(iter(profiles), None)
+            self.last_error = None
+            self.version += 1
+            return True
+
+    @staticmethod
+    def _build(name: str, settings: Dict[str, Any], status_profiles: Dict[str, Dict[int, str]]) -> DeviceProfile:
+        if settings.get("status_mapping"):
+            mapping = {int(code): label for code, label in settings["status_mapping"].items()}
+        else:
+            mapping = status_profiles[settings["status_profile"]]
+        transport = settings["transport"]
+        if "force_udp" in settings:
+            # Older configuration files pin the transport with a boolean
+            transport = TRANSPORT_UDP if settings["force_udp"] else TRANSPORT_TCP
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport!r} for device {name}")
+        return DeviceProfile(
+            name=name,
+            ip=settings["ip"],
+            port=int(settings["port"]),
+            timeout=int(settings["timeout"]),
+            transport=transport,
+            transport_probe_hours=float(settings["transport_probe_hours"]),
+            ommit_ping=bool(settings["ommit_ping"]),
+            api_base_url=os.environ.get("ZKTECO_API_URL", settings["api_base_url"]),
+            utc_offset_hours=float(settings["utc_offset_hours"]),
+            status_mapping=dict(mapping),
+            backend_pool_size=int(os.environ.get("ZKTECO_BACKEND_POOL_SIZE", settings["backend_pool_size"])),
+            backend_max_retries=int(os.environ.get("ZKTECO_BACKEND_MAX_RETRIES", settings["backend_max_retries"])),
+        )
+
+    def check(self):
+        """Reload if the file changed; cheap enough to call on every use"""
+        if time.monotonic() - self._checked < self.check_interval:
+            return
+        self._checked = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def profiles(self) -> List[DeviceProfile]:
+        self.check()
+        return list(self._profiles.values())
+
+    def resolve(self, name: Optional[str] = None, ip: Optional[str] = None,
+                port: Optional[int] = None) -> DeviceProfile:
+        """Profile by name, or by address, or the default device
+
+        An address with no profile gets the configured defaults.
+        """
+        self.check()
+        if name is not None:
+            if name not in self._profiles:
+                raise KeyError(f"Unknown device profile: {name}")
+            return self._profiles[name]
+        if ip is None:
+            if self._default_name in self._profiles:
+                return self._profiles[self._default_name]
+            raise KeyError("No device configured; add one to the device configuration file")
+
+        for profile in self._profiles.values():
+            if profile.ip == ip and (port is None or profile.port == port):
+                return profile
+        settings = {**self._defaults, "ip": ip}
+        if port is not None:
+            settings["port"] = port
+        return self._build(ip, settings, self._status_profiles)
+
+
+_registry: Optional[ConfigRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ConfigRegistry:
+    """Return the process-wide device configuration"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ConfigRegistry()
+        return _registry
@@ -0,0 +1,115 @@
+import hashlib
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from zkteco_store import LocalStore, get_store
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte strings"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1024)
+        self.error_rate = error_rate
+        self.size = int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes):
+        # Double hashing: two 64-bit halves of one digest give every probe position
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: bytes):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def attendance_key(record: Dict[str, Any]) -> tuple:
+    """Identity of a punch on one device"""
+    return (str(record["user_id"]), record["timestamp"], int(record["punch"]))
+
+
+def _encode_key(device: str, key: tuple) -> bytes:
+    return "\x1f".join((device, key[0], key[1] or "", str(key[2]))).encode("utf-8")
+
+
+class AttendanceDeduplicator:
+    """Drops punches the backend already accepted before they are sent again
+
+    A Bloom filter answers "definitely new" for most records without touching
+    disk; only possible hits are confirmed against the exact key table.
+    """
+
+    def __init__(self, store: Optional[LocalStore] = None, capacity: int = 100000):
+        self.store = store or get_store()
+        self.capacity = capacity
+        self._filters: Dict[str, BloomFilter] = {}
+        self._lock = threading.Lock()
+
+    def _filter_for(self, device: str) -> BloomFilter:
+        bloom = self._filters.get(device)
+        if bloom is None or bloom.count > bloom.capacity:
+            # First use, or the filter is over capacity: rebuild it from the exact store
+            keys = self.store.iter_sent_keys(device)
+            capacity = max(self.capacity, len(keys) * 2, bloom.capacity * 2 if bloom else 0)
+            bloom = BloomFilter(capacity)
+            for key in keys:
+                bloom.add(_encode_key(device, key))
+            self._filters[device] = bloom
+        return bloom
+
+    def filter_new(self, device: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Records that have not been sent yet, with duplicates inside the batch removed"""
+        with self._lock:
+            bloom = self._filter_for(device)
+            maybe_sent = []
+            for record in records:
+                key = attendance_key(record)
+                if _encode_key(device, key) in bloom:
+                    maybe_sent.append(key)
+
+        sent = self.store.existing_sent_keys(device, maybe_sent) if maybe_sent else set()
+
+        novel = []
+        seen = set()
+        for record in records:
+            key = attendance_key(record)
+            if key in sent or key in seen:
+                continue
+            seen.add(key)
+            novel.append(record)
+
+        if len(novel) != len(records):
+            print(f"Dedup: {len(records) - len(novel)} of {len(records)} records already sent")
+        return novel
+
+    def mark_sent(self, device: str, records: Iterable[Dict[str, Any]]):
+        """Remember records the backend accepted"""
+        keys = [attendance_key(record) for record in records if record.get("timestamp")]
+        self.store.mark_sent(device, keys)
+        with self._lock:
+            bloom = self._filter_for(device)
+            for key in keys:
+                bloom.add(_encode_key(device, key))
+
+
+_deduplicators: Dict[int, AttendanceDeduplicator] = {}
+_deduplicators_lock = threading.Lock()
+
+
+def get_deduplicator(store: Optional[LocalStore] = None) -> AttendanceDeduplicator:
+    """Return the shared deduplicator for a store"""
+    store = store or get_store()
+    with _deduplicators_lock:
+        if id(store) not in _deduplicators:
+            _deduplicators[id(store)] = AttendanceDeduplicator(store)
+        return _deduplicators[id(store)]
@@ -0,0 +1,154 @@
+"""Streaming attendance export writers
+
+Every writer takes records one at a time and writes them straight to the
+output, so exporting a log of any size uses the same amount of memory.
+
+Binary format ("ZKTA", version 1): after the 5-byte header the stream is a
+sequence of entries, each starting with a type byte:
+  b"U"  user_id length (B), user_id, name length (H), name   - first time a user appears
+  b"R"  uid (I), epoch seconds (I), punch (B), user_id length (B), user_id
+Timestamps are the local device time expressed as if it were UTC. A uid that
+is not a number (16-byte logs report the user ID of a user missing from the
+user table as a string uid) is written as its integer value, or 0.
+"""
+import calendar
+import csv
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator
+
+CSV_FIELDS = ["uid", "user_id", "user_name", "timestamp", "status", "punch"]
+
+BINARY_MAGIC = b"ZKTA"
+BINARY_VERSION = 1
+_USER = struct.Struct("<B")
+_NAME = struct.Struct("<H")
+_RECORD = struct.Struct("<IIBB")
+_EPOCH = datetime(1970, 1, 1)
+
+
+class NdjsonWriter:
+    binary = False
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record: Dict[str, Any]):
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write("\n")
+
+    def close(self):
+        pass
+
+
+class JsonArrayWriter:
+    """A single JSON array, written element by element"""
+    binary = False
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+        self.stream.write("[")
+
+    def write(self, record: Dict[str, Any]):
+        self.stream.write(",\n    " if self.count else "\n    ")
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self.stream.write("\n]\n" if self.count else "]\n")
+
+
+class CsvWriter:
+    binary = False
+
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, record: Dict[str, Any]):
+        self.writer.writerow(record)
+
+    def close(self):
+        pass
+
+
+def _uid(value) -> int:
+    if isinstance(value, int):
+        return value
+    return int(value) if isinstance(value, str) and value.isdigit() and int(value) <= 0xFFFFFFFF else 0
+
+
+class BinaryWriter:
+    binary = True
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._users = set()
+        self.stream.write(BINARY_MAGIC + bytes((BINARY_VERSION,)))
+
+    def write(self, record: Dict[str, Any]):
+        user_id = record["user_id"].encode("utf-8")
+        if user_id not in self._users:
+            name = (record.get("user_name") or "").encode("utf-8")
+            self.stream.write(b"U" + _USER.pack(len(user_id)) + user_id + _NAME.pack(len(name)) + name)
+            self._users.add(user_id)
+        epoch = calendar.timegm(datetime.fromisoformat(record["timestamp"]).timetuple())
+        self.stream.write(b"R" + _RECORD.pack(_uid(record["uid"]), epoch, record["punch"], len(user_id)) + user_id)
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    "ndjson": NdjsonWriter,
+    "json": JsonArrayWriter,
+    "csv": CsvWriter,
+    "binary": BinaryWriter,
+}
+
+
+def write_records(records: Iterable[Dict[str, Any]], fmt: str, stream) -> int:
+    """Write records to stream in the given format; returns the number written"""
+    writer = WRITERS[fmt](stream)
+    count = 0
+    try:
+        for record in records:
+            if not record.get("timestamp"):
+                continue
+            writer.write(record)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def read_binary(stream) -> Iterator[Dict[str, Any]]:
+    """Read records back from a binary export"""
+    if stream.read(4) != BINARY_MAGIC:
+        raise ValueError("Not a binary attendance export")
+    version = stream.read(1)[0]
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary export version {version}")
+
+    names: Dict[str, str] = {}
+    while True:
+        kind = stream.read(1)
+        if not kind:
+            return
+        if kind == b"U":
+            user_id = stream.read(_USER.unpack(stream.read(_USER.size))[0]).decode("utf-8")
+            names[user_id] = stream.read(_NAME.unpack(stream.read(_NAME.size))[0]).decode("utf-8")
+        elif kind == b"R":
+            uid, epoch, punch, length = _RECORD.unpack(stream.read(_RECORD.size))
+            user_id = stream.read(length).decode("utf-8")
+            yield {
+                "uid": uid,
+                "user_id": user_id,
+                "user_name": names.get(user_id),
+                "timestamp": (_EPOCH + timedelta(seconds=epoch)).isoformat(),
+                "punch": punch,
+            }
+        else:
+            raise ValueError(f"Corrupt binary export: unknown entry type {kind!r}")
@@ -0,0 +1,135 @@
+"""Attendance exports from many devices at once
+
+Device logs are read concurrently on threads (the work is network I/O), then
+each raw log is decoded, formatted and written to its own file. Decoding is
+CPU-bound, so with processes > 0 it runs in a process pool: the raw buffer is
+copied once into a shared memory block and the worker reads it in place, so
+only the block name and the small user tables are pickled. Workers write
+their export file directly and return a summary.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+from zkteco_export import WRITERS, write_records
+from zkteco_records import decode_attendance
+
+FILE_EXTENSIONS = {"ndjson": "ndjson", "json": "json", "csv": "csv", "binary": "bin"}
+
+
+def device_log(manager, raw: tuple) -> Dict[str, Any]:
+    """Plain-data description of one read_raw_attendance() result"""
+    users, buffer, count = raw
+    return {
+        "device": manager.device_key,
+        "buffer": buffer,
+        "count": count,
+        "uid_to_user_id": {user.uid: user.user_id for user in users},
+        "user_names": {user.user_id: user.name for user in users},
+        "status_mapping": dict(manager.status_mapping),
+        "utc_offset": manager.utc_offset,
+    }
+
+
+def export_path(output_dir: str, device: str, fmt: str) -> str:
+    return os.path.join(output_dir, f"attendance_{device.replace(':', '_')}.{FILE_EXTENSIONS[fmt]}")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block again with the
+        # resource tracker the pool shares with the parent; that is a no-op,
+        # and the parent's unlink unregisters it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _write_log(log: Dict[str, Any], buffer, fmt: str, path: str, start: Optional[str],
+               end: Optional[str], user_id: Optional[str]) -> Dict[str, Any]:
+    records = decode_attendance(buffer, log["count"], log["uid_to_user_id"], log["user_names"],
+                                log["status_mapping"], log["utc_offset"], start, end, user_id)
+    try:
+        if WRITERS[fmt].binary:
+            stream = open(path, "wb")
+        else:
+            stream = open(path, "w", encoding="utf-8", newline="")
+        with stream:
+            count = write_records(records, fmt, stream)
+    finally:
+        records.close()
+    return {"device": log["device"], "success": True, "count": count, "path": path}
+
+
+def _export_shared(log: Dict[str, Any], shm_name: str, size: int, fmt: str, path: str,
+                   start: Optional[str], end: Optional[str], user_id: Optional[str]) -> Dict[str, Any]:
+    """Worker entry point: decode a raw log from shared memory into an export file"""
+    block = _attach(shm_name)
+    view = block.buf[:size]
+    try:
+        return _write_log(log, view, fmt, path, start, end, user_id)
+    finally:
+        view.release()
+        block.close()
+
+
+def export_logs(logs: List[Dict[str, Any]], fmt: str, output_dir: str, start: Optional[str] = None,
+                end: Optional[str] = None, user_id: Optional[str] = None,
+                processes: int = 0) -> List[Dict[str, Any]]:
+    """Write each device_log() to its own file in output_dir; processes > 0 uses a process pool"""
+    os.makedirs(output_dir, exist_ok=True)
+    if not processes:
+        return [
+            _write_log(log, log["buffer"], fmt, export_path(output_dir, log["device"], fmt), start, end, user_id)
+            for log in logs
+        ]
+
+    results, blocks = [], []
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {}
+            for log in logs:
+                buffer = log["buffer"]
+                block = shared_memory.SharedMemory(create=True, size=max(len(buffer), 1))
+                blocks.append(block)
+                block.buf[:len(buffer)] = buffer
+                job = {key: value for key, value in log.items() if key != "buffer"}
+                future = pool.submit(_export_shared, job, block.name, len(buffer), fmt,
+                                     export_path(output_dir, log["device"], fmt), start, end, user_id)
+                futures[future] = log["device"]
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append({"device": futures[future], "success": False, "error": str(e)})
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    order = {log["device"]: index for index, log in enumerate(logs)}
+    return sorted(results, key=lambda result: order[result["device"]])
+
+
+def export_fleet(managers: List[Any], fmt: str, output_dir: str, start: Optional[str] = None,
+                 end: Optional[str] = None, user_id: Optional[str] = None,
+                 processes: int = 0) -> List[Dict[str, Any]]:
+    """Read every device's log concurrently and export one file per device"""
+    logs, failed = [], []
+
+    def _read(manager):
+        return device_log(manager, manager.read_raw_attendance())
+
+    with ThreadPoolExecutor(max_workers=max(len(managers), 1)) as pool:
+        futures = {pool.submit(_read, manager): manager.device_key for manager in managers}
+        for future in as_completed(futures):
+            try:
+                logs.append(future.result())
+            except Exception as e:
+                print(f"Failed to read attendance from {futures[future]}: {str(e)}")
+                failed.append({"device": futures[future], "success": False, "error": str(e)})
+
+    order = {manager.device_key: index for index, manager in enumerate(managers)}
+    logs.sort(key=lambda log: order[log["device"]])
+    results = export_logs(logs, fmt, output_dir, start, end, user_id, processes) + failed
+    return sorted(results, key=lambda result: order[result["device"]])
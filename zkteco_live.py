@@ -0,0 +1,217 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from zkteco_manager import ZKTecoManager
+from zkteco_payloads import encode_compact_attendance
+
+
+class LiveCaptureService:
+    """Streams punches from a device as they happen to subscribers and the backend
+
+    A reconcile pass (an incremental sync) runs before every capture session and
+    every reconcile_interval seconds, so punches missed while disconnected still
+    reach the backend. A capture session also ends, within event_timeout seconds,
+    when anything else is waiting for the device lock, and resumes after it.
+    At most max_subscribers event streams are served at once.
+    """
+
+    def __init__(self, manager: ZKTecoManager, reconcile_interval: float = 300,
+                 event_timeout: int = 5, queue_size: int = 1000, max_subscribers: int = 4):
+        self.manager = manager
+        self.manager.keep_alive = True
+        self.reconcile_interval = reconcile_interval
+        self.event_timeout = event_timeout
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+
+        self._subscribers: List[queue.Queue] = []
+        self._subscribers_lock = threading.Lock()
+        self._outbox: queue.Queue = queue.Queue()
+        # Punches whose upload failed, kept until a reconcile pass gets them to the backend
+        self._unsent: List[Dict[str, Any]] = []
+        self._unsent_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        self.events = 0
+        self.sent = 0
+        self.last_event: Optional[float] = None
+        self.last_reconcile: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.connected = False
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """Register a listener; each punch record is put on the returned queue
+
+        Returns None when max_subscribers listeners are already registered.
+        """
+        subscriber: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        with self._subscribers_lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _publish(self, record: Dict[str, Any]):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(record)
+            except queue.Full:
+                # Slow listener: drop its oldest event rather than block the capture
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _on_punch(self, record: Dict[str, Any]):
+        self.events += 1
+        self.last_event = time.time()
+        print(f"Live punch: {record['user_name']} {record['status']} at {record['timestamp']}")
+        self._publish(record)
+        self._outbox.put(record)
+
+    def _send_loop(self):
+        """Forward captured punches to the backend, batching whatever queued up meanwhile"""
+        while not self._stop.is_set() or not self._outbox.empty():
+            try:
+                batch = [self._outbox.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._outbox.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.manager._ingest(batch)
+            batch = self.manager.dedup.filter_new(self.manager.device_key, batch)
+            if not batch:
+                continue
+
+            try:
+                response = self.manager._post_to_backend(
+                    "/attendance/create", batch, encode_compact_attendance, timeout=30
+                )
+                if response.status_code < 400:
+                    self.sent += len(batch)
+                    self.manager.dedup.mark_sent(self.manager.device_key, batch)
+                    newest = max((r["timestamp"] for r in batch if r["timestamp"]), default=None)
+                    held = self._oldest_unsent()
+                    # Incremental syncs only send records at or after the watermark,
+                    # so it must not move past a punch the backend has not accepted
+                    if held and newest and held < newest:
+                        newest = held
+                    if newest:
+                        self.manager.store.set_watermark(self.manager.device_key, newest)
+                else:
+                    self.last_error = f"Backend returned {response.status_code} for live punches"
+                    self._hold(batch)
+            except Exception as e:
+                # The next reconcile pass picks these records up from the device
+                self.last_error = f"Error sending live punches: {str(e)}"
+                print(self.last_error)
+                self._hold(batch)
+
+    def _hold(self, batch: List[Dict[str, Any]]):
+        with self._unsent_lock:
+            self._unsent.extend(record for record in batch if record["timestamp"])
+
+    def _oldest_unsent(self) -> Optional[str]:
+        with self._unsent_lock:
+            return min((record["timestamp"] for record in self._unsent), default=None)
+
+    def _release_sent(self):
+        """Forget held punches the backend has accepted since they failed"""
+        with self._unsent_lock:
+            if self._unsent:
+                self._unsent = self.manager.dedup.filter_new(self.manager.device_key, self._unsent)
+
+    def _reconcile(self):
+        result = self.manager.sync_attendance_to_api(incremental=True)
+        self.last_reconcile = time.time()
+        if not result.get("success"):
+            raise Exception(result.get("message"))
+        self._release_sent()
+
+    def _reconcile_due(self) -> bool:
+        return (
+            self._stop.is_set() or
+            self.last_reconcile is None or
+            time.time() - self.last_reconcile >= self.reconcile_interval
+        )
+
+    def _pause_due(self) -> bool:
+        # Another manager (API, poller, replication) is waiting for this terminal
+        return self._reconcile_due() or self.manager.lock.contended
+
+    def _capture_loop(self):
+        retry_delay = max(self.manager.retry_delay, 1)
+        while not self._stop.is_set():
+            try:
+                with self.manager.lock:
+                    self._reconcile()
+                    self.connected = True
+                    self.last_error = None
+                    self.manager.live_capture(self._on_punch, self._pause_due, self.event_timeout)
+                    if self.manager.lock.contended:
+                        # Hand the terminal over with no session of ours left open
+                        self.manager.disconnect()
+                retry_delay = max(self.manager.retry_delay, 1)
+                while self.manager.lock.contended and not self._stop.is_set():
+                    self._stop.wait(0.1)
+            except Exception as e:
+                self.last_error = f"Live capture error: {str(e)}"
+                print(self.last_error)
+                self.manager.disconnect()
+                self._stop.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+            finally:
+                self.connected = False
+
+    def start(self):
+        for target, name in ((self._capture_loop, "capture"), (self._send_loop, "sender")):
+            thread = threading.Thread(target=target, name=f"live-{name}-{self.manager.device_key}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Live capture service started for {self.manager.device_key}")
+
+    def stop(self, timeout: Optional[float] = 30):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self.manager.lock:
+            self.manager.keep_alive = False
+            self.manager.disconnect()
+        print(f"Live capture service stopped for {self.manager.device_key}")
+
+    def status(self) -> Dict[str, Any]:
+        def _iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        with self._subscribers_lock:
+            subscribers = len(self._subscribers)
+        return {
+            "device": self.manager.device_key,
+            "connected": self.connected,
+            "events": self.events,
+            "sent": self.sent,
+            "pending": self._outbox.qsize(),
+            "unsent": len(self._unsent),
+            "subscribers": subscribers,
+            "max_subscribers": self.max_subscribers,
+            "last_event": _iso(self.last_event),
+            "last_reconcile": _iso(self.last_reconcile),
+            "reconcile_interval_seconds": self.reconcile_interval,
+            "last_error": self.last_error,
+        }
@@ -1,20 +1,213 @@
-from zk import ZK
 import json
-import requests
-from datetime import datetime, timedelta
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timezone
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
+from zkteco_payloads import (
+    PAYLOAD_FORMAT_AUTO, PAYLOAD_FORMAT_COMPACT, PAYLOAD_FORMAT_JSON, PAYLOAD_FORMATS,
+    encode_compact_attendance, encode_compact_users, rejects_format
+)
+from zkteco_config import TRANSPORT_AUTO, TRANSPORT_UDP, get_registry
+from zkteco_store import LocalStore, diff_users, get_store
+from zkteco_dedup import get_deduplicator
+from zkteco_aggregates import ingest_attendance
+from zkteco_batch import WriteBatch
+from zkteco_pipeline import batched
+from zkteco_records import decode_attendance, format_record
+from zkteco_templates import read_backup, write_backup
+from zkteco_validation import MAX_UID
+
+# Upper bound on each transport probe, so a dead transport does not stall negotiation
+PROBE_TIMEOUT = 5
+PROBE_RETRY_INTERVAL = 60
+# Seconds before compact payloads are tried again on a path whose backend rejected them
+COMPACT_REPROBE_INTERVAL = 3600
+# Records per /attendance/create request when syncing the device log
+UPLOAD_BATCH_SIZE = 5000
+# Device lock files, shared by every worker process on this host
+DEVICE_LOCK_DIR = os.environ.get("ZKTECO_LOCK_DIR", tempfile.gettempdir())
+# How often a blocked process retries the device lock file
+LOCK_POLL_INTERVAL = 0.05
+
+try:
+    import fcntl
+except ImportError:  # Windows: waitress serves from a single process
+    fcntl = None
+
+class DeviceLock:
+    """Re-entrant lock shared by every manager that talks to one terminal
+
+    The API, the poller, live capture and replication each hold their own
+    manager, so locking the manager alone would let them talk to the same
+    terminal at once. The lock also counts waiting threads, so a long holder
+    such as live capture can step aside (see contended).
+
+    With a path, the outermost holder also takes an flock on that file, so
+    gunicorn workers serving the same terminal take turns as well. Processes
+    blocked on the file hold a shared lock on path + ".wait", which is how
+    contended sees them.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.RLock()
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        self._depth = 0
+        self._file = None
+        self._wait_file = None
+        if path and fcntl is not None:
+            self._file = open(path, "a+")
+            self._wait_file = open(path + ".wait", "a+")
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        deadline = None if timeout < 0 else time.monotonic() + timeout
+        if not self._lock.acquire(blocking=False):
+            if not blocking:
+                return False
+            with self._waiting_lock:
+                self._waiting += 1
+            try:
+                if not self._lock.acquire(timeout=timeout):
+                    return False
+            finally:
+                with self._waiting_lock:
+                    self._waiting -= 1
+        if self._depth == 0 and not self._lock_file(blocking, deadline):
+            self._lock.release()
+            return False
+        self._depth += 1
+        return True
+
+    def _lock_file(self, blocking: bool, deadline: Optional[float]) -> bool:
+        """Take the cross-process lock; only the outermost holder in this process gets here"""
+        if self._file is None:
+            return True
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+        fcntl.flock(self._wait_file, fcntl.LOCK_SH)
+        try:
+            while True:
+                try:
+                    fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return True
+                except OSError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return False
+                    time.sleep(LOCK_POLL_INTERVAL)
+        finally:
+            fcntl.flock(self._wait_file, fcntl.LOCK_UN)
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @property
+    def contended(self) -> bool:
+        """True while another thread or process is waiting for the lock"""
+        return self._waiting > 0 or self._other_process_waiting()
+
+    def _other_process_waiting(self) -> bool:
+        if self._wait_file is None:
+            return False
+        try:
+            fcntl.flock(self._wait_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(self._wait_file, fcntl.LOCK_UN)
+        return False
+
+
+_device_locks: Dict[str, DeviceLock] = {}
+_device_locks_lock = threading.Lock()
+
+
+def get_device_lock(device_key: str) -> DeviceLock:
+    """Return the shared lock for a device address"""
+    with _device_locks_lock:
+        if device_key not in _device_locks:
+            name = re.sub(r"[^A-Za-z0-9_.-]", "_", device_key)
+            _device_locks[device_key] = DeviceLock(os.path.join(DEVICE_LOCK_DIR, f"zkteco_device_{name}.lock"))
+        return _device_locks[device_key]
+
 
 class ZKTecoManager:
-    def __init__(self, device_ip: str = "172.17.0.133", device_port: int = 4370, timeout: int = 60):
-        self.device_ip = device_ip
-        self.device_port = device_port
-        self.timeout = timeout
+    def __init__(self, device_ip: Optional[str] = None, device_port: Optional[int] = None,
+                 timeout: Optional[int] = None, payload_format: str = PAYLOAD_FORMAT_AUTO,
+                 compression: Optional[str] = "gzip", store: Optional[LocalStore] = None,
+                 profile: Optional[str] = None):
+        """Settings come from the device profile named profile, or the one matching
+        device_ip/device_port, or the default device in zkteco_devices.json"""
+        if payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unsupported payload format: {payload_format}")
+        self.registry = get_registry()
+        self._profile_request = (profile, device_ip, device_port)
+        self._timeout_override = timeout
+        self.api_base_url = None
         self.conn = None
-        self.api_base_url = "http://172.18.1.31:8000"
+        self.compression = compression
+        self._backend = None
+        self._apply_profile()
+        self.payload_format = payload_format
+        self._compact_rejected: Dict[str, float] = {}  # backend path -> when it refused compact payloads
+        self.store = store or get_store()
+        self.dedup = get_deduplicator(self.store)
+        # Long-running callers (the poller) keep the device session open between syncs
+        self.keep_alive = False
+        # Probe keys (see _probe) of the last full download, sync and archive refresh, used to skip unchanged pulls
+        self._attendance_counters = None
+        self._synced_counters = None
+        self._archived_counters = None
         self.max_retries = 3
         self.retry_delay = 2
+        self.upload_batch_size = UPLOAD_BATCH_SIZE
         
+    def _apply_profile(self):
+        """Take connection and decoding settings from the current device profile"""
+        name, ip, port = self._profile_request
+        profile = self.registry.resolve(name, ip, port)
+        self.profile = profile
+        self.device_ip = profile.ip
+        self.device_port = profile.port
+        self.timeout = self._timeout_override or profile.timeout
+        self.transport = profile.transport
+        self.ommit_ping = profile.ommit_ping
+        self._transport_choice = None
+        self._probe_after = 0.0
+        self.status_mapping = dict(profile.status_mapping)
+        self.utc_offset = profile.utc_offset
+        if profile.api_base_url != self.api_base_url:
+            self.api_base_url = profile.api_base_url
+            self._backend = None
+        self._profile_version = self.registry.version
+
+    @property
+    def backend(self):
+        """Pooled HTTP client for the backend API, created on first use"""
+        if self._backend is None:
+            # requests is slow to import; short CLI runs that never upload skip it
+            from zkteco_backend import get_backend_client
+            self._backend = get_backend_client(
+                self.api_base_url, compression=self.compression,
+                pool_size=self.profile.backend_pool_size, max_retries=self.profile.backend_max_retries
+            )
+        return self._backend
+
     def connect(self) -> bool:
         """Connect to ZKTeco device with retry logic"""
         # If already connected and valid, return True
@@ -29,21 +222,32 @@ class ZKTecoManager:
             
         # Ensure clean state
         self.disconnect()
+        from zk import ZK
+        
+        # Pick up edits to the device configuration between sessions
+        self.registry.check()
+        if self.registry.version != self._profile_version:
+            self._apply_profile()
         
         for attempt in range(self.max_retries):
+            force_udp, ommit_ping = self._connect_options()
             try:
                 print(f"Connection attempt {attempt + 1}/{self.max_retries}")
                 zk = ZK(self.device_ip, port=self.device_port, timeout=self.timeout, 
-                       password=0, force_udp=False, ommit_ping=False)
+                       password=0, force_udp=force_udp, ommit_ping=ommit_ping)
                 self.conn = zk.connect()
                 
                 if self.conn and hasattr(self.conn, 'is_connect') and self.conn.is_connect:
-                    print(f"Connected to ZKTeco device at {self.device_ip}:{self.device_port}")
+                    print(f"Connected to ZKTeco device at {self.device_ip}:{self.device_port} "
+                          f"over {'UDP' if force_udp else 'TCP'}")
                     return True
                     
             except Exception as e:
                 print(f"Connection attempt {attempt + 1} failed: {str(e)}")
                 self.conn = None
+                if self._transport_choice is not None:
+                    # The device moved or changed; probe again before the next attempt
+                    self.forget_transport()
                 
                 if attempt < self.max_retries - 1:
                     print(f"Retrying in {self.retry_delay} seconds...")
@@ -52,6 +256,86 @@ class ZKTecoManager:
         print("All connection attempts failed")
         return False
     
+    def _connect_options(self):
+        """(force_udp, ommit_ping) for the next connect
+
+        A pinned transport is used as configured. With "auto" the transport
+        picked by the last probe is reused until it is older than the
+        profile's probe interval; a device that answered the probe is known
+        to be reachable, so the ICMP pre-check is skipped.
+        """
+        if self.transport != TRANSPORT_AUTO:
+            return self.transport == TRANSPORT_UDP, self.ommit_ping
+
+        choice = self._transport_choice or self.store.get_transport(self.device_key)
+        if choice is not None:
+            probed_at = datetime.fromisoformat(choice["probed_at"]).replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - probed_at > self.profile.transport_probe_interval:
+                choice = None
+        if choice is None and time.monotonic() >= self._probe_after:
+            choice = self._probe_transports()
+        self._transport_choice = choice
+        if choice is None:
+            return False, self.ommit_ping
+        return choice["force_udp"], True
+
+    def _probe_transports(self) -> Optional[Dict[str, Any]]:
+        """Time a connect and a small read over TCP and over UDP; store the faster working one"""
+        from zk import ZK
+
+        probes = {}
+        for name, force_udp in (("tcp", False), ("udp", True)):
+            conn = None
+            try:
+                started = time.perf_counter()
+                conn = ZK(self.device_ip, port=self.device_port, timeout=min(self.timeout, PROBE_TIMEOUT),
+                          password=0, force_udp=force_udp, ommit_ping=True).connect()
+                connected = time.perf_counter()
+                conn.read_sizes()
+                probes[name] = {
+                    "connect_ms": round((connected - started) * 1000, 2),
+                    "fetch_ms": round((time.perf_counter() - connected) * 1000, 2),
+                }
+            except Exception as e:
+                probes[name] = {"error": str(e)}
+            finally:
+                if conn is not None:
+                    try:
+                        conn.disconnect()
+                    except Exception:
+                        pass
+
+        working = [name for name, probe in probes.items() if "error" not in probe]
+        if not working:
+            print(f"Transport probe failed for {self.device_key}: {probes}")
+            # Fall back to a plain TCP connect for a while instead of probing on every attempt
+            self._probe_after = time.monotonic() + PROBE_RETRY_INTERVAL
+            return None
+        best = min(working, key=lambda name: probes[name]["connect_ms"] + probes[name]["fetch_ms"])
+        self.store.set_transport(self.device_key, best == "udp", probes[best]["connect_ms"],
+                                 probes[best]["fetch_ms"], probes)
+        print(f"Using {best.upper()} for {self.device_key}: {probes}")
+        return self.store.get_transport(self.device_key)
+
+    def negotiate_transport(self) -> Dict[str, Any]:
+        """Re-measure TCP and UDP latency now and remember the faster transport"""
+        with self.lock:
+            self.disconnect()
+            choice = self._probe_transports()
+            self._transport_choice = choice
+        if choice is None:
+            return {"success": False, "message": f"Device {self.device_key} did not answer over TCP or UDP"}
+        return {
+            "success": True,
+            "message": f"Using {'UDP' if choice['force_udp'] else 'TCP'} for {self.device_key}",
+            "transport": choice
+        }
+
+    def forget_transport(self):
+        """Drop the remembered transport; the next connect probes again"""
+        self._transport_choice = None
+        self.store.forget_transport(self.device_key)
+
     def disconnect(self):
         """Safely disconnect from ZKTeco device"""
         if self.conn:
@@ -64,6 +348,11 @@ class ZKTecoManager:
             finally:
                 self.conn = None
     
+    def _release(self):
+        """End the device session unless it is being kept warm"""
+        if not self.keep_alive:
+            self.disconnect()
+
     def _execute_with_retry(self, operation_name: str, operation_func):
         """Execute an operation with retry logic"""
         last_exception = None
@@ -87,115 +376,192 @@ class ZKTecoManager:
                     
         raise last_exception
 
+    def _post_to_backend(self, path: str, records: List[Dict[str, Any]], compact_encoder, timeout: int):
+        """POST records to the backend in the configured payload format"""
+        rejected = self._compact_rejected.get(path)
+        use_compact = (
+            self.payload_format == PAYLOAD_FORMAT_COMPACT or
+            (self.payload_format == PAYLOAD_FORMAT_AUTO and
+             (rejected is None or time.monotonic() - rejected >= COMPACT_REPROBE_INTERVAL))
+        )
+        if use_compact:
+            # Both create endpoints skip records they already have, so resending is safe
+            response = self.backend.post_json(path, compact_encoder(records), timeout=timeout, idempotent=True)
+            if self.payload_format == PAYLOAD_FORMAT_COMPACT or not rejects_format(response):
+                self._compact_rejected.pop(path, None)
+                return response
+            # Older backends reject anything that is not a plain array; try again later in case it was upgraded
+            print(f"Backend rejected {PAYLOAD_FORMAT_COMPACT} payload on {path}, falling back to {PAYLOAD_FORMAT_JSON}")
+            self._compact_rejected[path] = time.monotonic()
+
+        return self.backend.post_json(path, records, timeout=timeout, idempotent=True)
+
+    @property
+    def device_key(self) -> str:
+        """Identifier for this device in the local store"""
+        return f"{self.device_ip}:{self.device_port}"
+
+    @property
+    def lock(self) -> DeviceLock:
+        """Serializes device access across every manager for this terminal"""
+        return get_device_lock(self.device_key)
+
+    def _push_user_delta(self, user_attendance: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Send only users added, changed or removed since the last accepted upload"""
+        delta = diff_users(self.store.get_user_hashes(self.device_key), user_attendance)
+        upserts = delta["added"] + delta["changed"]
+        removed = delta["removed"]
+        summary = {"added": len(delta["added"]), "changed": len(delta["changed"]), "removed": len(removed)}
+
+        if not upserts and not removed:
+            print("User table unchanged since last sync, skipping user upload")
+            return summary
+
+        print(f"User table delta: {summary['added']} added, {summary['changed']} changed, "
+              f"{summary['removed']} removed")
+
+        if upserts:
+            # Upsert by userId: renames update the existing user and re-enrolled users are reactivated
+            response = self._post_to_backend("/attendanceUser/upsert", upserts, encode_compact_users, timeout=30)
+            if response.status_code == 404:
+                # Older backends only have the insert-if-missing endpoint
+                print("Backend has no /attendanceUser/upsert, falling back to /attendanceUser/create")
+                response = self._post_to_backend("/attendanceUser/create", upserts, encode_compact_users, timeout=30)
+            print(f"User data sent successfully. Status: {response.status_code}")
+            if response.status_code >= 400:
+                return summary
+
+        if removed:
+            response = self.backend.post_json(
+                "/attendanceUser/deactivate", {"userIds": removed}, timeout=30, idempotent=True
+            )
+            print(f"Removed users sent. Status: {response.status_code}")
+            if response.status_code >= 400:
+                # Keep removed users in the snapshot so they are retried next sync
+                removed = []
+
+        self.store.apply_user_delta(self.device_key, delta["hashes"], removed)
+        return summary
+
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user on the device"""
-        try:
-            if not self.connect():
-                return {"success": False, "message": "Failed to connect to device"}
-            
-            # Check if user already exists
-            users = self.conn.get_users()
-            existing_user = next((u for u in users if u.user_id == str(user_data['userId'])), None)
-            
-            if existing_user:
-                self.disconnect()
-                return {
-                    "success": False, 
-                    "message": f"User with ID {user_data['userId']} already exists on device"
-                }
-            
-            # Create user
-            self.conn.set_user(
-                uid=int(user_data.get('uid', user_data['userId'])),
-                name=user_data['name'],
-                privilege=int(user_data.get('privilege', 0)),
-                password=user_data.get('password', ''),
-                group_id=user_data.get('group_id', ''),
-                user_id=str(user_data['userId']),
-                card=int(user_data.get('cardNumber', 0)) if user_data.get('cardNumber') else 0
-            )
-            
-            self.disconnect()
-            return {
-                "success": True, 
-                "message": f"User {user_data['name']} created successfully on device"
-            }
-            
-        except Exception as e:
-            self.disconnect()
-            return {"success": False, "message": f"Failed to create user: {str(e)}"}
+        return self.apply_user_changes([("create", user_data)])[0]
     
     def update_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing user on the device without deleting biometric data"""
-        try:
-            if not self.connect():
-                return {"success": False, "message": "Failed to connect to device"}
-            
-            # Check if user exists
-            users = self.conn.get_users()
-            existing_user = next((u for u in users if u.user_id == str(user_data['userId'])), None)
-            
-            if not existing_user:
-                self.disconnect()
-                return {
-                    "success": False, 
-                    "message": f"User with ID {user_data['userId']} not found on device"
-                }
-            
-            # Update user directly using set_user with existing UID
-            # This preserves fingerprint and face data
-            self.conn.set_user(
-                uid=existing_user.uid,  # Use existing UID to update, not create new
-                name=user_data['name'],
-                privilege=int(user_data.get('privilege', existing_user.privilege)),
-                password=user_data.get('password', existing_user.password),
-                group_id=user_data.get('group_id', existing_user.group_id),
-                user_id=str(user_data['userId']),
-                card=int(user_data.get('cardNumber', existing_user.card)) if user_data.get('cardNumber') else existing_user.card
-            )
-            
-            self.disconnect()
-            return {
-                "success": True, 
-                "message": f"User {user_data['name']} updated successfully on device (biometric data preserved)"
-            }
-            
-        except Exception as e:
-            self.disconnect()
-            return {"success": False, "message": f"Failed to update user: {str(e)}"}
+        return self.apply_user_changes([("update", user_data)])[0]
     
     def delete_user(self, user_id: str) -> Dict[str, Any]:
         """Delete a user from the device"""
+        return self.apply_user_changes([("delete", {"userId": user_id})])[0]
+    
+    @staticmethod
+    def _user_fields(user) -> Dict[str, Any]:
+        """set_user() arguments describing a device user as it is"""
+        return dict(uid=user.uid, name=user.name, privilege=user.privilege, password=user.password,
+                    group_id=user.group_id, user_id=user.user_id, card=user.card)
+    
+    @staticmethod
+    def _created_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(
+            uid=int(user_data.get('uid', user_data['userId'])),
+            name=user_data['name'],
+            privilege=int(user_data.get('privilege', 0)),
+            password=user_data.get('password', ''),
+            group_id=user_data.get('group_id', ''),
+            user_id=str(user_data['userId']),
+            card=int(user_data.get('cardNumber', 0)) if user_data.get('cardNumber') else 0
+        )
+    
+    @staticmethod
+    def _updated_user(current: Dict[str, Any], user_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Keep the existing UID so fingerprint and face data stay attached
+        return dict(
+            uid=current['uid'],
+            name=user_data['name'],
+            privilege=int(user_data.get('privilege', current['privilege'])),
+            password=user_data.get('password', current['password']),
+            group_id=user_data.get('group_id', current['group_id']),
+            user_id=str(user_data['userId']),
+            card=int(user_data['cardNumber']) if user_data.get('cardNumber') else current['card']
+        )
+    
+    def apply_user_changes(self, changes: List[tuple]) -> List[Dict[str, Any]]:
+        """Apply ("create" | "update" | "delete", user_data) changes in one device session
+
+        Changes are replayed in order against the device user table, so each gets
+        the result it would have had on its own. Only the net change per user ID is
+        written: a create followed by an update is one set_user, a create followed
+        by a delete writes nothing, and a delete followed by a create is a
+        delete_user and a set_user.
+        """
+        self._users_written()
         try:
             if not self.connect():
-                return {"success": False, "message": "Failed to connect to device"}
+                return [{"success": False, "message": "Failed to connect to device"} for _ in changes]
             
-            # Find user by user_id
-            users = self.conn.get_users()
-            user_to_delete = next((u for u in users if u.user_id == str(user_id)), None)
+            initial = {u.user_id: self._user_fields(u) for u in self.conn.get_users()}
+            table = dict(initial)
+            results = []
+            touched: Dict[str, List[int]] = {}  # user ID -> changes that succeeded against the table
+            deleted = set()  # user IDs deleted at some point, even if created again later
             
-            if not user_to_delete:
-                self.disconnect()
-                return {
-                    "success": False, 
-                    "message": f"User with ID {user_id} not found on device"
-                }
+            for index, (action, user_data) in enumerate(changes):
+                user_id = str(user_data['userId'])
+                current = table.get(user_id)
+                if action == "create":
+                    if current:
+                        results.append({
+                            "success": False,
+                            "message": f"User with ID {user_id} already exists on device"
+                        })
+                        continue
+                    table[user_id] = self._created_user(user_data)
+                    message = f"User {user_data['name']} created successfully on device"
+                elif not current:
+                    results.append({"success": False, "message": f"User with ID {user_id} not found on device"})
+                    continue
+                elif action == "update":
+                    table[user_id] = self._updated_user(current, user_data)
+                    message = f"User {user_data['name']} updated successfully on device (biometric data preserved)"
+                else:
+                    del table[user_id]
+                    deleted.add(user_id)
+                    message = f"User with ID {user_id} deleted successfully from device"
+                results.append({"success": True, "message": message})
+                touched.setdefault(user_id, []).append(index)
+            
+            batch = WriteBatch(self.conn)
+            for user_id in touched:
+                before, after = initial.get(user_id), table.get(user_id)
+                # A delete also drops the user's fingerprints, so it is written even when
+                # the user is created again with the same UID
+                if before and (after is None or user_id in deleted or after['uid'] != before['uid']):
+                    batch.delete_user(user_id, uid=before['uid'])
+                if after and (after != before or user_id in deleted):
+                    batch.set_user(user_id, **after)
+            if len(changes) > 1:
+                print(f"Applying {len(changes)} user changes as {len(batch)} device writes")
             
-            # Delete user using UID
-            self.conn.delete_user(uid=user_to_delete.uid)
+            for user_id, error in batch.apply():
+                if error:
+                    for index in touched[user_id]:
+                        results[index] = {
+                            "success": False,
+                            "message": f"Failed to {changes[index][0]} user: {str(error)}"
+                        }
             
             self.disconnect()
-            return {
-                "success": True, 
-                "message": f"User with ID {user_id} deleted successfully from device"
-            }
+            return results
             
         except Exception as e:
             self.disconnect()
-            return {"success": False, "message": f"Failed to delete user: {str(e)}"}
+            return [{"success": False, "message": f"Failed to {action} user: {str(e)}"}
+                    for action, _ in changes]
     
     def bulk_delete_users(self, user_ids: List[str]) -> Dict[str, Any]:
         """Delete multiple users from the device"""
+        self._users_written()
         results = {
             "success": [],
             "failed": [],
@@ -213,39 +579,35 @@ class ZKTecoManager:
             # Get all users from device
             all_users = self.conn.get_users()
             print(f"Retrieved {len(all_users)} users from device")
+            uids = {u.user_id: u.uid for u in all_users}
             
+            # Deletes run back to back while the terminal is disabled, no per-user delay needed
+            batch = WriteBatch(self.conn)
             for user_id in user_ids:
-                try:
-                    # Find user by user_id
-                    user_to_delete = next((u for u in all_users if u.user_id == str(user_id)), None)
-                    
-                    if not user_to_delete:
-                        results["failed"].append({
-                            "userId": user_id,
-                            "error": f"User with ID {user_id} not found on device"
-                        })
-                        results["summary"]["failed"] += 1
-                        continue
-                    
-                    # Delete user using UID
-                    self.conn.delete_user(uid=user_to_delete.uid)
-                    
-                    results["success"].append({
+                if str(user_id) not in uids:
+                    results["failed"].append({
                         "userId": user_id,
-                        "message": f"User with ID {user_id} deleted successfully"
+                        "error": f"User with ID {user_id} not found on device"
                     })
-                    results["summary"]["successful"] += 1
-                    
-                    print(f"Successfully deleted user {user_id}")
-                    time.sleep(0.5)  # Small delay between deletions
-                    
-                except Exception as e:
-                    print(f"Error deleting user {user_id}: {str(e)}")
+                    results["summary"]["failed"] += 1
+                    continue
+                batch.delete_user(user_id, uid=uids[str(user_id)])
+            
+            for user_id, error in batch.apply():
+                if error:
+                    print(f"Error deleting user {user_id}: {str(error)}")
                     results["failed"].append({
                         "userId": user_id,
-                        "error": str(e)
+                        "error": str(error)
                     })
                     results["summary"]["failed"] += 1
+                    continue
+                results["success"].append({
+                    "userId": user_id,
+                    "message": f"User with ID {user_id} deleted successfully"
+                })
+                results["summary"]["successful"] += 1
+                print(f"Successfully deleted user {user_id}")
             
             self.disconnect()
             
@@ -265,6 +627,7 @@ class ZKTecoManager:
     
     def bulk_create_users(self, users_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Create multiple users on the device"""
+        self._users_written()
         results = {
             "success": [],
             "failed": [],
@@ -281,8 +644,11 @@ class ZKTecoManager:
             
             # Get existing users to check for duplicates
             existing_users = self.conn.get_users()
-            existing_user_ids = [u.user_id for u in existing_users]
+            existing_user_ids = {u.user_id for u in existing_users}
             
+            # Creates run back to back while the terminal is disabled, no per-user delay needed
+            batch = WriteBatch(self.conn)
+            names = {}
             for user_data in users_data:
                 try:
                     # Check if user already exists
@@ -294,8 +660,8 @@ class ZKTecoManager:
                         results["summary"]["failed"] += 1
                         continue
                     
-                    # Create user
-                    self.conn.set_user(
+                    batch.set_user(
+                        user_data['userId'],
                         uid=int(user_data.get('uid', user_data['userId'])),
                         name=user_data['name'],
                         privilege=int(user_data.get('privilege', 0)),
@@ -304,15 +670,7 @@ class ZKTecoManager:
                         user_id=str(user_data['userId']),
                         card=int(user_data.get('cardNumber', 0)) if user_data.get('cardNumber') else 0
                     )
-                    
-                    results["success"].append({
-                        "userId": user_data['userId'],
-                        "message": f"User {user_data['name']} created successfully"
-                    })
-                    results["summary"]["successful"] += 1
-                    
-                    print(f"Successfully created user {user_data['userId']}")
-                    time.sleep(0.5)  # Small delay between creations
+                    names[user_data['userId']] = user_data['name']
                     
                 except Exception as e:
                     print(f"Error creating user {user_data['userId']}: {str(e)}")
@@ -322,6 +680,22 @@ class ZKTecoManager:
                     })
                     results["summary"]["failed"] += 1
             
+            for user_id, error in batch.apply():
+                if error:
+                    print(f"Error creating user {user_id}: {str(error)}")
+                    results["failed"].append({
+                        "userId": user_id,
+                        "error": str(error)
+                    })
+                    results["summary"]["failed"] += 1
+                    continue
+                results["success"].append({
+                    "userId": user_id,
+                    "message": f"User {names[user_id]} created successfully"
+                })
+                results["summary"]["successful"] += 1
+                print(f"Successfully created user {user_id}")
+            
             self.disconnect()
             
             return {
@@ -338,6 +712,258 @@ class ZKTecoManager:
                 "results": results
             }
     
+    def reconcile_users(self, roster: List[Dict[str, Any]], delete_missing: bool = False,
+                        dry_run: bool = False) -> Dict[str, Any]:
+        """Make the device user table match an authoritative roster in one device session
+
+        Roster entries use the create_user format. Only fields present in an entry are
+        compared, and updates keep the existing UID so biometric data is preserved.
+        """
+        report = {"created": [], "updated": [], "deleted": [], "unchanged": 0, "failed": []}
+        if not dry_run:
+            self._users_written()
+        
+        try:
+            if not self.connect():
+                return {"success": False, "message": "Failed to connect to device", "results": report}
+            
+            device_users = {u.user_id: u for u in self.conn.get_users()}
+            used_uids = {u.uid for u in device_users.values()}
+            next_uid = max(used_uids, default=0) + 1
+            roster_ids = set()
+            plan = []
+            
+            for entry in roster:
+                user_id = str(entry["userId"])
+                roster_ids.add(user_id)
+                existing = device_users.get(user_id)
+                
+                if existing is None:
+                    if not entry.get("name"):
+                        # Roster entries may omit fields, but a new user needs a name
+                        report["failed"].append({
+                            "userId": user_id, "action": "create", "error": "name is required to create a user"
+                        })
+                        continue
+                    uid = int(entry.get("uid", user_id)) if str(entry.get("uid", user_id)).isdigit() else None
+                    # UIDs are 16-bit; user IDs beyond that range get a free UID
+                    if uid is None or not 1 <= uid <= MAX_UID or uid in used_uids:
+                        while next_uid in used_uids:
+                            next_uid += 1
+                        uid = next_uid
+                    used_uids.add(uid)
+                    plan.append(("create", user_id, dict(
+                        uid=uid,
+                        name=entry["name"],
+                        privilege=int(entry.get("privilege", 0)),
+                        password=str(entry.get("password", "")),
+                        group_id=str(entry.get("group_id", "")),
+                        user_id=user_id,
+                        card=int(entry["cardNumber"]) if entry.get("cardNumber") else 0
+                    )))
+                    continue
+                
+                wanted = dict(
+                    uid=existing.uid,
+                    name=entry.get("name", existing.name),
+                    privilege=int(entry.get("privilege", existing.privilege)),
+                    password=str(entry.get("password", existing.password)),
+                    group_id=str(entry.get("group_id", existing.group_id)),
+                    user_id=user_id,
+                    card=int(entry["cardNumber"]) if entry.get("cardNumber") else existing.card
+                )
+                current = dict(
+                    uid=existing.uid, name=existing.name, privilege=existing.privilege,
+                    password=existing.password, group_id=existing.group_id,
+                    user_id=existing.user_id, card=existing.card
+                )
+                if wanted == current:
+                    report["unchanged"] += 1
+                else:
+                    changed = sorted(k for k in wanted if wanted[k] != current[k])
+                    plan.append(("update", user_id, wanted, changed))
+            
+            if delete_missing:
+                for user_id, user in device_users.items():
+                    if user_id not in roster_ids:
+                        plan.append(("delete", user_id, user.uid))
+            
+            batch = WriteBatch(self.conn)
+            for step in plan:
+                action, user_id, *args = step
+                if action == "delete":
+                    batch.delete_user(step, uid=args[0])
+                else:
+                    batch.set_user(step, **args[0])
+            outcomes = [(step, None) for step in plan] if dry_run else batch.apply()
+            
+            for (action, user_id, *args), error in outcomes:
+                if error:
+                    print(f"Error during {action} of user {user_id}: {str(error)}")
+                    report["failed"].append({"userId": user_id, "action": action, "error": str(error)})
+                    continue
+                entry = {"userId": user_id}
+                if action == "update":
+                    entry["fields"] = args[1]
+                report[f"{action}d"].append(entry)
+            
+            self.disconnect()
+            
+            summary = (f"{len(report['created'])} created, {len(report['updated'])} updated, "
+                       f"{len(report['deleted'])} deleted, {report['unchanged']} unchanged, "
+                       f"{len(report['failed'])} failed")
+            return {
+                "success": not report["failed"],
+                "dry_run": dry_run,
+                "message": f"{'Dry run: ' if dry_run else ''}Roster reconcile completed. {summary}",
+                "results": report
+            }
+            
+        except Exception as e:
+            self.disconnect()
+            return {
+                "success": False,
+                "message": f"Roster reconcile failed: {str(e)}",
+                "results": report
+            }
+    
+    def _report_progress(self, progress, stage: str, done: int, total: int):
+        if progress is not None:
+            progress(stage, done, total)
+        else:
+            print(f"{stage}: {done}/{total}")
+
+    @staticmethod
+    def _user_dict(user) -> Dict[str, Any]:
+        return {
+            "uid": user.uid,
+            "userId": user.user_id,
+            "name": user.name,
+            "privilege": user.privilege,
+            "password": user.password,
+            "group_id": user.group_id,
+            "cardNumber": user.card
+        }
+
+    def export_templates(self, path: str, progress=None) -> Dict[str, Any]:
+        """Back up users and fingerprint templates to a compressed file in one device session
+
+        progress, if given, is called as progress(stage, done, total).
+        Face templates are not exported: pyzk has no command to read them.
+        """
+        def _export():
+            self._report_progress(progress, "Reading users", 0, 2)
+            users = self.conn.get_users()
+            self._report_progress(progress, "Reading templates", 1, 2)
+            fingers = self.conn.get_templates()
+            self._report_progress(progress, "Read complete", 2, 2)
+            return users, fingers
+
+        try:
+            users, fingers = self._execute_with_retry("export_templates", _export)
+
+            user_list = [self._user_dict(user) for user in users]
+            templates = [(f.uid, f.fid, f.valid, f.template) for f in fingers]
+            size = write_backup(path, self.device_key, user_list, templates)
+
+            print(f"Exported {len(user_list)} users and {len(templates)} templates to {path} ({size} bytes)")
+            return {
+                "success": True,
+                "message": f"Exported {len(user_list)} users and {len(templates)} templates",
+                "users": len(user_list),
+                "templates": len(templates),
+                "bytes": size,
+                "path": path
+            }
+        except Exception as e:
+            return {"success": False, "message": f"Template export failed: {str(e)}"}
+        finally:
+            self._release()
+
+    def import_templates(self, path: str, progress=None) -> Dict[str, Any]:
+        """Restore users and fingerprint templates from an export_templates file"""
+        try:
+            header, templates = read_backup(path)
+        except Exception as e:
+            return {"success": False, "message": f"Invalid template backup: {str(e)}"}
+
+        result = self.write_user_templates(header["users"], templates, progress)
+        result.pop("previous", None)
+        if result["success"]:
+            result["message"] += f" from {header['device']}"
+            result["source_device"] = header["device"]
+        print(result["message"])
+        return result
+
+    def write_user_templates(self, users: List[Dict[str, Any]], templates: List[tuple],
+                             progress=None) -> Dict[str, Any]:
+        """Write users and their (uid, fid, valid, template) tuples in one device session
+
+        Users are matched to the device by user ID; a UID that is taken by another
+        user is moved to a free one. Everything is written with one buffer transfer
+        and one save command (zkteco_batch.save_user_templates). The result's
+        "previous" maps each overwritten user ID to the user as it was on the device.
+        """
+        from zk.finger import Finger
+        from zk.user import User
+
+        fingers_by_uid: Dict[int, List[tuple]] = {}
+        for uid, fid, valid, template in templates:
+            fingers_by_uid.setdefault(uid, []).append((fid, valid, template))
+        previous = {}
+        self._users_written()
+
+        def _write():
+            device_users = {u.user_id: u for u in self.conn.get_users()}
+            used_uids = {u.uid: u.user_id for u in device_users.values()}
+            # Moved users go above every UID in use or incoming so they do not displace others
+            next_uid = max([*used_uids, *(entry["uid"] for entry in users)], default=0) + 1
+
+            batch = []
+            for entry in users:
+                user_id = str(entry["userId"])
+                existing = device_users.get(user_id)
+                uid = existing.uid if existing else entry["uid"]
+                if existing is None and uid in used_uids:
+                    while next_uid in used_uids:
+                        next_uid += 1
+                    uid = next_uid
+                used_uids[uid] = user_id
+                if existing is not None:
+                    previous[user_id] = self._user_dict(existing)
+
+                user = User(uid, entry["name"], entry["privilege"], entry["password"],
+                            entry["group_id"], user_id, entry["cardNumber"])
+                fingers = [Finger(uid, fid, valid, template)
+                           for fid, valid, template in fingers_by_uid.get(entry["uid"], [])]
+                batch.append((user, fingers))
+
+            total = len(batch)
+            writes = WriteBatch(self.conn)
+            self._report_progress(progress, "Writing users and templates", 0, total)
+            if batch:
+                writes.save_user_templates("all", batch)
+            report = lambda done, _: self._report_progress(progress, "Writing users and templates", total, total)
+            for _, error in writes.apply(report):
+                if error:
+                    raise error
+            return batch
+
+        try:
+            batch = self._execute_with_retry("write_user_templates", _write)
+            template_count = sum(len(fingers) for _, fingers in batch)
+            return {
+                "success": True,
+                "message": f"Restored {len(batch)} users and {template_count} templates",
+                "users": len(batch),
+                "templates": template_count,
+                "previous": previous
+            }
+        except Exception as e:
+            return {"success": False, "message": f"Template import failed: {str(e)}"}
+        finally:
+            self._release()
+
     def get_users(self) -> Dict[str, Any]:
         """Get all users from the device"""
         try:
@@ -345,18 +971,8 @@ class ZKTecoManager:
                 return {"success": False, "message": "Failed to connect to device", "users": []}
             
             users = self.conn.get_users()
-            user_list = []
-            
-            for user in users:
-                user_list.append({
-                    "uid": user.uid,
-                    "userId": user.user_id,
-                    "name": user.name,
-                    "privilege": user.privilege,
-                    "password": user.password,
-                    "group_id": user.group_id,
-                    "cardNumber": user.card
-                })
+            user_list = [self._user_dict(user) for user in users]
+            self._cache_users(users)
             
             self.disconnect()
             
@@ -375,70 +991,150 @@ class ZKTecoManager:
                 "users": []
             }
     
-    def get_attendance_data(self) -> Dict[str, Any]:
-        """Get attendance records from the device with retry logic"""
+    def _cache_users(self, users):
+        """Keep the local copy of the device user table current; never fails the caller"""
+        try:
+            self.store.save_device_users(self.device_key, [self._user_dict(u) for u in users])
+        except Exception as e:
+            print(f"Error updating local user cache: {str(e)}")
+
+    def _ingest(self, records: List[Dict[str, Any]]):
+        """Keep the local archive and daily aggregates current; never fails the caller"""
+        try:
+            ingest_attendance(self.store, self.device_key, records)
+        except Exception as e:
+            print(f"Error updating local attendance store: {str(e)}")
+
+    def _read_counters(self) -> tuple:
+        """Read the device's user and attendance record counters (one small packet)"""
+        self.conn.read_sizes()
+        return (self.conn.users, self.conn.records)
+
+    def _probe(self, counters: Optional[tuple] = None) -> tuple:
+        """Device counters plus the local user table and clear versions
+
+        A rename, or a clear followed by as many new punches, leaves the
+        counters as they were; the versions catch those, including writes made
+        through another manager or worker.
+        """
+        return (counters or self._read_counters(), self.store.get_device_users_version(self.device_key),
+                self.store.clear_version(self.device_key))
+
+    def _forget_counters(self):
+        """Make the next attendance read, sync and archive refresh download the log again"""
+        self._attendance_counters = None
+        self._synced_counters = None
+        self._archived_counters = None
+
+    def _users_written(self):
+        """Call before writing users: the cached user table and probe keys go out of date"""
+        self.store.invalidate_device_users(self.device_key)
+        self._forget_counters()
+
+    def _format_attendance(self, attendance, user_dict: Dict[str, str]) -> Dict[str, Any]:
+        """Convert a pyzk attendance record into the record sent to the backend"""
+        return self._format_record(attendance.uid, attendance.user_id, attendance.timestamp,
+                                   attendance.punch, user_dict)
+
+    def _format_record(self, uid, user_id: str, timestamp: Optional[datetime], punch: int,
+                       user_dict: Dict[str, str]) -> Dict[str, Any]:
+        return format_record(uid, user_id, timestamp, punch, user_dict, self.status_mapping, self.utc_offset)
+
+    def iter_attendance(self, start: Optional[str] = None, end: Optional[str] = None,
+                        user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield attendance records one at a time, filtered by inclusive ISO time range and user
+
+        The raw log is read in one transfer and the device session is released
+        before the first record is yielded; records are then decoded from the raw
+        buffer as they are consumed, so no list of the whole log is built.
+        """
+        yield from self.decode_attendance(self.read_raw_attendance(), start, end, user_id)
+
+    def read_raw_attendance(self) -> tuple:
+        """Read users and the undecoded attendance log in one device session
+
+        Returns (users, buffer, record_count) for decode_attendance.
+        """
+        try:
+            users, buffer, count = self._execute_with_retry("read_raw_attendance", self._read_raw)
+        finally:
+            self._release()
+        self._cache_users(users)
+        return users, buffer, count
+
+    def _read_raw(self) -> tuple:
+        """read_raw_attendance() in the current device session"""
+        from zk import const
+        self.conn.read_sizes()
+        count = self.conn.records
+        users = self.conn.get_users()
+        if not count:
+            return users, b"", 0
+        buffer, _ = self.conn.read_with_buffer(const.CMD_ATTLOG_RRQ)
+        return users, buffer, count
+
+    def decode_attendance(self, raw: tuple, start: Optional[str] = None, end: Optional[str] = None,
+                          user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily turn read_raw_attendance() output into formatted records"""
+        users, buffer, count = raw
+        return decode_attendance(
+            buffer, count,
+            {user.uid: user.user_id for user in users},
+            {user.user_id: user.name for user in users},
+            self.status_mapping, self.utc_offset, start, end, user_id
+        )
+
+    def _read_attendance(self):
+        """Read users and attendance records in the current device session"""
+        raw = self._read_raw()
+        users = raw[0]
+        self._cache_users(users)
+        
+        # Records are decoded straight from the raw log, without pyzk's list of Attendance objects
+        attendance_data = list(self.decode_attendance(raw))
+        
+        for index, record in enumerate(attendance_data[:3]):
+            # Print first 3 attendance records for debugging
+            print(f"Raw attendance data:")
+            print(f"  User ID: {record['user_id']}")
+            print(f"  Status: {record['status']}")
+            print(f"  Time: {record['timestamp']}")
+            print(f"  Punch: {record['punch']}")
+            print("------------------------")
+        
+        return users, {
+            "success": True,
+            "message": f"Retrieved {len(attendance_data)} attendance records",
+            "count": len(attendance_data),
+            "data": attendance_data
+        }
+
+    def get_attendance_data(self, skip_if_unchanged: bool = False) -> Dict[str, Any]:
+        """Get attendance records from the device with retry logic
+
+        With skip_if_unchanged=True the device counters are checked first. If
+        nothing moved since the last download the log is not read again and the
+        result has unchanged=True and no data; the caller keeps what it has.
+        """
         def _get_attendance():
-            # Get users for name mapping
-            users = self.conn.get_users()
-            user_dict = {user.user_id: user.name for user in users}
-            
-            # Get attendance records
-            attendances = self.conn.get_attendance()
-         
-            attendance_data = []
-            
-            status_mapping = {
-                0: "Check-in",
-                1: "Check-out",
-                2: "Break-out",
-                3: "Break-in",
-                4: "Overtime-in",
-                5: "Overtime-out"
-            }
-            
-            for attendance in attendances:
-                # Print first 3 attendance records for debugging
-                if attendances.index(attendance) < 3:
-                    print(f"Raw attendance data:")
-                    print(f"  User ID: {attendance.user_id}")
-                    print(f"  Status: {attendance.status}")
-                    print(f"  Time: {attendance.timestamp}")
-                    print(f"  Punch: {attendance.punch}")
-                    print(f"  Punch Type: {type(attendance.punch)}")
-                    print(f"  Raw Attendance Object:")
-                    for attr in dir(attendance):
-                        if not attr.startswith('_'):  # Only show public attributes
-                            print(f"    {attr}: {getattr(attendance, attr)}")
-                    print("------------------------")
-                user_name = user_dict.get(attendance.user_id, f"User {attendance.user_id}")
-                status = status_mapping.get(attendance.punch, f"Unknown Status {attendance.punch}")
-                
-                # Fix timezone adjustment using timedelta to avoid hour overflow
-                timestamp = attendance.timestamp
-                uid = attendance.uid
-                if timestamp:
-                    # Add 3 hours using timedelta to handle day/hour overflow properly
-                    timestamp = timestamp + timedelta(hours=3)
-                
-                attendance_data.append({
-                    "uid": uid,
-                    "user_name": user_name,
-                    "user_id": attendance.user_id,
-                    "timestamp": timestamp.isoformat() if timestamp else None,
-                    "status": status,
-                    "punch": attendance.punch
-                })
+            counters = self._read_counters()
+            if skip_if_unchanged and self._probe(counters) == self._attendance_counters:
+                print("Device counters unchanged, skipping attendance download")
+                return {
+                    "success": True,
+                    "message": "Device counters unchanged since the last download",
+                    "unchanged": True,
+                    "data": None
+                }
             
-            return {
-                "success": True,
-                "message": f"Retrieved {len(attendance_data)} attendance records",
-                "count": len(attendance_data),
-                "data": attendance_data
-            }
+            _, result = self._read_attendance()
+            self._ingest(result["data"])
+            # Taken after the download, which refreshed the user table version
+            self._attendance_counters = self._probe(counters)
+            return result
         
         try:
-            result = self._execute_with_retry("get_attendance_data", _get_attendance)
-            return result
+            return self._execute_with_retry("get_attendance_data", _get_attendance)
             
         except Exception as e:
             return {
@@ -447,108 +1143,173 @@ class ZKTecoManager:
                 "data": []
             }
         finally:
-            self.disconnect()  # Always clean up
+            self._release()  # Always clean up
     
-    def sync_attendance_to_api(self) -> Dict[str, Any]:
-        """Get attendance data and send to API with improved error handling"""
+    def refresh_archive(self) -> Dict[str, Any]:
+        """Archive new device records and refresh the daily aggregates they touch
+
+        The download is skipped when the device probe has not moved since the
+        last refresh. Records before the sync watermark are not decoded: the
+        sync or live capture that moved the watermark archived them.
+        """
+        def _read():
+            counters = self._read_counters()
+            if self._probe(counters) == self._archived_counters:
+                return counters, None
+            raw = self._read_raw()
+            self._cache_users(raw[0])
+            return counters, raw
+        
+        try:
+            counters, raw = self._execute_with_retry("refresh_archive", _read)
+        except Exception as e:
+            return {"success": False, "message": f"Failed to read attendance data: {str(e)}"}
+        finally:
+            self._release()
+        
+        if raw is None:
+            return {"success": True, "message": "Device counters unchanged since the last refresh",
+                    "unchanged": True, "count": 0}
+        
+        watermark = self.store.get_watermark(self.device_key)
+        count = 0
+        for batch in batched(self.decode_attendance(raw, start=watermark), self.upload_batch_size):
+            self._ingest(batch)
+            count += len(batch)
+        self._archived_counters = self._probe(counters)
+        return {"success": True, "message": f"Archived up to {count} new attendance records", "count": count}
+    
+    def sync_attendance_to_api(self, incremental: bool = False, dedup: bool = True) -> Dict[str, Any]:
+        """Get attendance data and send to API with improved error handling
+
+        With incremental=True only records at or after the stored watermark are sent.
+        With dedup=True records the backend already accepted are never resent.
+        The log is decoded lazily and uploaded in batches of upload_batch_size
+        records, so memory does not grow with the size of the device log.
+        """
         try:
             print("Starting attendance sync...")
             
-            # Get attendance data with retry logic
-            attendance_result = self.get_attendance_data()
-            print(f"Attendance fetch result: {attendance_result['success']}")
-            print("Sample attendance data:")
-            if attendance_result['success'] and attendance_result.get('data'):
-                for i, record in enumerate(attendance_result['data'][:3]):
-                    print(f"  Record {i+1}: User: {record['user_name']}, "
-                          f"Time: {record['timestamp']}, Status: {record['status']}")
-                if len(attendance_result['data']) > 3:
-                    print(f"  ... and {len(attendance_result['data']) - 3} more records")
-            else:
-                print("  No attendance data available")
-            
+            # Fetch users and the raw attendance log in a single device session
+            def _fetch():
+                counters, raw = self._read_counters(), None
+                if not incremental or self._probe(counters) != self._synced_counters:
+                    raw = self._read_raw()
+                    self._cache_users(raw[0])
+                return self._probe(counters), raw
             
-            if not attendance_result["success"]:
-                return attendance_result
-            
-            attendance_data = attendance_result["data"]
+            try:
+                counters, raw = self._execute_with_retry("sync_attendance", _fetch)
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"Failed to get attendance data: {str(e)}",
+                    "data": []
+                }
+            finally:
+                self._release()
             
-            if not attendance_data:
+            if raw is None:
+                print("Device counters unchanged since last sync, skipping download")
                 return {
                     "success": True,
-                    "message": "No attendance records found",
-                    "count": 0
+                    "message": "Device counters unchanged, nothing to sync",
+                    "count": 0,
+                    "unchanged": True
                 }
             
-            print(f"Retrieved {len(attendance_data)} attendance records")
+            users = raw[0]
+            print(f"Retrieved {raw[2]} attendance records")
             
-            # Get user data separately with retry logic
-            def _get_users():
-                users = self.conn.get_users()
-                return [{
-                    "name": user.name,
-                    "userId": user.user_id
-                } for user in users]
+            # Reuse the users fetched with the attendance log
+            user_attendance = [{
+                "name": user.name,
+                "userId": user.user_id
+            } for user in users]
             
+            # Send user changes first
             try:
-                user_attendance = self._execute_with_retry("get_users_for_sync", _get_users)
+                self._push_user_delta(user_attendance)
+            except Exception as e:
+                print(f"Error sending user data: {str(e)}")
+                # Continue with attendance data even if user data fails
+            
+            # The watermark never passes a record the backend has not accepted, so
+            # everything before it was sent; records at the watermark are resent
+            # unless dedup already knows them
+            watermark = self.store.get_watermark(self.device_key) if incremental else None
+            records = iter(self.decode_attendance(raw))
+            sent = 0
+            sent_through = None  # newest record of the batches handled so far
+            response = None
+            
+            for batch in batched(records, self.upload_batch_size):
+                self._ingest(batch)
+                if watermark:
+                    batch = [record for record in batch if record["timestamp"] and record["timestamp"] >= watermark]
+                # Once this batch is uploaded every record in it is on the backend,
+                # including those dedup drops because an earlier upload sent them
+                newest = max((r["timestamp"] for r in batch if r["timestamp"]), default=None)
+                if dedup:
+                    batch = self.dedup.filter_new(self.device_key, batch)
                 
-                # Send user data first
-                if user_attendance:
+                if batch:
+                    print(f"Sending {len(batch)} attendance records to API...")
                     try:
-                        response = requests.post(
-                            f"{self.api_base_url}/attendanceUser/create",
-                            json=user_attendance,
-                            headers={"Content-Type": "application/json"},
-                            timeout=30
+                        response = self._post_to_backend(
+                            "/attendance/create",
+                            batch,
+                            encode_compact_attendance,
+                            timeout=3000
                         )
-                        print(f"User data sent successfully. Status: {response.status_code}")
+                        print(f"Attendance data sent. Status: {response.status_code}")
+                        error = None if response.status_code < 400 else f"Status: {response.status_code}"
                     except Exception as e:
-                        print(f"Error sending user data: {str(e)}")
-                        # Continue with attendance data even if user data fails
+                        print(f"Error sending attendance data: {str(e)}")
+                        error = str(e)
+                    
+                    if error is not None:
+                        # Keep the watermark below every record that is still unsent
+                        oldest = min((r["timestamp"] for r in batch if r["timestamp"]), default=None)
+                        for rest in batched(records, self.upload_batch_size):
+                            self._ingest(rest)
+                            pending = [r["timestamp"] for r in rest
+                                       if r["timestamp"] and (not watermark or r["timestamp"] >= watermark)]
+                            if pending and (not oldest or min(pending) < oldest):
+                                oldest = min(pending)
+                        if sent_through and oldest:
+                            self.store.set_watermark(self.device_key, min(sent_through, oldest))
+                        return {
+                            "success": False,
+                            "message": f"Failed to send attendance data to server after {sent} records: {error}",
+                            "count": sent,
+                            "data": batch
+                        }
+                    
+                    self.dedup.mark_sent(self.device_key, batch)
+                    sent += len(batch)
                 
-            except Exception as e:
-                print(f"Error getting users for sync: {str(e)}")
-                # Continue with attendance data even if user data fails
+                if newest and (not sent_through or newest > sent_through):
+                    sent_through = newest
             
-            # Send attendance data
-            try:
-                print("Sending attendance data to API...")
-                print(f"Total records to send: {len(attendance_data)}")
-                print("Sample attendance data (first 3 records):")
-                for i, record in enumerate(attendance_data[:3]):
-                    print(f"  Record {i+1}: {record}")
-                
-                if len(attendance_data) > 3:
-                    print(f"  ... and {len(attendance_data) - 3} more records")
-                
-                # print("Full attendance data structure:")
-                # print(json.dumps(attendance_data, indent=2, default=str))
-                
-                response = requests.post(
-                    f"{self.api_base_url}/attendance/create",
-                    json=attendance_data,
-                    headers={"Content-Type": "application/json"},
-                    timeout=3000
-                )
-                
-                print(f"Attendance data sent. Status: {response.status_code}")
-                
+            self._synced_counters = counters
+            if sent_through and (dedup or sent):
+                self.store.set_watermark(self.device_key, sent_through)
+            
+            if not sent:
                 return {
                     "success": True,
-                    "message": f"Attendance data sent successfully. Status: {response.status_code}",
-                    "count": len(attendance_data),
-                    "data": response.json() if response.content else None
-                }
-                
-            except Exception as e:
-                print(f"Error sending attendance data: {str(e)}")
-                return {
-                    "success": False,
-                    "message": f"Failed to send attendance data to server: {str(e)}",
-                    "data": attendance_data
+                    "message": "No new attendance records" if incremental else "No attendance records found",
+                    "count": 0
                 }
             
+            return {
+                "success": True,
+                "message": f"Attendance data sent successfully. Status: {response.status_code}",
+                "count": sent,
+                "data": response.json() if response.content else None
+            }
+            
         except Exception as e:
             print(f"Sync error: {str(e)}")
             return {
@@ -558,7 +1319,106 @@ class ZKTecoManager:
         
         finally:
             # Ensure connection is always cleaned up
-            self.disconnect()
+            self._release()
+
+    def live_capture(self, on_punch, should_stop, event_timeout: int = 5):
+        """Stream punches from the device's real-time events until should_stop() returns True
+
+        on_punch receives each record, formatted like get_attendance_data, as soon as
+        the terminal reports it. The session is used exclusively while capturing.
+        """
+        if not self.connect():
+            raise Exception("Failed to establish connection")
+        
+        users = self.conn.get_users()
+        user_dict = {user.user_id: user.name for user in users}
+        self._cache_users(users)
+        print(f"Live capture started on {self.device_key}")
+        
+        for attendance in self.conn.live_capture(new_timeout=event_timeout):
+            if should_stop():
+                # Let the generator unregister the event and restore the socket timeout
+                self.conn.end_live_capture = True
+                continue
+            if attendance is None:
+                continue
+            on_punch(self._format_attendance(attendance, user_dict))
+        
+        print(f"Live capture stopped on {self.device_key}")
+
+    def archive_and_clear_attendance(self, dry_run: bool = False, require_synced: bool = True) -> Dict[str, Any]:
+        """Archive the device attendance log locally, verify it, then clear it from the device"""
+        device = self.device_key
+        state = {"device_records": None, "pulled_records": None, "archived_records": None, "would_clear": False}
+        
+        def _archive_and_clear():
+            # Freeze the terminal so no punch lands between the pull and the clear
+            self.conn.disable_device()
+            try:
+                self.conn.read_sizes()
+                state["device_records"] = self.conn.records
+                
+                _, result = self._read_attendance()
+                records = result["data"]
+                state["pulled_records"] = len(records)
+                
+                if len(records) != self.conn.records:
+                    return False, f"Pulled {len(records)} records but device reports {self.conn.records}"
+                if not records:
+                    return False, "Device attendance log is empty, nothing to clear"
+                
+                if not dry_run:
+                    ingest_attendance(self.store, device, records)
+                
+                distinct = len({(r["user_id"], r["timestamp"], r["punch"]) for r in records if r["timestamp"]})
+                state["archived_records"] = self.store.count_archived(device, records)
+                if not dry_run and state["archived_records"] != distinct:
+                    return False, f"Only {state['archived_records']} of {distinct} records found in the archive"
+                
+                if require_synced:
+                    watermark = self.store.get_watermark(device)
+                    newest = max((r["timestamp"] for r in records if r["timestamp"]), default=None)
+                    if newest and (not watermark or newest > watermark):
+                        return False, f"Records up to {newest} have not been synced to the backend yet"
+                
+                # Every check passed, a dry run stops here
+                state["would_clear"] = True
+                if dry_run:
+                    return False, f"Dry run: {len(records)} records would be archived and cleared"
+                
+                self.conn.clear_attendance()
+                self.conn.read_sizes()
+                if self.conn.records:
+                    return False, f"Clear command sent but device still reports {self.conn.records} records"
+                
+                return True, f"Archived and cleared {len(records)} attendance records"
+            finally:
+                self.conn.enable_device()
+        
+        try:
+            cleared, message = self._execute_with_retry("archive_and_clear_attendance", _archive_and_clear)
+            if cleared:
+                self._forget_counters()
+            success = cleared or (dry_run and state["would_clear"]) or state["device_records"] == 0
+        except Exception as e:
+            cleared, success, message = False, False, f"Failed to archive attendance: {str(e)}"
+        finally:
+            self._release()
+        
+        print(message)
+        audit_id = self.store.add_clear_audit(
+            device, dry_run, state["device_records"], state["pulled_records"],
+            state["archived_records"], cleared, message
+        )
+        
+        return {
+            "success": success,
+            "cleared": cleared,
+            "dry_run": dry_run,
+            "message": message,
+            "audit_id": audit_id,
+            **state
+        }
 
 # Example usage and testing
 if __name__ == "__main__":
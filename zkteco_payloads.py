@@ -0,0 +1,76 @@
+import calendar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Payload formats understood by the backend's /attendance/create and /attendanceUser/create
+PAYLOAD_FORMAT_JSON = "json"
+PAYLOAD_FORMAT_COMPACT = "compact-v1"
+# Try compact first and fall back to JSON for backends that reject it
+PAYLOAD_FORMAT_AUTO = "auto"
+PAYLOAD_FORMATS = (PAYLOAD_FORMAT_AUTO, PAYLOAD_FORMAT_COMPACT, PAYLOAD_FORMAT_JSON)
+# What backends without compact support answer (400) when the body is not a plain array
+FORMAT_REJECTED_MESSAGE = "invalid format"
+
+
+def rejects_format(response) -> bool:
+    """True if the backend refused a payload because it does not understand its format
+
+    Other 400s, such as a validation error in one record, are not a reason to
+    stop sending compact payloads.
+    """
+    if response.status_code != 400:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    message = body.get("message", "") if isinstance(body, dict) else ""
+    return FORMAT_REJECTED_MESSAGE in str(message).lower()
+
+
+def _to_epoch(timestamp: Optional[str]) -> Optional[int]:
+    """Encode a naive ISO timestamp as seconds since 1970-01-01 without shifting the wall clock"""
+    if not timestamp:
+        return None
+    return calendar.timegm(datetime.fromisoformat(timestamp).timetuple())
+
+
+def encode_compact_attendance(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Dictionary-encode attendance records into the compact-v1 schema
+
+    Users and status labels are sent once in lookup tables, and every record
+    becomes a row of integers: [uid, user index, punch code, epoch seconds].
+    """
+    user_index: Dict[str, int] = {}
+    users: List[List[Any]] = []
+    statuses: Dict[str, str] = {}
+    rows: List[List[Any]] = []
+
+    for record in records:
+        user_id = record["user_id"]
+        index = user_index.get(user_id)
+        if index is None:
+            index = user_index[user_id] = len(users)
+            users.append([user_id, record["user_name"]])
+
+        punch = record["punch"]
+        statuses.setdefault(str(punch), record["status"])
+
+        rows.append([record["uid"], index, punch, _to_epoch(record["timestamp"])])
+
+    return {
+        "format": PAYLOAD_FORMAT_COMPACT,
+        "users": users,
+        "statuses": statuses,
+        "fields": ["uid", "user", "punch", "ts"],
+        "records": rows,
+    }
+
+
+def encode_compact_users(users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Encode the user list for /attendanceUser/create as rows instead of keyed objects"""
+    return {
+        "format": PAYLOAD_FORMAT_COMPACT,
+        "fields": ["userId", "name"],
+        "records": [[user["userId"], user["name"]] for user in users],
+    }
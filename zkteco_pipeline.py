@@ -0,0 +1,146 @@
+"""Bounded-memory attendance pipeline
+
+    fetch -> transform -> serialize -> sink
+
+fetch is ZKTecoManager.read_raw_attendance (one transfer of the raw log),
+transform is ZKTecoManager.decode_attendance, serialize turns records into
+output chunks of about chunk_size bytes, and a sink writes them out. Every
+stage is a generator pulling from the one before it, so only one record and
+one chunk are alive at a time however long the log is; a slow sink simply
+stops pulling. buffered() lets two stages overlap on separate threads behind a
+bounded queue, which blocks the producer when the consumer falls behind.
+"""
+import queue
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from zkteco_export import WRITERS
+
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "binary": "application/octet-stream",
+}
+
+_DONE = object()
+
+
+class _ChunkBuffer:
+    """File-like target for the export writers that hands back what was written"""
+
+    def __init__(self, binary: bool):
+        self.binary = binary
+        self.parts: List[Any] = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts) if self.binary else "".join(self.parts).encode("utf-8")
+        self.parts = []
+        self.size = 0
+        return data
+
+
+def serialize(records: Iterable[Dict[str, Any]], fmt: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode records with the export writer for fmt, yielding byte chunks of about chunk_size"""
+    target = _ChunkBuffer(WRITERS[fmt].binary)
+    writer = WRITERS[fmt](target)
+    for record in records:
+        if not record.get("timestamp"):
+            continue
+        writer.write(record)
+        if target.size >= chunk_size:
+            yield target.take()
+    writer.close()
+    if target.size:
+        yield target.take()
+
+
+def batched(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group records into lists of at most size, e.g. for backend uploads"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def buffered(items: Iterable[Any], maxsize: int = 8) -> Iterator[Any]:
+    """Run items on a producer thread, keeping at most maxsize results ahead of the consumer
+
+    An exception in the producer is raised in the consumer. If the consumer
+    stops early the producer is told to stop at its next put.
+    """
+    slots: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    cancelled = threading.Event()
+
+    def _put(item) -> bool:
+        while not cancelled.is_set():
+            try:
+                slots.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in items:
+                if not _put((None, item)):
+                    return
+            _put((None, _DONE))
+        except BaseException as e:
+            _put((e, None))
+
+    thread = threading.Thread(target=_produce, name="pipeline-stage", daemon=True)
+    thread.start()
+    try:
+        while True:
+            error, item = slots.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
+
+
+def write_to(chunks: Iterable[bytes], stream) -> int:
+    """Sink: write chunks to a binary stream; returns the number of bytes written"""
+    written = 0
+    for chunk in chunks:
+        stream.write(chunk)
+        written += len(chunk)
+    stream.flush()
+    return written
+
+
+def export_chunks(manager, fmt: str, raw: Optional[tuple] = None, start: Optional[str] = None,
+                  end: Optional[str] = None, user_id: Optional[str] = None,
+                  chunk_size: int = CHUNK_SIZE, prefetch: int = 0) -> Iterator[bytes]:
+    """Serialized attendance export of one device as a chunk generator
+
+    raw is a read_raw_attendance() result; when omitted the device is read
+    before returning. With prefetch > 0 decoding runs on its own thread, up to
+    prefetch records ahead of serialization.
+    """
+    if raw is None:
+        raw = manager.read_raw_attendance()
+    records = manager.decode_attendance(raw, start, end, user_id)
+    if prefetch:
+        records = buffered(records, prefetch)
+    return serialize(records, fmt, chunk_size)
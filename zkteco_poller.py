@@ -0,0 +1,226 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from zkteco_config import get_registry
+from zkteco_manager import ZKTecoManager
+
+
+def parse_devices(spec: str) -> List[Dict[str, Any]]:
+    """Parse "ip[:port],profile-name,..." into ZKTecoManager arguments"""
+    names = {profile.name for profile in get_registry().profiles()}
+    devices = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item in names:
+            devices.append({"profile": item})
+            continue
+        host, _, port = item.partition(":")
+        devices.append({"device_ip": host, "device_port": int(port) if port else 4370})
+    return devices
+
+
+class DevicePoller:
+    """Runs incremental syncs for one device on a jittered schedule"""
+
+    def __init__(self, manager: ZKTecoManager, interval: float, jitter: float):
+        self.manager = manager
+        self.manager.keep_alive = True
+        self.interval = interval
+        self.jitter = jitter
+
+        self._run_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.runs = 0
+        self.coalesced = 0
+        self.last_started: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_count = 0
+        self.last_duration: Optional[float] = None
+
+    def _next_delay(self) -> float:
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def run_once(self) -> bool:
+        """Sync now, or fold into the run already in progress. Returns False if coalesced.
+
+        The schedule calls this from the poller thread and the API's
+        sync-attendance route from request threads.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            # A sync is running; ask it to go round once more instead of queueing another
+            self.coalesced += 1
+            self._pending.set()
+            return False
+
+        try:
+            while True:
+                self._pending.clear()
+                self._sync()
+                if not self._pending.is_set() or self._stop.is_set():
+                    return True
+        finally:
+            self._run_lock.release()
+
+    def _sync(self):
+        self.runs += 1
+        self.last_started = time.time()
+        try:
+            with self.manager.lock:
+                result = self.manager.sync_attendance_to_api(incremental=True)
+                if self.manager.lock.contended:
+                    # Another manager wants the terminal; do not keep our session open across its turn
+                    self.manager.disconnect()
+            if result.get("success"):
+                self.last_success = time.time()
+                self.last_error = None
+                self.last_count = result.get("count", 0)
+            else:
+                self.last_error = result.get("message")
+                # Drop the session so the next poll starts from a clean connection
+                self.manager.disconnect()
+        except Exception as e:
+            self.last_error = str(e)
+            self.manager.disconnect()
+        finally:
+            self.last_duration = time.time() - self.last_started
+
+    def _loop(self):
+        # Spread the first polls of a fleet so devices are not hit at the same moment
+        delay = random.uniform(0, self.interval * self.jitter) if self.jitter else 0
+        while not self._stop.is_set():
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
+            delay = self._next_delay()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._loop, name=f"poller-{self.manager.device_key}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        with self.manager.lock:
+            self.manager.keep_alive = False
+            self.manager.disconnect()
+
+    def status(self) -> Dict[str, Any]:
+        def _iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        now = time.time()
+        return {
+            "device": self.manager.device_key,
+            "interval_seconds": self.interval,
+            "jitter": self.jitter,
+            "running": self._run_lock.locked(),
+            "runs": self.runs,
+            "coalesced_runs": self.coalesced,
+            "last_started": _iso(self.last_started),
+            "last_success": _iso(self.last_success),
+            "lag_seconds": round(now - self.last_success, 1) if self.last_success else None,
+            "last_duration_seconds": round(self.last_duration, 2) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+            "last_record_count": self.last_count,
+            "watermark": self.manager.store.get_watermark(self.manager.device_key),
+        }
+
+
+class AttendancePoller:
+    """Background poller that keeps every configured device synced to the backend"""
+
+    def __init__(self, managers: List[ZKTecoManager], interval: float = 60, jitter: float = 0.2):
+        self.pollers = {m.device_key: DevicePoller(m, interval, jitter) for m in managers}
+
+    def start(self):
+        for poller in self.pollers.values():
+            poller.start()
+        print(f"Attendance poller started for {len(self.pollers)} device(s)")
+
+    def stop(self, timeout: Optional[float] = 30):
+        for poller in self.pollers.values():
+            poller.stop(timeout)
+        print("Attendance poller stopped")
+
+    def status(self) -> Dict[str, Any]:
+        return {key: poller.status() for key, poller in self.pollers.items()}
+
+
+def _serve_health(poller: AttendancePoller, port: int) -> ThreadingHTTPServer:
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_error(404)
+                return
+            body = json.dumps({
+                "status": "healthy",
+                "message": "ZKTeco attendance poller is running",
+                "poller": poller.status()
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
+    threading.Thread(target=server.serve_forever, name="poller-health", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Poll ZKTeco devices and sync attendance to the backend")
+    parser.add_argument("--devices", default=None,
+                        help="comma separated ip[:port] or profile names, default every configured device")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between polls per device")
+    parser.add_argument("--jitter", type=float, default=0.2, help="random +/- fraction applied to the interval")
+    parser.add_argument("--health-port", type=int, default=None, help="serve GET /health on this port")
+    args = parser.parse_args(argv)
+
+    if args.devices:
+        devices = parse_devices(args.devices)
+    else:
+        devices = [{"profile": profile.name} for profile in get_registry().profiles()]
+    managers = [ZKTecoManager(**device) for device in devices]
+    poller = AttendancePoller(managers, interval=args.interval, jitter=args.jitter)
+    poller.start()
+
+    server = _serve_health(poller, args.health_port) if args.health_port else None
+    if server:
+        print(f"Health endpoint on http://0.0.0.0:{args.health_port}/health")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server:
+            server.shutdown()
+        poller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Attendance log record layouts, by record size (see pyzk ZK.get_attendance);
+# the 4-byte timestamp is read as an integer and decoded by decode_time
+RECORD_FORMATS = {
+    8: struct.Struct("<HBIB"),          # uid, status, time, punch
+    16: struct.Struct("<IIBB2sI"),      # user_id, time, status, punch, reserved, workcode
+    40: struct.Struct("<H24sBIB8s"),    # uid, user_id, status, time, punch, reserved
+}
+
+
+def decode_time(t: int) -> datetime:
+    """Decode a device timestamp (zkemsdk DecodeTime)"""
+    second = t % 60
+    t //= 60
+    minute = t % 60
+    t //= 60
+    hour = t % 24
+    t //= 24
+    day = t % 31 + 1
+    t //= 31
+    month = t % 12 + 1
+    year = t // 12 + 2000
+    return datetime(year, month, day, hour, minute, second)
+
+
+def record_size(buffer, record_count: int) -> int:
+    """Size of one record in a CMD_ATTLOG_RRQ buffer (first 4 bytes hold the payload size)"""
+    if len(buffer) < 4 or not record_count:
+        return 0
+    total = struct.unpack_from("<I", buffer)[0]
+    if total % record_count == 0 and total // record_count in (8, 16):
+        return total // record_count
+    return 40
+
+
+def iter_raw_attendance(buffer, record_count: int,
+                        uid_to_user_id: Dict[int, str]) -> Iterator[Tuple[Any, str, datetime, int, int]]:
+    """Decode a raw attendance buffer into (uid, user_id, timestamp, status, punch) tuples
+
+    Records are unpacked one at a time from a memoryview, so no copy of the
+    buffer and no list of records is made.
+    """
+    size = record_size(buffer, record_count)
+    if not size:
+        return
+    layout = RECORD_FORMATS[size]
+    view = memoryview(buffer)[4:]
+    usable = len(view) - len(view) % size
+    user_id_to_uid = {user_id: uid for uid, user_id in uid_to_user_id.items()} if size == 16 else None
+
+    for fields in layout.iter_unpack(view[:usable]):
+        if size == 8:
+            uid, status, t, punch = fields
+            user_id = uid_to_user_id.get(uid, str(uid))
+        elif size == 16:
+            number, t, status, punch, _, _ = fields
+            user_id = str(number)
+            # As in pyzk, a user ID missing from the user table keeps itself as uid, as a string
+            uid = user_id_to_uid.get(user_id, user_id)
+        else:
+            uid, raw_user_id, status, t, punch, _ = fields
+            user_id = raw_user_id.split(b"\x00")[0].decode(errors="ignore")
+        yield uid, user_id, decode_time(t), status, punch
+
+
+def format_record(uid, user_id: str, timestamp: Optional[datetime], punch: int, user_names: Dict[str, str],
+                  status_mapping: Dict[int, str], utc_offset: timedelta) -> Dict[str, Any]:
+    """Build the attendance record sent to the backend and written by exports"""
+    user_name = user_names.get(user_id, f"User {user_id}")
+    status = status_mapping.get(punch, f"Unknown Status {punch}")
+    
+    # Fix timezone adjustment using timedelta to avoid hour overflow
+    if timestamp:
+        timestamp = timestamp + utc_offset
+    
+    return {
+        "uid": uid,
+        "user_name": user_name,
+        "user_id": user_id,
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "status": status,
+        "punch": punch
+    }
+
+
+def decode_attendance(buffer, record_count: int, uid_to_user_id: Dict[int, str], user_names: Dict[str, str],
+                      status_mapping: Dict[int, str], utc_offset: timedelta, start: Optional[str] = None,
+                      end: Optional[str] = None, user_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Lazily format a raw attendance buffer, filtered by inclusive ISO time range and user
+
+    Only plain data is needed, so this also runs in worker processes.
+    """
+    for uid, record_user_id, timestamp, _, punch in iter_raw_attendance(buffer, record_count, uid_to_user_id):
+        if user_id is not None and record_user_id != user_id:
+            continue
+        record = format_record(uid, record_user_id, timestamp, punch, user_names, status_mapping, utc_offset)
+        if start and record["timestamp"] < start:
+            continue
+        if end and record["timestamp"] > end:
+            continue
+        yield record
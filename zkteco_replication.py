@@ -0,0 +1,224 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from zkteco_manager import ZKTecoManager
+
+USER_FIELDS = ("userId", "name", "privilege", "password", "group_id", "cardNumber")
+
+
+def replicated_user_hash(user: Dict[str, Any]) -> str:
+    """Hash of the user fields that are copied between devices (the UID is device local)"""
+    row = json.dumps([str(user[field]) for field in USER_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(row.encode("utf-8")).hexdigest()
+
+
+def content_hash(user_digest: str, fingers: List[tuple]) -> str:
+    """Hash of a user together with its fingerprint templates"""
+    digest = hashlib.sha1(user_digest.encode("ascii"))
+    for _, fid, valid, template in sorted(fingers, key=lambda f: f[1]):
+        digest.update(bytes((fid, valid)))
+        digest.update(template)
+    return digest.hexdigest()
+
+
+class TargetState:
+    """Replication progress of one target device"""
+
+    def __init__(self, manager: ZKTecoManager):
+        self.manager = manager
+        self.pending = 0
+        self.pending_since: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.replicated_users = 0
+        self.conflicts = 0
+
+
+class ReplicationService:
+    """Copies new and changed users and fingerprint templates from a source device to targets
+
+    Each pass reads the source once, then writes only the users whose content differs
+    from what was last replicated to each target, in one bulk session per target,
+    with all targets written in parallel. The source wins conflicts; a target user
+    edited locally since the last replication is overwritten and reported.
+    Users deleted on the source are not removed from targets.
+    """
+
+    def __init__(self, source: ZKTecoManager, targets: List[ZKTecoManager],
+                 interval: float = 300, conflict_history: int = 100):
+        self.source = source
+        self.store = source.store
+        self.targets = {t.device_key: TargetState(t) for t in targets}
+        self.interval = interval
+
+        self._run_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.runs = 0
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.recent_conflicts = collections.deque(maxlen=conflict_history)
+
+    def _read_source(self):
+        def _read():
+            users = self.source.conn.get_users()
+            fingers = self.source.conn.get_templates()
+            return users, fingers
+
+        with self.source.lock:
+            try:
+                users, fingers = self.source._execute_with_retry("replication_read", _read)
+            finally:
+                self.source._release()
+
+        templates: Dict[int, List[tuple]] = {}
+        for f in fingers:
+            templates.setdefault(f.uid, []).append((f.uid, f.fid, f.valid, f.template))
+        return [ZKTecoManager._user_dict(u) for u in users], templates
+
+    def run_once(self) -> Dict[str, Any]:
+        """Replicate now; returns per-target results"""
+        with self._run_lock:
+            self.runs += 1
+            self.last_run = time.time()
+            try:
+                users, templates = self._read_source()
+            except Exception as e:
+                self.last_error = f"Failed to read source {self.source.device_key}: {str(e)}"
+                print(self.last_error)
+                return {"success": False, "message": self.last_error}
+            self.last_error = None
+
+            hashes = {}
+            for user in users:
+                digest = replicated_user_hash(user)
+                hashes[user["userId"]] = (content_hash(digest, templates.get(user["uid"], [])), digest)
+
+            with ThreadPoolExecutor(max_workers=max(len(self.targets), 1),
+                                    thread_name_prefix="replicate") as pool:
+                futures = {
+                    key: pool.submit(self._replicate_target, state, users, templates, hashes)
+                    for key, state in self.targets.items()
+                }
+                results = {key: future.result() for key, future in futures.items()}
+
+            return {
+                "success": all(r["success"] for r in results.values()),
+                "source": self.source.device_key,
+                "users": len(users),
+                "targets": results
+            }
+
+    def _replicate_target(self, state: TargetState, users: List[Dict[str, Any]],
+                          templates: Dict[int, List[tuple]], hashes: Dict[str, tuple]) -> Dict[str, Any]:
+        target = state.manager.device_key
+        replicated = self.store.get_replication_state(self.source.device_key, target)
+        changed = [u for u in users if replicated.get(u["userId"], (None,))[0] != hashes[u["userId"]][0]]
+
+        state.pending = len(changed)
+        if not changed:
+            state.pending_since = None
+            state.last_success = time.time()
+            state.last_error = None
+            return {"success": True, "replicated": 0, "conflicts": []}
+        if state.pending_since is None:
+            state.pending_since = time.time()
+
+        changed_templates = [f for u in changed for f in templates.get(u["uid"], [])]
+        with state.manager.lock:
+            result = state.manager.write_user_templates(changed, changed_templates)
+        if not result["success"]:
+            state.last_error = result["message"]
+            print(f"Replication to {target} failed: {state.last_error}")
+            return {"success": False, "message": state.last_error}
+
+        conflicts = []
+        for user_id, previous in result["previous"].items():
+            found = replicated_user_hash(previous)
+            last = replicated.get(user_id)
+            if found == hashes[user_id][1] or (last is not None and found == last[1]):
+                continue
+            # The target copy changed on its own since the last replication (or was never ours)
+            conflict = {
+                "target": target,
+                "userId": user_id,
+                "detected_at": datetime.now().isoformat(),
+                "target_user": previous,
+                "resolution": "source version applied"
+            }
+            conflicts.append(conflict)
+            self.recent_conflicts.append(conflict)
+
+        self.store.set_replication_state(
+            self.source.device_key, target, {u["userId"]: hashes[u["userId"]] for u in changed}
+        )
+        state.replicated_users += len(changed)
+        state.conflicts += len(conflicts)
+        state.pending = 0
+        state.pending_since = None
+        state.last_success = time.time()
+        state.last_error = None
+        print(f"Replicated {len(changed)} users to {target} ({len(conflicts)} conflicts)")
+        return {"success": True, "replicated": len(changed), "conflicts": conflicts}
+
+    def trigger(self):
+        """Request a replication pass outside the schedule"""
+        self._wakeup.set()
+
+    def _loop(self):
+        delay = 0
+        while not self._stop.is_set():
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
+            delay = self.interval
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._loop, name=f"replication-{self.source.device_key}", daemon=True
+        )
+        self._thread.start()
+        print(f"Replication started from {self.source.device_key} to {len(self.targets)} device(s)")
+
+    def stop(self, timeout: Optional[float] = 30):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        print("Replication stopped")
+
+    def status(self) -> Dict[str, Any]:
+        def _iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        now = time.time()
+        return {
+            "source": self.source.device_key,
+            "interval_seconds": self.interval,
+            "running": self._run_lock.locked(),
+            "runs": self.runs,
+            "last_run": _iso(self.last_run),
+            "last_error": self.last_error,
+            "targets": {
+                key: {
+                    "pending_users": state.pending,
+                    "lag_seconds": round(now - state.pending_since, 1) if state.pending_since else 0,
+                    "last_success": _iso(state.last_success),
+                    "last_error": state.last_error,
+                    "replicated_users": state.replicated_users,
+                    "conflicts": state.conflicts,
+                }
+                for key, state in self.targets.items()
+            },
+            "recent_conflicts": list(self.recent_conflicts),
+        }
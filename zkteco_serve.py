@@ -0,0 +1,115 @@
+import argparse
+import os
+import signal
+import sys
+import tempfile
+from typing import List, Optional
+
+# Device calls block for up to timeout x retries, so workers need generous request timeouts
+DEFAULT_THREADS = 16
+DEFAULT_WORKERS = 1
+REQUEST_TIMEOUT = 300
+GRACEFUL_TIMEOUT = 60
+
+_services_lock = None
+
+
+def _claim_background_services() -> bool:
+    """Return True in exactly one worker process, which then runs the background services"""
+    global _services_lock
+    import fcntl
+
+    path = os.path.join(tempfile.gettempdir(), "zkteco_api_services.lock")
+    handle = open(path, "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    # Keep the handle open: the lock is held until this worker exits
+    _services_lock = handle
+    return True
+
+
+def serve_waitress(host: str, port: int, threads: int):
+    """Single process, thread pool server; works on Windows"""
+    from waitress import serve
+    import zkteco_api
+
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _terminate)
+    zkteco_api.start_background_services()
+    print(f"Serving ZKTeco API with waitress on {host}:{port} ({threads} threads)")
+    try:
+        serve(zkteco_api.app, host=host, port=port, threads=threads,
+              channel_timeout=REQUEST_TIMEOUT, ident="zkteco-api")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        zkteco_api.shutdown(GRACEFUL_TIMEOUT)
+
+
+def serve_gunicorn(host: str, port: int, threads: int, workers: int):
+    """Pre-fork server with threaded (gthread) workers; POSIX only"""
+    from gunicorn.app.base import BaseApplication
+
+    def post_worker_init(worker):
+        import zkteco_api
+        if _claim_background_services():
+            zkteco_api.start_background_services()
+
+    def worker_exit(server, worker):
+        import zkteco_api
+        zkteco_api.shutdown(GRACEFUL_TIMEOUT)
+
+    class ZKTecoApplication(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "gthread",
+                "threads": threads,
+                "timeout": REQUEST_TIMEOUT,
+                "graceful_timeout": GRACEFUL_TIMEOUT,
+                "keepalive": 5,
+                "post_worker_init": post_worker_init,
+                "worker_exit": worker_exit,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import zkteco_api
+            return zkteco_api.app
+
+    print(f"Serving ZKTeco API with gunicorn on {host}:{port} ({workers} workers x {threads} threads)")
+    ZKTecoApplication().run()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the ZKTeco API with a production server")
+    parser.add_argument("--host", default=os.environ.get("ZKTECO_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ZKTECO_PORT", "5000")))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("ZKTECO_THREADS", DEFAULT_THREADS)),
+                        help="request threads per process")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ZKTECO_WORKERS", DEFAULT_WORKERS)),
+                        help="gunicorn worker processes; they take turns on each terminal through its lock file")
+    parser.add_argument("--server", choices=("auto", "waitress", "gunicorn"),
+                        default=os.environ.get("ZKTECO_SERVER", "auto"),
+                        help="auto picks waitress on Windows and gunicorn elsewhere")
+    args = parser.parse_args(argv)
+
+    server = args.server
+    if server == "auto":
+        server = "waitress" if sys.platform == "win32" else "gunicorn"
+
+    if server == "gunicorn":
+        serve_gunicorn(args.host, args.port, args.threads, args.workers)
+    else:
+        serve_waitress(args.host, args.port, args.threads)
+
+
+if __name__ == "__main__":
+    main()
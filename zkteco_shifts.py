@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from zkteco_store import LocalStore, get_store
+
+# Punch codes, see zkteco_config.STANDARD_STATUS_PROFILE
+CHECK_IN = 0
+CHECK_OUT = 1
+BREAK_OUT = 2
+BREAK_IN = 3
+OVERTIME_IN = 4
+OVERTIME_OUT = 5
+
+
+def _minutes(delta: timedelta) -> float:
+    return round(delta.total_seconds() / 60, 1)
+
+
+def pair_user_punches(punches: List[tuple], max_shift_hours: float = 16,
+                      standard_minutes: float = 480) -> Dict[str, Dict[str, Any]]:
+    """Pair one user's punches into shifts and total them per shift start day
+
+    punches is a list of (datetime, punch code) sorted by time. A check-out is
+    matched to the open check-in even across midnight, as long as the shift is
+    not longer than max_shift_hours; the shift counts towards the day it started.
+    """
+    max_shift = timedelta(hours=max_shift_hours)
+    days: Dict[str, Dict[str, Any]] = {}
+    shift_start: Optional[datetime] = None
+    shift_breaks = timedelta()
+    break_start: Optional[datetime] = None
+    overtime_start: Optional[datetime] = None
+
+    def _day(ts: datetime) -> Dict[str, Any]:
+        key = ts.date().isoformat()
+        if key not in days:
+            days[key] = {
+                "date": key,
+                "first_in": None,
+                "last_out": None,
+                "shifts": 0,
+                "worked_minutes": 0.0,
+                "break_minutes": 0.0,
+                "overtime_minutes": 0.0,
+                "issues": [],
+            }
+        return days[key]
+
+    def _close_shift(end: Optional[datetime]):
+        nonlocal shift_start, shift_breaks, break_start
+        day = _day(shift_start)
+        if end is None:
+            day["issues"].append(f"missing check-out after {shift_start.time().isoformat()}")
+        else:
+            worked = end - shift_start - shift_breaks
+            day["worked_minutes"] += _minutes(worked)
+            day["break_minutes"] += _minutes(shift_breaks)
+            day["shifts"] += 1
+            day["last_out"] = end.isoformat()
+        shift_start, shift_breaks, break_start = None, timedelta(), None
+
+    for ts, punch in punches:
+        # An open shift that can no longer be closed was never checked out
+        if shift_start is not None and ts - shift_start > max_shift:
+            _close_shift(None)
+
+        if punch == CHECK_IN:
+            if shift_start is not None:
+                _close_shift(None)
+            shift_start = ts
+            day = _day(ts)
+            if day["first_in"] is None:
+                day["first_in"] = ts.isoformat()
+        elif punch == CHECK_OUT:
+            if shift_start is None:
+                _day(ts)["issues"].append(f"missing check-in before {ts.time().isoformat()}")
+            else:
+                if break_start is not None:
+                    shift_breaks += ts - break_start
+                _close_shift(ts)
+        elif punch == BREAK_OUT:
+            if shift_start is not None:
+                break_start = ts
+        elif punch == BREAK_IN:
+            if break_start is not None:
+                shift_breaks += ts - break_start
+                break_start = None
+        elif punch == OVERTIME_IN:
+            overtime_start = ts
+        elif punch == OVERTIME_OUT:
+            if overtime_start is not None and ts - overtime_start <= max_shift:
+                _day(overtime_start)["overtime_minutes"] += _minutes(ts - overtime_start)
+            else:
+                _day(ts)["issues"].append(f"missing overtime-in before {ts.time().isoformat()}")
+            overtime_start = None
+
+    if shift_start is not None:
+        day = _day(shift_start)
+        day["open_shift_since"] = shift_start.isoformat()
+
+    for day in days.values():
+        day["worked_minutes"] = round(day["worked_minutes"], 1)
+        day["break_minutes"] = round(day["break_minutes"], 1)
+        # Time worked beyond the standard day counts as overtime too
+        extra = max(0.0, day["worked_minutes"] - standard_minutes)
+        day["overtime_minutes"] = round(day["overtime_minutes"] + extra, 1)
+
+    return days
+
+
+class WorkHoursEngine:
+    """Per-user, per-day work hours served from the daily aggregates in the local store
+
+    ingest_attendance keeps the aggregates current and only re-pairs the
+    user-days that new punches touch (see ZKTecoManager.refresh_archive).
+    Nothing is held in memory, so results survive restarts and memory does
+    not grow with the log.
+    """
+
+    def __init__(self, store: Optional[LocalStore] = None):
+        self._store = store
+
+    @property
+    def store(self) -> LocalStore:
+        return self._store or get_store()
+
+    @property
+    def version(self) -> int:
+        """Moves whenever a record is archived, so whenever a result can change"""
+        return self.store.archive_version()
+
+    def query(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+              user_id: Optional[str] = None, device: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per-user, per-day results filtered by inclusive ISO date range and user"""
+        rows = self.store.get_daily_aggregates(
+            date_from or "0000-01-01", date_to or "9999-12-31", user_id=user_id, device=device
+        )
+        results = []
+        for row in sorted(rows, key=lambda row: (row["user_id"], row["day"])):
+            result = {
+                "user_id": row["user_id"],
+                "user_name": row["user_name"],
+                "date": row["day"],
+                "first_in": row["first_in"],
+                "last_out": row["last_out"],
+                "shifts": row["shifts"],
+                "punch_count": row["punch_count"],
+                "worked_minutes": row["worked_minutes"],
+                "break_minutes": row["break_minutes"],
+                "overtime_minutes": row["overtime_minutes"],
+                "issues": row["issues"],
+            }
+            if row["open_shift_since"]:
+                result["open_shift_since"] = row["open_shift_since"]
+            results.append(result)
+        return results
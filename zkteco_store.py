@@ -0,0 +1,533 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_STORE_PATH = os.environ.get(
+    "ZKTECO_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "zkteco_store.db")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_snapshots (
+    device TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (device, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    device TEXT PRIMARY KEY,
+    last_timestamp TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS attendance_archive (
+    device TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    punch INTEGER NOT NULL,
+    uid INTEGER,
+    user_name TEXT,
+    status TEXT,
+    archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (device, user_id, timestamp, punch)
+);
+
+CREATE INDEX IF NOT EXISTS attendance_archive_time ON attendance_archive (device, timestamp);
+
+CREATE TABLE IF NOT EXISTS sent_attendance (
+    device TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    punch INTEGER NOT NULL,
+    sent_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (device, user_id, timestamp, punch)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily_aggregates (
+    device TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    user_name TEXT,
+    first_in TEXT,
+    last_out TEXT,
+    punch_count INTEGER NOT NULL,
+    worked_minutes REAL NOT NULL,
+    break_minutes REAL NOT NULL,
+    overtime_minutes REAL NOT NULL,
+    updated_at TEXT NOT NULL,
+    shifts INTEGER NOT NULL DEFAULT 0,
+    issues TEXT,
+    open_shift_since TEXT,
+    PRIMARY KEY (device, user_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS daily_aggregates_day ON daily_aggregates (day);
+
+CREATE TABLE IF NOT EXISTS clear_audit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device TEXT NOT NULL,
+    performed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    dry_run INTEGER NOT NULL,
+    device_records INTEGER,
+    pulled_records INTEGER,
+    archived_records INTEGER,
+    cleared INTEGER NOT NULL,
+    message TEXT
+);
+
+CREATE TABLE IF NOT EXISTS device_users (
+    device TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    name TEXT,
+    privilege INTEGER,
+    password TEXT,
+    group_id TEXT,
+    card_number INTEGER,
+    PRIMARY KEY (device, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS device_users_version (
+    device TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS replication_state (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    user_hash TEXT NOT NULL,
+    replicated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, target, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS device_transport (
+    device TEXT PRIMARY KEY,
+    force_udp INTEGER NOT NULL,
+    connect_ms REAL NOT NULL,
+    fetch_ms REAL NOT NULL,
+    probes TEXT NOT NULL,
+    probed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def user_hash(user: Dict[str, Any]) -> str:
+    """Content hash of one user row as sent to the backend"""
+    row = json.dumps([str(user["userId"]), user["name"]], ensure_ascii=False)
+    return hashlib.sha1(row.encode("utf-8")).hexdigest()
+
+
+def diff_users(previous: Dict[str, str], users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare the current user table with a stored snapshot of per-user hashes"""
+    hashes = {}
+    added = []
+    changed = []
+
+    for user in users:
+        user_id = str(user["userId"])
+        digest = user_hash(user)
+        hashes[user_id] = digest
+
+        if user_id not in previous:
+            added.append(user)
+        elif previous[user_id] != digest:
+            changed.append(user)
+
+    removed = [user_id for user_id in previous if user_id not in hashes]
+
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "hashes": hashes,
+    }
+
+
+class LocalStore:
+    """SQLite store for state the bridge keeps between syncs"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._add_missing_columns("daily_aggregates", {
+            "shifts": "INTEGER NOT NULL DEFAULT 0",
+            "issues": "TEXT",
+            "open_shift_since": "TEXT",
+        })
+        self._db.commit()
+
+    def _add_missing_columns(self, table: str, columns: Dict[str, str]):
+        """Bring a table created by an older version up to date"""
+        existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns.items():
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def get_user_hashes(self, device: str) -> Dict[str, str]:
+        """Per-user hashes from the last user table accepted by the backend"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, hash FROM user_snapshots WHERE device = ?", (device,)
+            ).fetchall()
+        return dict(rows)
+
+    def apply_user_delta(self, device: str, hashes: Dict[str, str], removed: Iterable[str]):
+        """Store the new user snapshot after the backend accepted the delta"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO user_snapshots (device, user_id, hash) VALUES (?, ?, ?)",
+                [(device, user_id, digest) for user_id, digest in hashes.items()]
+            )
+            self._db.executemany(
+                "DELETE FROM user_snapshots WHERE device = ? AND user_id = ?",
+                [(device, user_id) for user_id in removed]
+            )
+
+    def get_watermark(self, device: str) -> Optional[str]:
+        """Timestamp of the newest record the backend accepted from a device"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_timestamp FROM sync_watermarks WHERE device = ?", (device,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, device: str, timestamp: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO sync_watermarks (device, last_timestamp) VALUES (?, ?) "
+                "ON CONFLICT(device) DO UPDATE SET last_timestamp = excluded.last_timestamp, "
+                "updated_at = CURRENT_TIMESTAMP "
+                "WHERE excluded.last_timestamp > sync_watermarks.last_timestamp",
+                (device, timestamp)
+            )
+
+    @staticmethod
+    def _archive_key(device: str, record: Dict[str, Any]):
+        return (device, str(record["user_id"]), record["timestamp"], int(record["punch"]))
+
+    def archive_attendance(self, device: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Durably store attendance records; returns the ones that were not archived before"""
+        inserted = []
+        with self._lock, self._db:
+            for record in records:
+                if not record.get("timestamp"):
+                    continue
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO attendance_archive "
+                    "(device, user_id, timestamp, punch, uid, user_name, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._archive_key(device, record) +
+                    (record.get("uid"), record.get("user_name"), record.get("status"))
+                )
+                if cursor.rowcount:
+                    inserted.append(record)
+        return inserted
+
+    def get_user_punches(self, device: str, user_id: str, start: str, end: str) -> List[tuple]:
+        """(timestamp, punch, user_name) rows for one user in an inclusive ISO time range"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT timestamp, punch, user_name FROM attendance_archive "
+                "WHERE device = ? AND user_id = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp",
+                (device, user_id, start, end)
+            ).fetchall()
+
+    def get_archived_attendance(self, device: str, start: Optional[str] = None, end: Optional[str] = None,
+                                user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Archived records of a device in an inclusive ISO time range, oldest first"""
+        query = "SELECT uid, user_name, user_id, timestamp, status, punch FROM attendance_archive WHERE device = ?"
+        params: list = [device]
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        query += " ORDER BY timestamp, user_id"
+        with self._lock:
+            cursor = self._db.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def archive_version(self) -> int:
+        """Grows whenever a record is archived; the archive is append-only"""
+        with self._lock:
+            row = self._db.execute("SELECT MAX(rowid) FROM attendance_archive").fetchone()
+        return row[0] or 0
+
+    def save_device_users(self, device: str, users: List[Dict[str, Any]]) -> int:
+        """Replace the cached user table of a device; returns its version
+
+        The version only moves when the content changed.
+        """
+        rows = sorted(
+            (str(u["userId"]), u["uid"], u["name"], u["privilege"], u["password"],
+             u["group_id"], u["cardNumber"])
+            for u in users
+        )
+        digest = hashlib.sha1(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock, self._db:
+            current = self._db.execute(
+                "SELECT version, content_hash FROM device_users_version WHERE device = ?", (device,)
+            ).fetchone()
+            if current and current[1] == digest:
+                self._db.execute(
+                    "UPDATE device_users_version SET stale = 0, updated_at = CURRENT_TIMESTAMP WHERE device = ?",
+                    (device,)
+                )
+                return current[0]
+
+            version = current[0] + 1 if current else 1
+            self._db.execute("DELETE FROM device_users WHERE device = ?", (device,))
+            self._db.executemany(
+                "INSERT INTO device_users (device, user_id, uid, name, privilege, password, group_id, "
+                "card_number) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(device,) + row for row in rows]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO device_users_version (device, version, content_hash, stale) "
+                "VALUES (?, ?, ?, 0)",
+                (device, version, digest)
+            )
+            return version
+
+    def invalidate_device_users(self, device: str):
+        """Mark the cached user table as out of date after a write to the device"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE device_users_version SET stale = 1 WHERE device = ?", (device,))
+
+    def get_device_users_version(self, device: str) -> Optional[int]:
+        """Version of the cached user table, or None if it is missing or stale"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM device_users_version WHERE device = ? AND stale = 0", (device,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_device_users(self, device: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT uid, user_id, name, privilege, password, group_id, card_number FROM device_users "
+                "WHERE device = ? ORDER BY uid", (device,)
+            ).fetchall()
+        return [
+            {"uid": uid, "userId": user_id, "name": name, "privilege": privilege,
+             "password": password, "group_id": group_id, "cardNumber": card}
+            for uid, user_id, name, privilege, password, group_id, card in rows
+        ]
+
+    def upsert_daily_aggregates(self, rows: List[Dict[str, Any]]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO daily_aggregates (device, user_id, day, user_name, first_in, "
+                "last_out, punch_count, worked_minutes, break_minutes, overtime_minutes, shifts, issues, "
+                "open_shift_since, updated_at) "
+                "VALUES (:device, :user_id, :day, :user_name, :first_in, :last_out, :punch_count, "
+                ":worked_minutes, :break_minutes, :overtime_minutes, :shifts, :issues, :open_shift_since, "
+                "CURRENT_TIMESTAMP)",
+                [{**row, "issues": json.dumps(row.get("issues") or [])} for row in rows]
+            )
+
+    def get_daily_aggregates(self, day_from: str, day_to: str, user_id: Optional[str] = None,
+                             device: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Materialized per-user, per-day rows in an inclusive date range"""
+        query = "SELECT * FROM daily_aggregates WHERE day BETWEEN ? AND ?"
+        params: list = [day_from, day_to]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if device is not None:
+            query += " AND device = ?"
+            params.append(device)
+        query += " ORDER BY day, user_id"
+        with self._lock:
+            cursor = self._db.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            row["issues"] = json.loads(row["issues"]) if row["issues"] else []
+        return rows
+
+    def sum_daily_aggregates(self, day_from: str, day_to: str,
+                             device: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Totals per user over an inclusive date range"""
+        query = (
+            "SELECT user_id, MAX(user_name) AS user_name, COUNT(*) AS days, SUM(punch_count) AS punch_count, "
+            "SUM(worked_minutes) AS worked_minutes, SUM(break_minutes) AS break_minutes, "
+            "SUM(overtime_minutes) AS overtime_minutes FROM daily_aggregates WHERE day BETWEEN ? AND ?"
+        )
+        params: list = [day_from, day_to]
+        if device is not None:
+            query += " AND device = ?"
+            params.append(device)
+        query += " GROUP BY user_id ORDER BY user_id"
+        with self._lock:
+            cursor = self._db.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count_archived(self, device: str, records: List[Dict[str, Any]]) -> int:
+        """How many distinct records from this list are present in the archive"""
+        keys = {self._archive_key(device, record) for record in records if record.get("timestamp")}
+        with self._lock:
+            self._db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS archive_check "
+                "(device TEXT, user_id TEXT, timestamp TEXT, punch INTEGER)"
+            )
+            try:
+                self._db.executemany("INSERT INTO archive_check VALUES (?, ?, ?, ?)", keys)
+                row = self._db.execute(
+                    "SELECT COUNT(*) FROM archive_check c JOIN attendance_archive a "
+                    "ON a.device = c.device AND a.user_id = c.user_id "
+                    "AND a.timestamp = c.timestamp AND a.punch = c.punch"
+                ).fetchone()
+            finally:
+                self._db.execute("DELETE FROM archive_check")
+                self._db.commit()
+        return row[0]
+
+    def iter_sent_keys(self, device: str):
+        """All (user_id, timestamp, punch) keys already accepted by the backend for a device"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, timestamp, punch FROM sent_attendance WHERE device = ?", (device,)
+            ).fetchall()
+        return rows
+
+    def existing_sent_keys(self, device: str, keys: Iterable[tuple]) -> set:
+        """Subset of (user_id, timestamp, punch) keys that were already sent"""
+        with self._lock:
+            self._db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS sent_check (user_id TEXT, timestamp TEXT, punch INTEGER)"
+            )
+            try:
+                self._db.executemany("INSERT INTO sent_check VALUES (?, ?, ?)", keys)
+                rows = self._db.execute(
+                    "SELECT c.user_id, c.timestamp, c.punch FROM sent_check c JOIN sent_attendance s "
+                    "ON s.device = ? AND s.user_id = c.user_id AND s.timestamp = c.timestamp "
+                    "AND s.punch = c.punch",
+                    (device,)
+                ).fetchall()
+            finally:
+                self._db.execute("DELETE FROM sent_check")
+                self._db.commit()
+        return set(rows)
+
+    def mark_sent(self, device: str, keys: Iterable[tuple]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO sent_attendance (device, user_id, timestamp, punch) VALUES (?, ?, ?, ?)",
+                [(device,) + tuple(key) for key in keys]
+            )
+
+    def add_clear_audit(self, device: str, dry_run: bool, device_records: Optional[int],
+                        pulled_records: Optional[int], archived_records: Optional[int],
+                        cleared: bool, message: str) -> int:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO clear_audit (device, dry_run, device_records, pulled_records, "
+                "archived_records, cleared, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (device, int(dry_run), device_records, pulled_records, archived_records, int(cleared), message)
+            )
+            return cursor.lastrowid
+
+    def clear_version(self, device: str) -> int:
+        """Grows whenever the attendance log of a device is cleared"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(id) FROM clear_audit WHERE device = ? AND cleared = 1", (device,)
+            ).fetchone()
+        return row[0] or 0
+
+    def get_clear_audit(self, device: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM clear_audit"
+        params: tuple = ()
+        if device:
+            query += " WHERE device = ?"
+            params = (device,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            cursor = self._db.execute(query, params + (limit,))
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_replication_state(self, source: str, target: str) -> Dict[str, tuple]:
+        """Per-user (content hash, user hash) last written from source to target"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, content_hash, user_hash FROM replication_state "
+                "WHERE source = ? AND target = ?", (source, target)
+            ).fetchall()
+        return {user_id: (content_hash, hash_) for user_id, content_hash, hash_ in rows}
+
+    def set_replication_state(self, source: str, target: str, hashes: Dict[str, tuple]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO replication_state (source, target, user_id, content_hash, user_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(source, target, user_id) + tuple(pair) for user_id, pair in hashes.items()]
+            )
+
+    def get_transport(self, device: str) -> Optional[Dict[str, Any]]:
+        """Transport chosen by the last latency probe of a device, if any"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT force_udp, connect_ms, fetch_ms, probes, probed_at FROM device_transport "
+                "WHERE device = ?", (device,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "force_udp": bool(row[0]),
+            "connect_ms": row[1],
+            "fetch_ms": row[2],
+            "probes": json.loads(row[3]),
+            "probed_at": row[4],
+        }
+
+    def set_transport(self, device: str, force_udp: bool, connect_ms: float, fetch_ms: float,
+                      probes: Dict[str, Any]):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO device_transport (device, force_udp, connect_ms, fetch_ms, probes) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (device, int(force_udp), connect_ms, fetch_ms, json.dumps(probes))
+            )
+
+    def forget_transport(self, device: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM device_transport WHERE device = ?", (device,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[LocalStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> LocalStore:
+    """Return the process-wide local store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalStore()
+        return _store
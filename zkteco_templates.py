@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Backup file layout (gzip compressed):
+#   magic "ZKTB", format version (B), header length (I), JSON header,
+#   then per template: uid (H), finger id (B), valid (B), size (H), template bytes
+MAGIC = b"ZKTB"
+VERSION = 1
+TEMPLATE_HEADER = struct.Struct("<HBBH")
+
+DEFAULT_BACKUP_DIR = os.environ.get(
+    "ZKTECO_BACKUP_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+)
+
+
+def backup_path(file_name: str) -> str:
+    """Resolve a backup file name inside the backup directory"""
+    name = os.path.basename(file_name)
+    if not name or name != file_name:
+        raise ValueError(f"Invalid backup file name: {file_name}")
+    os.makedirs(DEFAULT_BACKUP_DIR, exist_ok=True)
+    return os.path.join(DEFAULT_BACKUP_DIR, name)
+
+
+def write_backup(path: str, device: str, users: List[Dict[str, Any]], templates: List[tuple]) -> int:
+    """Write users and (uid, fid, valid, template) tuples; returns the file size in bytes"""
+    header = json.dumps({
+        "device": device,
+        "users": users,
+        "template_count": len(templates),
+    }, separators=(",", ":")).encode("utf-8")
+
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=9) as f:
+        f.write(MAGIC + struct.pack("<BI", VERSION, len(header)))
+        f.write(header)
+        for uid, fid, valid, template in templates:
+            f.write(TEMPLATE_HEADER.pack(uid, fid, valid, len(template)))
+            f.write(template)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def read_backup(path: str) -> Tuple[Dict[str, Any], List[tuple]]:
+    """Read a backup written by write_backup"""
+    with gzip.open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a template backup")
+        version, header_size = struct.unpack("<BI", f.read(5))
+        if version != VERSION:
+            raise ValueError(f"Unsupported template backup version {version}")
+        header = json.loads(f.read(header_size).decode("utf-8"))
+        templates = list(_iter_templates(f, header["template_count"]))
+    return header, templates
+
+
+def _iter_templates(f, count: int) -> Iterator[tuple]:
+    for _ in range(count):
+        uid, fid, valid, size = TEMPLATE_HEADER.unpack(f.read(TEMPLATE_HEADER.size))
+        yield uid, fid, valid, f.read(size)
@@ -0,0 +1,173 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Limits of the device user record (72-byte packet layout used by pyzk)
+MAX_USER_ID_LENGTH = 9
+MAX_NAME_BYTES = 24
+MAX_PASSWORD_BYTES = 8
+MAX_UID = 65535
+MAX_CARD_NUMBER = 4294967295
+# pyzk's set_user stores anything other than admin as a normal user
+PRIVILEGES = (0, 14)  # user, admin
+
+_DIGITS = re.compile(r"^[0-9]+$")
+
+_MISSING = object()
+
+
+class Field:
+    """Declaration of one request field
+
+    keys are the accepted request names (first match wins) and target is the
+    name the manager expects. check returns the cleaned value or raises ValueError.
+    """
+
+    def __init__(self, keys, target: str, check: Callable[[Any], Any],
+                 required: bool = False, default: Any = _MISSING):
+        self.keys = (keys,) if isinstance(keys, str) else tuple(keys)
+        self.target = target
+        self.check = check
+        self.required = required
+        self.default = default
+
+
+def _text(max_bytes: int, allow_empty: bool = True) -> Callable[[Any], str]:
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError("must be a string")
+        if not allow_empty and not value.strip():
+            raise ValueError("must not be empty")
+        if len(value.encode("utf-8")) > max_bytes:
+            raise ValueError(f"must be at most {max_bytes} bytes")
+        return value
+    return check
+
+
+def _digits(max_length: int, max_value: Optional[int] = None, allow_empty: bool = False) -> Callable[[Any], str]:
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (str, int)):
+            raise ValueError("must be a number or a string of digits")
+        value = str(value).strip()
+        if not value and allow_empty:
+            return value
+        if not _DIGITS.match(value):
+            raise ValueError("must contain digits only")
+        if len(value) > max_length:
+            raise ValueError(f"must be at most {max_length} digits")
+        if max_value is not None and int(value) > max_value:
+            raise ValueError(f"must not exceed {max_value}")
+        return value
+    return check
+
+
+def _integer(low: int, high: int) -> Callable[[Any], int]:
+    def check(value):
+        if isinstance(value, bool):
+            raise ValueError("must be an integer")
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("must be an integer")
+        if not low <= number <= high:
+            raise ValueError(f"must be between {low} and {high}")
+        return number
+    return check
+
+
+def _choice(choices: tuple) -> Callable[[Any], int]:
+    to_int = _integer(min(choices), max(choices))
+
+    def check(value):
+        number = to_int(value)
+        if number not in choices:
+            raise ValueError(f"must be one of {', '.join(map(str, choices))}")
+        return number
+    return check
+
+
+class Schema:
+    """Validator compiled once from field declarations"""
+
+    def __init__(self, fields: List[Field], partial: bool = False):
+        self.partial = partial
+        # Flatten the declarations into plain tuples so validate() is a tight loop
+        self._plan = tuple((f.keys, f.target, f.check, f.required, f.default) for f in fields)
+
+    def validate(self, data: Any) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """Return (cleaned data, errors); errors is empty when data is valid"""
+        if not isinstance(data, dict):
+            return {}, [{"field": "", "error": "must be an object"}]
+
+        clean: Dict[str, Any] = {}
+        errors: List[Dict[str, str]] = []
+        for keys, target, check, required, default in self._plan:
+            key = next((k for k in keys if data.get(k) is not None), None)
+            if key is None:
+                if required:
+                    errors.append({"field": keys[0], "error": "is required"})
+                elif default is not _MISSING and not self.partial:
+                    clean[target] = default
+                continue
+            try:
+                clean[target] = check(data[key])
+            except ValueError as e:
+                errors.append({"field": key, "error": str(e)})
+        return clean, errors
+
+
+def format_errors(errors: List[Dict[str, str]]) -> str:
+    return "; ".join(f"{e['field']} {e['error']}".strip() for e in errors)
+
+
+def validate_items(schema: Schema, items: Any, id_key: str = "userId"):
+    """Validate a bulk list; returns (valid cleaned items, per-item failures)
+
+    A repeated ID is reported as a failure for every occurrence after the first.
+    """
+    valid, failed = [], []
+    seen = set()
+    for index, item in enumerate(items):
+        clean, errors = schema.validate(item)
+        item_id = clean.get(id_key, item.get(id_key) if isinstance(item, dict) else None)
+        if not errors and item_id in seen:
+            errors = [{"field": id_key, "error": "is duplicated in this request"}]
+        if errors:
+            failed.append({"index": index, id_key: item_id, "error": format_errors(errors), "errors": errors})
+        else:
+            seen.add(item_id)
+            valid.append(clean)
+    return valid, failed
+
+
+def _user_fields(name_keys, partial: bool = False, create: bool = False) -> List[Field]:
+    return [
+        # Creating a user derives its 16-bit UID from the user ID, so it must fit the UID
+        # range; updates keep the existing UID and reconcile allocates a free one
+        Field("userId", "userId", _digits(MAX_USER_ID_LENGTH, MAX_UID if create else None), required=True),
+        Field(name_keys, "name", _text(MAX_NAME_BYTES, allow_empty=False), required=not partial),
+        Field("password", "password", _text(MAX_PASSWORD_BYTES), default=""),
+        Field("privilege", "privilege", _choice(PRIVILEGES), default=0),
+        Field("cardNumber", "cardNumber", _digits(10, MAX_CARD_NUMBER, allow_empty=True), default=""),
+    ]
+
+
+USER_ID_FIELD = Field("userId", "userId", _digits(MAX_USER_ID_LENGTH), required=True)
+
+# Single-user endpoints send the display name as userName
+CREATE_USER_SCHEMA = Schema(_user_fields("userName", create=True))
+USER_SCHEMA = Schema(_user_fields("userName"))
+DELETE_USER_SCHEMA = Schema([USER_ID_FIELD])
+
+# Bulk create items are passed to the manager as-is, so they use "name"
+BULK_USER_SCHEMA = Schema(_user_fields(("name", "userName"), create=True) + [
+    Field("uid", "uid", _integer(1, MAX_UID)),
+    Field("group_id", "group_id", _text(7)),
+])
+
+# Roster entries only carry the fields to compare; nothing is defaulted
+ROSTER_SCHEMA = Schema(_user_fields("userName", partial=True), partial=True)
+
+
+def check_user_id(value: Any) -> str:
+    """Clean one user ID or raise ValueError"""
+    return USER_ID_FIELD.check(value)